@@ -23,29 +23,40 @@ from __future__ import annotations
 
 import argparse
 import asyncio
-import concurrent.futures
+import bisect
+import codecs
+import ctypes
+import ctypes.util
+import difflib
+import errno
+import fcntl
 import hashlib
+import heapq
 import json
 import os
 import random
 import re
+import select
 import shutil
 import signal
 import stat
+import struct
 import subprocess
 import sys
 import tempfile
 import threading
 import time
 import uuid
-from collections import Counter
+from collections import Counter, deque
 from collections.abc import Callable
-from dataclasses import asdict, dataclass, field
+from dataclasses import asdict, dataclass, field, replace
 from datetime import UTC, datetime
 from enum import StrEnum
 from pathlib import Path
 from typing import Any
 
+import codex_log_index
+
 try:
     import jsonschema
 except ImportError:
@@ -111,7 +122,15 @@ def resolve_log_dir(
 LOG_DIR = resolve_log_dir()
 MAX_OUTPUT_SIZE = 10 * 1024  # 10KB
 MAX_CAPTURE_BYTES = 5 * 1024 * 1024  # 5MB (stdout/stderr capture cap)
+STREAM_READ_CHUNK_BYTES = 64 * 1024
+# codex 終了後に stdout/stderr を読み切るまで待つ時間
+STREAM_DRAIN_GRACE_SECONDS = 2.0
+PROCESS_EXIT_POLL_SECONDS = 0.1
 CAPSULE_STORE_AUTO_THRESHOLD = 20_000  # bytes
+CAPSULE_COMPACT_LIST_ITEMS = 8
+CAPSULE_COMPACT_STRING_CHARS = 2_000
+PIPELINE_STATE_JOURNAL_NAME = "state.journal.jsonl"
+PIPELINE_STATE_COMPACT_EVERY = 16
 SCHEMA_VERSION = "1.1"
 PIPELINE_SPEC_VERSION = "2.0"
 TEAM_POLICY_MANAGER_LEAF_V1 = "manager_leaf_v1"
@@ -134,6 +153,8 @@ PATCH_ALLOWED_PREFIXES = (
 CAPSULE_HASH_EXCLUDE_KEYS = {"pipeline_run_id"}
 DEFAULT_PIPELINE_STAGES = ("draft", "critique", "revise")
 DEFAULT_MAX_PARALLEL_STAGES = 2
+DEFAULT_MAX_CONCURRENCY = 0  # 0: 無制限（従来どおり全件を同時に起動）
+COMPETITION_PASS_SCORE = 3.5
 DEFAULT_RETRY_BACKOFF_SECONDS = (2, 5, 10)
 STAGE_ROLE_VALUES = (
     "planner",
@@ -215,6 +236,53 @@ PIPELINE_STAGE_TEMPLATES = {
     "revise": {},
 }
 WORKTREE_LOCK = threading.Lock()
+SNAPSHOT_HASH_CHUNK_BYTES = 1024 * 1024
+# mtime の粒度が粗いファイルシステムでも同一時刻内の書き換えを取りこぼさない幅
+SNAPSHOT_RACY_WINDOW_NS = 2_000_000_000
+GIT_PATHSPEC_BATCH_SIZE = 500
+SYNC_COPY_CHUNK_BYTES = 8 * 1024 * 1024
+LINUX_FICLONE = 0x40049409
+SNAPSHOT_MODE_VALUES = ("walk", "watch")
+READ_ONLY_WORKSPACE_VALUES = ("isolated", "shared")
+INOTIFY_IN_MODIFY = 0x00000002
+INOTIFY_IN_ATTRIB = 0x00000004
+INOTIFY_IN_CLOSE_WRITE = 0x00000008
+INOTIFY_IN_MOVED_FROM = 0x00000040
+INOTIFY_IN_MOVED_TO = 0x00000080
+INOTIFY_IN_CREATE = 0x00000100
+INOTIFY_IN_DELETE = 0x00000200
+INOTIFY_IN_Q_OVERFLOW = 0x00004000
+INOTIFY_IN_IGNORED = 0x00008000
+INOTIFY_IN_ONLYDIR = 0x01000000
+INOTIFY_IN_DONT_FOLLOW = 0x02000000
+INOTIFY_IN_ISDIR = 0x40000000
+INOTIFY_IN_NONBLOCK = os.O_NONBLOCK
+INOTIFY_IN_CLOEXEC = os.O_CLOEXEC
+INOTIFY_WATCH_MASK = (
+    INOTIFY_IN_MODIFY
+    | INOTIFY_IN_ATTRIB
+    | INOTIFY_IN_CLOSE_WRITE
+    | INOTIFY_IN_MOVED_FROM
+    | INOTIFY_IN_MOVED_TO
+    | INOTIFY_IN_CREATE
+    | INOTIFY_IN_DELETE
+    | INOTIFY_IN_ONLYDIR
+    | INOTIFY_IN_DONT_FOLLOW
+)
+REPO_BLOB_CACHE_DIR = Path(
+    os.environ.get("CODEX_SUBAGENT_BLOB_CACHE_DIR")
+    or Path(tempfile.gettempdir()) / "codex-subagent-blobs"
+)
+REPO_BLOB_CACHE_MAX_AGE_SECONDS = 7 * 24 * 60 * 60
+RESULT_CACHE_DIR = Path(
+    os.environ.get("CODEX_SUBAGENT_RESULT_CACHE_DIR")
+    or Path(tempfile.gettempdir()) / "codex-subagent-results"
+)
+RESULT_CACHE_TTL_SECONDS = 24 * 60 * 60
+RESULT_CACHE_MAX_BYTES = 256 * 1024 * 1024
+RESULT_CACHE_MODE_VALUES = ("off", "read", "readwrite")
+RESULT_CACHE_MODE = "off"
+STAGE_CACHE_DIRNAME = "stages"
 
 
 class ExecutionMode(StrEnum):
@@ -271,6 +339,10 @@ class CodexResult:
     timed_out: bool = False
     timeout_seconds: int | None = None
     output_is_partial: bool = False
+    input_tokens: int = 0
+    output_tokens: int = 0
+    cached_input_tokens: int = 0
+    token_source: str = ""
     metadata: dict[str, Any] = field(default_factory=dict)
 
 
@@ -334,6 +406,16 @@ class StageExecutionPolicy:
     max_attempts: int
     depends_on: list[str]
     merge_strategy: str | None
+    patch_prefixes: list[str] | None = None
+
+
+@dataclass
+class RepoSyncStats:
+    files_copied: int = 0
+    files_skipped: int = 0
+    files_removed: int = 0
+    bytes_copied: int = 0
+    bytes_skipped: int = 0
 
 
 @dataclass
@@ -341,6 +423,8 @@ class IsolatedWorkspace:
     path: Path
     cleanup_root: Path
     mode: str
+    pool: WorkspacePool | None = field(default=None, repr=False)
+    sync_stats: dict[str, int] = field(default_factory=dict)
 
 
 @dataclass(frozen=True)
@@ -350,6 +434,165 @@ class RepoSnapshotEntry:
     mtime_ns: int
     content: bytes | None = None
     link_target: str | None = None
+    size: int = 0
+    inode: int = field(default=0, compare=False)
+    digest: str | None = None
+    blob_path: str | None = field(default=None, compare=False)
+    ctime_ns: int = field(default=0, compare=False)
+    racy: bool = field(default=False, compare=False)
+
+    @property
+    def stat_key(self) -> tuple[int, int, int, int, int]:
+        # ctime は utime で戻せないので、mtime を戻した書き換えも検出できる
+        return (self.size, self.mtime_ns, self.mode, self.inode, self.ctime_ns)
+
+
+class RepoBlobStore:
+    """sha256 で内容アドレス化した snapshot blob のディスクキャッシュ"""
+
+    def __init__(self, root: str | Path) -> None:
+        self.root = Path(root)
+
+    def path_for(self, digest: str) -> Path:
+        return self.root / digest[:2] / digest[2:]
+
+    def put_file(self, path: str | Path) -> tuple[str, Path]:
+        source = Path(path)
+        digest = hash_file_sha256(source)
+        blob_path = self.path_for(digest)
+        if blob_path.exists():
+            try:
+                os.utime(blob_path)
+            except OSError:
+                pass
+            return digest, blob_path
+        self.root.mkdir(parents=True, exist_ok=True)
+        fd, tmp_name = tempfile.mkstemp(prefix=".blob-", dir=self.root)
+        hasher = hashlib.sha256()
+        try:
+            with open(source, "rb") as src, os.fdopen(fd, "wb") as dst:
+                while chunk := src.read(SNAPSHOT_HASH_CHUNK_BYTES):
+                    hasher.update(chunk)
+                    dst.write(chunk)
+            # The file may change between hashing and copying; the digest of
+            # the bytes actually copied is authoritative.
+            digest = hasher.hexdigest()
+            blob_path = self.path_for(digest)
+            blob_path.parent.mkdir(parents=True, exist_ok=True)
+            os.replace(tmp_name, blob_path)
+        except BaseException:
+            Path(tmp_name).unlink(missing_ok=True)
+            raise
+        return digest, blob_path
+
+    def prune(self, max_age_seconds: float) -> int:
+        if not self.root.exists():
+            return 0
+        cutoff = time.time() - max_age_seconds
+        removed = 0
+        for blob_path in self.root.glob("*/*"):
+            try:
+                if blob_path.stat().st_mtime < cutoff:
+                    blob_path.unlink()
+                    removed += 1
+            except OSError:
+                continue
+        return removed
+
+
+class ExecResultCache:
+    """codex exec 結果のディスクキャッシュ（TTL + サイズ上限の LRU）
+
+    エントリは key ごとの JSON ファイルで、参照時に mtime を更新して
+    LRU の順序に使う。
+    """
+
+    def __init__(
+        self,
+        root: str | Path,
+        ttl_seconds: float = RESULT_CACHE_TTL_SECONDS,
+        max_bytes: int = RESULT_CACHE_MAX_BYTES,
+    ) -> None:
+        self.root = Path(root)
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        self._lock = threading.Lock()
+
+    def path_for(self, key: str) -> Path:
+        return self.root / key[:2] / f"{key}.json"
+
+    def get(self, key: str) -> dict[str, Any] | None:
+        path = self.path_for(key)
+        payload = None
+        try:
+            if time.time() - path.stat().st_mtime <= self.ttl_seconds:
+                payload = json.loads(path.read_text(encoding="utf-8"))
+                os.utime(path)
+            else:
+                path.unlink(missing_ok=True)
+        except (OSError, ValueError):
+            payload = None
+        with self._lock:
+            if isinstance(payload, dict):
+                self.hits += 1
+                return payload
+            self.misses += 1
+        return None
+
+    def put(self, key: str, payload: dict[str, Any]) -> None:
+        path = self.path_for(key)
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            fd, tmp_name = tempfile.mkstemp(prefix=".result-", dir=path.parent)
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(payload, f, ensure_ascii=False)
+            os.replace(tmp_name, path)
+        except OSError as e:
+            print(
+                f"Warning: Failed to write result cache: {e}", file=sys.stderr
+            )
+            return
+        with self._lock:
+            self.writes += 1
+
+    def prune(self) -> int:
+        if not self.root.exists():
+            return 0
+        cutoff = time.time() - self.ttl_seconds
+        entries: list[tuple[float, int, Path]] = []
+        removed = 0
+        for path in self.root.glob("*/*.json"):
+            try:
+                st = path.stat()
+                if st.st_mtime < cutoff:
+                    path.unlink()
+                    removed += 1
+                else:
+                    entries.append((st.st_mtime, st.st_size, path))
+            except OSError:
+                continue
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                path.unlink()
+            except OSError:
+                continue
+            total -= size
+            removed += 1
+        return removed
+
+    def stats(self) -> dict[str, int]:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "writes": self.writes,
+            }
 
 
 # ============================================================================
@@ -372,6 +615,16 @@ class ExecutionLog:
     metadata: dict[str, Any] = field(default_factory=dict)
 
 
+def build_log_metadata() -> dict[str, Any]:
+    metadata: dict[str, Any] = dict(get_git_info())
+    if RESULT_CACHE_MODE != "off":
+        metadata["result_cache"] = {
+            "mode": RESULT_CACHE_MODE,
+            **get_result_cache().stats(),
+        }
+    return metadata
+
+
 def get_git_info() -> dict[str, str]:
     """Git情報を取得"""
     info = {}
@@ -413,6 +666,7 @@ def write_log(log: ExecutionLog) -> Path | None:
         with open(log_path, "a", encoding="utf-8") as f:
             f.write(json.dumps(asdict(log), ensure_ascii=False) + "\n")
 
+        codex_log_index.record_log_file(LOG_DIR, log_path)
         return log_path
     except Exception as e:
         print(f"Warning: Failed to write log: {e}", file=sys.stderr)
@@ -543,6 +797,12 @@ def path_matches_roots(path_value: str, roots: list[str]) -> bool:
     return False
 
 
+def write_roots_overlap(left: list[str], right: list[str]) -> bool:
+    return any(path_matches_roots(root, right) for root in left) or any(
+        path_matches_roots(root, left) for root in right
+    )
+
+
 def normalize_stage_spec(
     stage_spec: dict[str, Any],
     previous_stage_id: str | None,
@@ -572,6 +832,15 @@ def normalize_stage_spec(
     )
     if max_attempts < 1:
         raise ValueError("stage max_attempts must be >= 1")
+    raw_prefixes = stage_spec.get("patch_prefixes")
+    patch_prefixes: list[str] | None = None
+    if raw_prefixes is not None:
+        patch_prefixes = [str(prefix) for prefix in raw_prefixes]
+        for prefix in patch_prefixes:
+            if not _is_allowed_patch_path(prefix):
+                raise ValueError(
+                    f"stage patch_prefixes is not allowed: {prefix}"
+                )
     depends_on_explicit = "depends_on" in stage_spec
     if depends_on_explicit:
         depends_on = [str(item) for item in stage_spec.get("depends_on", [])]
@@ -593,6 +862,7 @@ def normalize_stage_spec(
         "write_roots": write_roots,
         "write_roots_explicit": write_roots_explicit,
         "input_keys": input_keys,
+        "patch_prefixes": patch_prefixes,
         "max_attempts": max_attempts,
         "depends_on": depends_on,
         "depends_on_explicit": depends_on_explicit,
@@ -761,6 +1031,164 @@ def build_stage_layers(stages: list[dict[str, Any]]) -> list[list[str]]:
     return layers
 
 
+def compute_stage_critical_path(
+    stages: list[dict[str, Any]],
+) -> dict[str, int]:
+    """各 stage から終端までの最長経路に含まれる stage 数を返す"""
+    dependents: dict[str, list[str]] = {stage["id"]: [] for stage in stages}
+    for stage in stages:
+        for dependency in stage["depends_on"]:
+            dependents.setdefault(dependency, []).append(stage["id"])
+    lengths: dict[str, int] = {}
+    for layer in reversed(build_stage_layers(stages)):
+        for stage_id in layer:
+            lengths[stage_id] = 1 + max(
+                (lengths[child] for child in dependents[stage_id]),
+                default=0,
+            )
+    return lengths
+
+
+def group_overlapping_stages(
+    stage_ids: list[str],
+    write_roots_by_stage: dict[str, list[str]],
+) -> list[list[str]]:
+    """write_roots が重なる stage を推移的にまとめる（重ならない stage は単独）"""
+    groups: list[list[str]] = []
+    for stage_id in stage_ids:
+        roots = write_roots_by_stage.get(stage_id) or []
+        merged = [stage_id]
+        kept: list[list[str]] = []
+        for group in groups:
+            if any(
+                write_roots_overlap(
+                    roots, write_roots_by_stage.get(other) or []
+                )
+                for other in group
+            ):
+                merged.extend(group)
+            else:
+                kept.append(group)
+        groups = kept + [merged]
+    return groups
+
+
+class CriticalPathScheduler:
+    """depends_on が揃った stage を、残り経路の長い順に払い出す
+
+    layer 単位で待ち合わせず、依存先が promote された時点で後続を ready にする。
+    同じ長さなら spec の並び順を優先する。
+    """
+
+    def __init__(
+        self,
+        stages: list[dict[str, Any]],
+        completed: set[str] | None = None,
+    ) -> None:
+        done = set(completed or ())
+        self.order = {stage["id"]: index for index, stage in enumerate(stages)}
+        self.priority = compute_stage_critical_path(stages)
+        self.dependents: dict[str, list[str]] = {
+            stage["id"]: [] for stage in stages
+        }
+        self.waiting: dict[str, set[str]] = {}
+        self._ready: list[tuple[int, int, str]] = []
+        for stage in stages:
+            for dependency in stage["depends_on"]:
+                self.dependents[dependency].append(stage["id"])
+            if stage["id"] in done:
+                continue
+            waiting = set(stage["depends_on"]) - done
+            if waiting:
+                self.waiting[stage["id"]] = waiting
+            else:
+                self._push(stage["id"])
+
+    def rank(self, stage_id: str) -> tuple[int, int]:
+        """小さいほど優先（残り経路の長い順、同じなら spec の並び順）"""
+        return (-self.priority[stage_id], self.order[stage_id])
+
+    def _push(self, stage_id: str) -> None:
+        heapq.heappush(self._ready, (*self.rank(stage_id), stage_id))
+
+    def pop_ready(self) -> str | None:
+        if not self._ready:
+            return None
+        return heapq.heappop(self._ready)[2]
+
+    def mark_done(self, stage_id: str) -> None:
+        for child in self.dependents.get(stage_id, []):
+            waiting = self.waiting.get(child)
+            if waiting is None:
+                continue
+            waiting.discard(stage_id)
+            if not waiting:
+                del self.waiting[child]
+                self._push(child)
+
+
+class PrioritySlots:
+    """優先度の小さい順に枠を渡す asyncio 用のセマフォ
+
+    request は同期的に順番待ちへ登録するので、起動直後でまだ走っていない
+    task の分も先に積んでおける。release(deferred=True) で返した枠は
+    dispatch を呼ぶまで誰にも渡さない（呼び出し側が後続を登録してから渡す）。
+    """
+
+    def __init__(self, capacity: int) -> None:
+        self._free = max(1, capacity)
+        self._parked = 0
+        self._seq = 0
+        self._waiters: list[tuple[Any, int, asyncio.Future[None]]] = []
+
+    def request(self, priority: Any) -> asyncio.Future[None]:
+        ticket: asyncio.Future[None] = (
+            asyncio.get_running_loop().create_future()
+        )
+        if self._free > 0:
+            # 空き枠があるときは生きた順番待ちは残っていない
+            self._free -= 1
+            ticket.set_result(None)
+        else:
+            self._seq += 1
+            heapq.heappush(self._waiters, (priority, self._seq, ticket))
+        return ticket
+
+    async def acquire(self, ticket: asyncio.Future[None]) -> None:
+        try:
+            await ticket
+        except asyncio.CancelledError:
+            if ticket.done() and not ticket.cancelled():
+                self.release()
+            raise
+
+    def discard(self, ticket: asyncio.Future[None]) -> None:
+        """acquire しなかった ticket を取り下げる（渡済みなら枠を返す）"""
+        if ticket.done() and not ticket.cancelled():
+            self.release()
+        else:
+            ticket.cancel()
+
+    def release(self, deferred: bool = False) -> None:
+        if deferred:
+            self._parked += 1
+        else:
+            self._grant()
+
+    def dispatch(self) -> None:
+        parked, self._parked = self._parked, 0
+        for _ in range(parked):
+            self._grant()
+
+    def _grant(self) -> None:
+        while self._waiters:
+            _, _, ticket = heapq.heappop(self._waiters)
+            if not ticket.done():
+                ticket.set_result(None)
+                return
+        self._free += 1
+
+
 def build_stage_policy(stage_spec: dict[str, Any]) -> StageExecutionPolicy:
     return StageExecutionPolicy(
         stage_id=stage_spec["id"],
@@ -773,6 +1201,11 @@ def build_stage_policy(stage_spec: dict[str, Any]) -> StageExecutionPolicy:
         max_attempts=int(stage_spec.get("max_attempts") or 1),
         depends_on=list(stage_spec.get("depends_on") or []),
         merge_strategy=stage_spec.get("merge_strategy"),
+        patch_prefixes=(
+            list(stage_spec["patch_prefixes"])
+            if stage_spec.get("patch_prefixes") is not None
+            else None
+        ),
     )
 
 
@@ -783,71 +1216,429 @@ def compute_retry_backoff_seconds(attempt_index: int) -> int:
     return backoffs[min(attempt_index - 1, len(backoffs) - 1)]
 
 
-def list_repo_state_paths(root: str | Path = ROOT_DIR) -> list[str]:
+def _walk_repo_state_paths(
+    root_path: Path,
+    pathspecs: list[str] | None,
+) -> list[str]:
+    if pathspecs is None:
+        candidates = root_path.rglob("*")
+    else:
+        candidates = []
+        for spec in pathspecs:
+            base = root_path / spec
+            if base.is_dir() and not base.is_symlink():
+                candidates.extend(base.rglob("*"))
+            else:
+                candidates.append(base)
+    paths: set[str] = set()
+    for path in candidates:
+        rel_path = path.relative_to(root_path)
+        if ".git" in rel_path.parts or not (
+            path.is_file() or path.is_symlink()
+        ):
+            continue
+        paths.add(rel_path.as_posix())
+    return sorted(paths)
+
+
+def list_repo_state_paths(
+    root: str | Path = ROOT_DIR,
+    pathspecs: list[str] | None = None,
+) -> list[str]:
     root_path = Path(root)
+    if pathspecs is not None and not pathspecs:
+        return []
+    base_cmd = [
+        "git",
+        "ls-files",
+        "--cached",
+        "--others",
+        "--exclude-standard",
+        "-z",
+    ]
+    batches: list[list[str]] = [[]]
+    if pathspecs is not None:
+        batches = [
+            pathspecs[index : index + GIT_PATHSPEC_BATCH_SIZE]
+            for index in range(0, len(pathspecs), GIT_PATHSPEC_BATCH_SIZE)
+        ]
+    paths: set[str] = set()
     try:
-        result = subprocess.run(
-            [
-                "git",
-                "ls-files",
-                "--cached",
-                "--others",
-                "--exclude-standard",
-                "-z",
-            ],
-            cwd=root_path,
-            capture_output=True,
-            check=True,
-        )
+        for batch in batches:
+            result = subprocess.run(
+                base_cmd + (["--", *batch] if batch else []),
+                cwd=root_path,
+                capture_output=True,
+                check=True,
+                env={**os.environ, "GIT_LITERAL_PATHSPECS": "1"},
+            )
+            raw = result.stdout.decode("utf-8", errors="replace")
+            paths.update(entry for entry in raw.split("\0") if entry)
     except Exception:
-        paths: list[str] = []
-        for path in sorted(root_path.rglob("*")):
-            if ".git" in path.parts or not (
-                path.is_file() or path.is_symlink()
-            ):
-                continue
-            paths.append(path.relative_to(root_path).as_posix())
-        return paths
-    raw = result.stdout.decode("utf-8", errors="replace")
-    return [entry for entry in raw.split("\0") if entry]
+        return _walk_repo_state_paths(root_path, pathspecs)
+    if pathspecs is None:
+        return [entry for entry in raw.split("\0") if entry]
+    return sorted(paths)
+
+
+def hash_file_sha256(path: str | Path) -> str:
+    hasher = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(SNAPSHOT_HASH_CHUNK_BYTES):
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+_DEFAULT_BLOB_STORE: RepoBlobStore | None = None
 
 
-def read_repo_snapshot_entry(path: str | Path) -> RepoSnapshotEntry | None:
+def get_default_blob_store() -> RepoBlobStore:
+    global _DEFAULT_BLOB_STORE
+    if (
+        _DEFAULT_BLOB_STORE is None
+        or _DEFAULT_BLOB_STORE.root != REPO_BLOB_CACHE_DIR
+    ):
+        _DEFAULT_BLOB_STORE = RepoBlobStore(REPO_BLOB_CACHE_DIR)
+    return _DEFAULT_BLOB_STORE
+
+
+def read_repo_snapshot_entry(
+    path: str | Path,
+    *,
+    blob_store: RepoBlobStore | None = None,
+    previous: RepoSnapshotEntry | None = None,
+    stat_only: bool = False,
+    racy_after_ns: int | None = None,
+) -> RepoSnapshotEntry | None:
+    """snapshot entry を読む
+
+    stat_only では内容を blob store に取り込まず stat だけを記録する。ただし
+    mtime が racy_after_ns 以降のファイルは同じ stat のまま書き換わり得るので
+    digest を取り、racy として後の比較で内容を再確認させる。
+    """
     entry_path = Path(path)
-    if not entry_path.exists() and not entry_path.is_symlink():
+    try:
+        stat_result = entry_path.lstat()
+    except FileNotFoundError:
         return None
-    stat_result = entry_path.lstat()
     mode = stat.S_IMODE(stat_result.st_mode)
     mtime_ns = stat_result.st_mtime_ns
-    if entry_path.is_symlink():
+    if stat.S_ISLNK(stat_result.st_mode):
         return RepoSnapshotEntry(
             kind="symlink",
             mode=mode,
             mtime_ns=mtime_ns,
             link_target=os.readlink(entry_path),
+            size=stat_result.st_size,
+            inode=stat_result.st_ino,
+            ctime_ns=stat_result.st_ctime_ns,
         )
-    if entry_path.is_file():
+    if not stat.S_ISREG(stat_result.st_mode):
+        return None
+    stat_key = (
+        stat_result.st_size,
+        mtime_ns,
+        mode,
+        stat_result.st_ino,
+        stat_result.st_ctime_ns,
+    )
+    if (
+        previous is not None
+        and previous.kind == "file"
+        and previous.stat_key == stat_key
+        and not previous.racy
+    ):
+        return previous
+    if stat_only:
+        racy = racy_after_ns is not None and mtime_ns >= racy_after_ns
         return RepoSnapshotEntry(
             kind="file",
             mode=mode,
             mtime_ns=mtime_ns,
-            content=entry_path.read_bytes(),
+            size=stat_result.st_size,
+            inode=stat_result.st_ino,
+            digest=hash_file_sha256(entry_path) if racy else None,
+            ctime_ns=stat_result.st_ctime_ns,
+            racy=racy,
         )
-    return None
+    store = blob_store or get_default_blob_store()
+    digest, blob_path = store.put_file(entry_path)
+    return RepoSnapshotEntry(
+        kind="file",
+        mode=mode,
+        mtime_ns=mtime_ns,
+        size=stat_result.st_size,
+        inode=stat_result.st_ino,
+        digest=digest,
+        blob_path=str(blob_path),
+        ctime_ns=stat_result.st_ctime_ns,
+    )
 
 
 def capture_repo_snapshot(
     root: str | Path = ROOT_DIR,
+    *,
+    previous: dict[str, RepoSnapshotEntry] | None = None,
+    blob_store: RepoBlobStore | None = None,
+    stat_only: bool = False,
 ) -> dict[str, RepoSnapshotEntry]:
+    """stat が前回と一致するファイルは再読込せずに snapshot を取得
+
+    stat_only は stage 開始前の snapshot 用で、内容は変更されたパスだけを
+    後から hydrate_snapshot_entry で source tree から取り込む。
+    """
     root_path = Path(root)
+    previous_entries = previous or {}
+    racy_after_ns = (
+        time.time_ns() - SNAPSHOT_RACY_WINDOW_NS if stat_only else None
+    )
     snapshot: dict[str, RepoSnapshotEntry] = {}
     for rel_path in list_repo_state_paths(root_path):
-        entry = read_repo_snapshot_entry(root_path / rel_path)
+        entry = read_repo_snapshot_entry(
+            root_path / rel_path,
+            blob_store=blob_store,
+            previous=previous_entries.get(rel_path),
+            stat_only=stat_only,
+            racy_after_ns=racy_after_ns,
+        )
+        if entry is not None:
+            snapshot[rel_path] = entry
+    return snapshot
+
+
+def hydrate_snapshot_entry(
+    entry: RepoSnapshotEntry | None,
+    source_path: str | Path,
+    *,
+    blob_store: RepoBlobStore | None = None,
+) -> tuple[bool, RepoSnapshotEntry | None]:
+    """stat だけの entry に source tree の同じファイルの内容を結び付ける
+
+    source 側の size / mtime / mode が一致しない（workspace 作成後に変わった）
+    場合は (False, None) を返す。
+    """
+    if entry is None or entry.kind != "file" or entry.blob_path is not None:
+        return True, entry
+    source = read_repo_snapshot_entry(source_path, blob_store=blob_store)
+    if (
+        source is None
+        or source.kind != "file"
+        or (source.size, source.mtime_ns, source.mode)
+        != (entry.size, entry.mtime_ns, entry.mode)
+        or (entry.digest is not None and entry.digest != source.digest)
+    ):
+        return False, None
+    return True, replace(
+        entry, digest=source.digest, blob_path=source.blob_path, racy=False
+    )
+
+
+def capture_repo_paths(
+    root: str | Path,
+    rel_paths: list[str],
+    *,
+    blob_store: RepoBlobStore | None = None,
+) -> dict[str, RepoSnapshotEntry]:
+    root_path = Path(root)
+    snapshot: dict[str, RepoSnapshotEntry] = {}
+    for rel_path in rel_paths:
+        entry = read_repo_snapshot_entry(
+            root_path / rel_path, blob_store=blob_store
+        )
         if entry is not None:
             snapshot[rel_path] = entry
     return snapshot
 
 
+def capture_repo_snapshot_delta(
+    root: str | Path,
+    before_snapshot: dict[str, RepoSnapshotEntry],
+    changed_paths: set[str],
+    *,
+    blob_store: RepoBlobStore | None = None,
+) -> dict[str, RepoSnapshotEntry]:
+    """watcher が報告したパス配下だけを再取得して after snapshot を作る"""
+    root_path = Path(root)
+    candidates = sorted(changed_paths)
+    after_snapshot = dict(before_snapshot)
+    before_keys = sorted(before_snapshot)
+    for rel_path in candidates:
+        after_snapshot.pop(rel_path, None)
+        prefix = rel_path + "/"
+        index = bisect.bisect_left(before_keys, prefix)
+        while index < len(before_keys) and before_keys[index].startswith(
+            prefix
+        ):
+            after_snapshot.pop(before_keys[index], None)
+            index += 1
+    for rel_path in list_repo_state_paths(root_path, pathspecs=candidates):
+        entry = read_repo_snapshot_entry(
+            root_path / rel_path,
+            blob_store=blob_store,
+            previous=before_snapshot.get(rel_path),
+        )
+        if entry is not None:
+            after_snapshot[rel_path] = entry
+    return after_snapshot
+
+
+class RepoChangeWatcher:
+    """inotify で workspace の変更パスを収集する（Linux のみ）
+
+    stop() は変更された repo 相対パスの集合を返す。キューあふれや watch
+    追加失敗などで取りこぼしの可能性がある場合は None を返し、呼び出し側は
+    capture_repo_snapshot による全走査にフォールバックする。
+    """
+
+    _EVENT_HEADER = struct.Struct("iIII")
+
+    def __init__(self, root: str | Path) -> None:
+        self.root = Path(root)
+        self._libc: Any = None
+        self._fd = -1
+        self._stop_r = -1
+        self._stop_w = -1
+        self._watch_dirs: dict[int, str] = {}
+        self._changed: set[str] = set()
+        self._overflowed = False
+        self._thread: threading.Thread | None = None
+
+    def start(self) -> None:
+        if not sys.platform.startswith("linux"):
+            raise OSError("inotify is not available on this platform")
+        libc_name = ctypes.util.find_library("c")
+        self._libc = ctypes.CDLL(libc_name or "libc.so.6", use_errno=True)
+        fd = self._libc.inotify_init1(INOTIFY_IN_NONBLOCK | INOTIFY_IN_CLOEXEC)
+        if fd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, os.strerror(err))
+        self._fd = fd
+        try:
+            self._watch_tree("")
+            self._stop_r, self._stop_w = os.pipe()
+        except BaseException:
+            self._close()
+            raise
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self) -> set[str] | None:
+        if self._thread is not None:
+            os.write(self._stop_w, b"x")
+            self._thread.join()
+            self._thread = None
+        if self._fd >= 0:
+            self._drain()
+        self._close()
+        if self._overflowed:
+            return None
+        return set(self._changed)
+
+    def _close(self) -> None:
+        for fd in (self._fd, self._stop_r, self._stop_w):
+            if fd >= 0:
+                os.close(fd)
+        self._fd = self._stop_r = self._stop_w = -1
+
+    def _add_watch(self, rel_dir: str) -> None:
+        abs_dir = self.root / rel_dir if rel_dir else self.root
+        wd = self._libc.inotify_add_watch(
+            self._fd,
+            os.fsencode(abs_dir),
+            INOTIFY_WATCH_MASK,
+        )
+        if wd < 0:
+            err = ctypes.get_errno()
+            if err in {errno.ENOENT, errno.ENOTDIR}:
+                return
+            raise OSError(err, os.strerror(err))
+        self._watch_dirs[wd] = rel_dir
+
+    def _watch_tree(self, rel_dir: str) -> None:
+        pending = [rel_dir]
+        while pending:
+            current = pending.pop()
+            self._add_watch(current)
+            abs_dir = self.root / current if current else self.root
+            try:
+                with os.scandir(abs_dir) as entries:
+                    for entry in entries:
+                        if entry.name == ".git":
+                            continue
+                        if entry.is_dir(follow_symlinks=False):
+                            pending.append(
+                                f"{current}/{entry.name}"
+                                if current
+                                else entry.name
+                            )
+            except (FileNotFoundError, NotADirectoryError):
+                continue
+
+    def _run(self) -> None:
+        while True:
+            readable, _, _ = select.select([self._fd, self._stop_r], [], [])
+            if self._stop_r in readable:
+                return
+            if not self._drain():
+                return
+
+    def _drain(self) -> bool:
+        while True:
+            try:
+                data = os.read(self._fd, 64 * 1024)
+            except BlockingIOError:
+                return True
+            except OSError:
+                self._overflowed = True
+                return False
+            if not data:
+                return True
+            self._handle_events(data)
+
+    def _handle_events(self, data: bytes) -> None:
+        offset = 0
+        header_size = self._EVENT_HEADER.size
+        while offset + header_size <= len(data):
+            wd, mask, _cookie, name_len = self._EVENT_HEADER.unpack_from(
+                data, offset
+            )
+            offset += header_size
+            raw_name = data[offset : offset + name_len].rstrip(b"\0")
+            offset += name_len
+            if mask & INOTIFY_IN_Q_OVERFLOW:
+                self._overflowed = True
+                continue
+            if mask & INOTIFY_IN_IGNORED:
+                self._watch_dirs.pop(wd, None)
+                continue
+            rel_dir = self._watch_dirs.get(wd)
+            if rel_dir is None or not raw_name:
+                continue
+            name = os.fsdecode(raw_name)
+            if name == ".git":
+                continue
+            rel_path = f"{rel_dir}/{name}" if rel_dir else name
+            self._changed.add(rel_path)
+            if mask & INOTIFY_IN_ISDIR and mask & (
+                INOTIFY_IN_CREATE | INOTIFY_IN_MOVED_TO
+            ):
+                try:
+                    self._watch_tree(rel_path)
+                except OSError:
+                    self._overflowed = True
+
+
+def start_repo_change_watcher(
+    root: str | Path,
+) -> RepoChangeWatcher | None:
+    watcher = RepoChangeWatcher(root)
+    try:
+        watcher.start()
+    except (OSError, AttributeError):
+        return None
+    return watcher
+
+
 def diff_repo_snapshot(
     before_snapshot: dict[str, RepoSnapshotEntry],
     after_snapshot: dict[str, RepoSnapshotEntry],
@@ -867,6 +1658,20 @@ def restore_repo_paths(
 ) -> None:
     del after_snapshot
     root_path = Path(root)
+    stat_only = [
+        rel_path
+        for rel_path in target_paths
+        if (entry := before_snapshot.get(rel_path)) is not None
+        and entry.kind == "file"
+        and entry.content is None
+        and entry.blob_path is None
+    ]
+    if stat_only:
+        # 1 件でも書けないなら途中まで戻した状態を残さない
+        raise ValueError(
+            "cannot restore stat-only snapshot entries (hydrate first): "
+            + ", ".join(stat_only)
+        )
     for rel_path in target_paths:
         before_bytes = before_snapshot.get(rel_path)
         abs_path = root_path / rel_path
@@ -894,6 +1699,45 @@ def remove_repo_path(path: str | Path, root: str | Path) -> None:
         parent = parent.parent
 
 
+def _try_reflink(src_fd: int, dst_fd: int) -> bool:
+    if not sys.platform.startswith("linux"):
+        return False
+    try:
+        fcntl.ioctl(dst_fd, LINUX_FICLONE, src_fd)
+    except OSError:
+        return False
+    return True
+
+
+def copy_file_contents(
+    source_path: str | Path,
+    destination_path: str | Path,
+) -> None:
+    """reflink → copy_file_range → チャンク copy の順で内容をコピー"""
+    with open(source_path, "rb") as src, open(destination_path, "wb") as dst:
+        if _try_reflink(src.fileno(), dst.fileno()):
+            return
+        if hasattr(os, "copy_file_range"):
+            try:
+                while os.copy_file_range(
+                    src.fileno(), dst.fileno(), SYNC_COPY_CHUNK_BYTES
+                ):
+                    pass
+                return
+            except OSError as exc:
+                if exc.errno not in {
+                    errno.EXDEV,
+                    errno.ENOSYS,
+                    errno.EINVAL,
+                    errno.EOPNOTSUPP,
+                }:
+                    raise
+                src.seek(0)
+                dst.seek(0)
+                dst.truncate()
+        shutil.copyfileobj(src, dst, SYNC_COPY_CHUNK_BYTES)
+
+
 def write_repo_snapshot_entry(
     destination: str | Path,
     entry: RepoSnapshotEntry,
@@ -918,9 +1762,12 @@ def write_repo_snapshot_entry(
         return
     if entry.kind != "file":
         raise ValueError("unsupported snapshot entry kind")
-    if entry.content is None:
+    if entry.content is not None:
+        dest_path.write_bytes(entry.content)
+    elif entry.blob_path is not None:
+        copy_file_contents(entry.blob_path, dest_path)
+    else:
         raise ValueError("file snapshot entry requires content")
-    dest_path.write_bytes(entry.content)
     os.chmod(dest_path, entry.mode)
     os.utime(dest_path, ns=(entry.mtime_ns, entry.mtime_ns))
 
@@ -932,7 +1779,14 @@ def enforce_stage_write_policy(
     workspace_root: str | Path = ROOT_DIR,
     after_snapshot: dict[str, RepoSnapshotEntry] | None = None,
     restore_unauthorized: bool = True,
+    source_root: str | Path | None = None,
 ) -> dict[str, Any]:
+    """write_roots 外の変更を検出し、既定では before_snapshot の状態へ戻す
+
+    before_snapshot が stat だけ（capture_repo_snapshot(stat_only=True)）の
+    場合、戻す対象は source_root の同じパスから内容を取り込んでから復元する。
+    取り込めなければ何も書き換えずに ValueError を送出する。
+    """
     root_path = Path(workspace_root)
     effective_after_snapshot = (
         after_snapshot
@@ -948,6 +1802,23 @@ def enforce_stage_write_policy(
         if not path_matches_roots(path, policy.write_roots)
     ]
     if unauthorized_files and restore_unauthorized:
+        if source_root is not None:
+            before_snapshot = dict(before_snapshot)
+            missing: list[str] = []
+            for rel_path in unauthorized_files:
+                hydrated, entry = hydrate_snapshot_entry(
+                    before_snapshot.get(rel_path),
+                    Path(source_root) / rel_path,
+                )
+                if not hydrated:
+                    missing.append(rel_path)
+                elif entry is not None:
+                    before_snapshot[rel_path] = entry
+            if missing:
+                raise ValueError(
+                    "source tree changed since the stage snapshot; "
+                    "cannot restore: " + ", ".join(missing)
+                )
         restore_repo_paths(
             before_snapshot,
             effective_after_snapshot,
@@ -988,31 +1859,124 @@ def copy_path_preserving_metadata(
 ) -> None:
     source = Path(source_path)
     destination = Path(destination_path)
-    entry = read_repo_snapshot_entry(source)
-    if entry is None:
+    try:
+        stat_result = source.lstat()
+    except FileNotFoundError:
+        raise ValueError("source path does not exist for promotion") from None
+    mode = stat.S_IMODE(stat_result.st_mode)
+    if stat.S_ISLNK(stat_result.st_mode):
+        entry = RepoSnapshotEntry(
+            kind="symlink",
+            mode=mode,
+            mtime_ns=stat_result.st_mtime_ns,
+            link_target=os.readlink(source),
+        )
+    elif stat.S_ISREG(stat_result.st_mode):
+        entry = RepoSnapshotEntry(
+            kind="file",
+            mode=mode,
+            mtime_ns=stat_result.st_mtime_ns,
+            size=stat_result.st_size,
+            blob_path=str(source),
+        )
+    else:
         raise ValueError("source path does not exist for promotion")
     write_repo_snapshot_entry(destination, entry)
 
 
-def sync_repo_state(
+def _repo_path_in_sync(
+    source_stat: os.stat_result,
+    source_file: Path,
+    target_file: Path,
+) -> bool:
+    try:
+        target_stat = target_file.lstat()
+    except FileNotFoundError:
+        return False
+    if stat.S_IFMT(source_stat.st_mode) != stat.S_IFMT(target_stat.st_mode):
+        return False
+    if stat.S_ISLNK(source_stat.st_mode):
+        return os.readlink(source_file) == os.readlink(target_file)
+    return (
+        source_stat.st_size == target_stat.st_size
+        and source_stat.st_mtime_ns == target_stat.st_mtime_ns
+        and stat.S_IMODE(source_stat.st_mode)
+        == stat.S_IMODE(target_stat.st_mode)
+    )
+
+
+def sync_repo_paths(
     source_root: str | Path,
     target_root: str | Path,
-) -> None:
+    rel_paths: list[str],
+    stats: RepoSyncStats | None = None,
+) -> RepoSyncStats:
+    """stat（size / mtime / mode）が一致するパスはコピーせずに同期"""
     source_path = Path(source_root)
     target_path = Path(target_root)
-    source_paths = set(list_repo_state_paths(source_path))
-    target_paths = set(list_repo_state_paths(target_path))
-    for rel_path in sorted(target_paths - source_paths):
-        dest_path = target_path / rel_path
-        remove_repo_path(dest_path, target_path)
-    for rel_path in sorted(source_paths):
+    sync_stats = stats or RepoSyncStats()
+    for rel_path in sorted(rel_paths):
         source_file = source_path / rel_path
         target_file = target_path / rel_path
-        if not (source_file.is_file() or source_file.is_symlink()):
-            if target_file.exists():
+        try:
+            source_stat = source_file.lstat()
+        except FileNotFoundError:
+            source_stat = None
+        if source_stat is None or not (
+            stat.S_ISREG(source_stat.st_mode)
+            or stat.S_ISLNK(source_stat.st_mode)
+        ):
+            if target_file.exists() or target_file.is_symlink():
                 remove_repo_path(target_file, target_path)
+                sync_stats.files_removed += 1
+            continue
+        if _repo_path_in_sync(source_stat, source_file, target_file):
+            sync_stats.files_skipped += 1
+            sync_stats.bytes_skipped += source_stat.st_size
             continue
         copy_path_preserving_metadata(source_file, target_file)
+        sync_stats.files_copied += 1
+        sync_stats.bytes_copied += source_stat.st_size
+    return sync_stats
+
+
+def sync_repo_state(
+    source_root: str | Path,
+    target_root: str | Path,
+) -> RepoSyncStats:
+    source_path = Path(source_root)
+    target_path = Path(target_root)
+    source_paths = set(list_repo_state_paths(source_path))
+    target_paths = set(list_repo_state_paths(target_path))
+    stats = RepoSyncStats()
+    for rel_path in sorted(target_paths - source_paths):
+        dest_path = target_path / rel_path
+        if dest_path.exists() or dest_path.is_symlink():
+            remove_repo_path(dest_path, target_path)
+            stats.files_removed += 1
+    return sync_repo_paths(
+        source_path, target_path, sorted(source_paths), stats
+    )
+
+
+def list_dirty_repo_paths(root: str | Path) -> list[str]:
+    """HEAD と異なる tracked パスと未追跡パスを列挙"""
+    root_path = Path(root)
+    commands = [
+        ["git", "diff", "--name-only", "--no-renames", "-z", "HEAD"],
+        ["git", "ls-files", "--others", "--exclude-standard", "-z"],
+    ]
+    paths: set[str] = set()
+    for cmd in commands:
+        result = subprocess.run(
+            cmd,
+            cwd=root_path,
+            capture_output=True,
+            check=True,
+        )
+        raw = result.stdout.decode("utf-8", errors="replace")
+        paths.update(entry for entry in raw.split("\0") if entry)
+    return sorted(paths)
 
 
 def create_isolated_workspace(
@@ -1037,11 +2001,12 @@ def create_isolated_workspace(
             )
         except Exception:
             workspace_path.mkdir(parents=True, exist_ok=True)
-            sync_repo_state(source_path, workspace_path)
+            sync_stats = sync_repo_state(source_path, workspace_path)
             return IsolatedWorkspace(
                 path=workspace_path,
                 cleanup_root=cleanup_root,
                 mode="copy",
+                sync_stats=asdict(sync_stats),
             )
 
         with WORKTREE_LOCK:
@@ -1059,11 +2024,18 @@ def create_isolated_workspace(
                 check=True,
             )
             worktree_created = True
-        sync_repo_state(source_path, workspace_path)
+        # The new worktree already matches HEAD, so only paths that are
+        # dirty in the source tree need to be copied over.
+        sync_stats = sync_repo_paths(
+            source_path,
+            workspace_path,
+            list_dirty_repo_paths(source_path),
+        )
         return IsolatedWorkspace(
             path=workspace_path,
             cleanup_root=cleanup_root,
             mode="worktree",
+            sync_stats=asdict(sync_stats),
         )
     except Exception:
         if worktree_created:
@@ -1084,7 +2056,10 @@ def create_isolated_workspace(
         raise
 
 
-def cleanup_isolated_workspace(workspace: IsolatedWorkspace) -> None:
+def destroy_isolated_workspace(
+    workspace: IsolatedWorkspace,
+    source_root: str | Path | None = None,
+) -> None:
     if workspace.mode == "worktree":
         with WORKTREE_LOCK:
             subprocess.run(
@@ -1095,24 +2070,181 @@ def cleanup_isolated_workspace(workspace: IsolatedWorkspace) -> None:
                     "--force",
                     str(workspace.path),
                 ],
-                cwd=ROOT_DIR,
+                cwd=source_root or ROOT_DIR,
                 capture_output=True,
                 check=False,
             )
     shutil.rmtree(workspace.cleanup_root, ignore_errors=True)
 
 
-def resolve_workspace_workdir(
-    workdir: str | None,
-    workspace_root: str | Path,
-) -> str:
-    workspace_path = Path(workspace_root)
-    if workdir is None:
-        return str(workspace_path)
-    candidate = Path(workdir)
-    if not candidate.is_absolute():
-        relative = normalize_repo_relative_path(candidate.as_posix())
-        return str(workspace_path / relative)
+def cleanup_isolated_workspace(workspace: IsolatedWorkspace) -> None:
+    if workspace.pool is not None:
+        workspace.pool.release(workspace)
+        return
+    destroy_isolated_workspace(workspace)
+
+
+def reset_isolated_workspace(
+    workspace: IsolatedWorkspace,
+    source_root: str | Path,
+) -> None:
+    source_path = Path(source_root)
+    if workspace.mode != "worktree":
+        workspace.sync_stats = asdict(
+            sync_repo_state(source_path, workspace.path)
+        )
+        return
+    head = subprocess.run(
+        ["git", "rev-parse", "--verify", "HEAD"],
+        cwd=source_path,
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stdout.strip()
+    subprocess.run(
+        ["git", "checkout", "--detach", "--force", head],
+        cwd=workspace.path,
+        capture_output=True,
+        check=True,
+    )
+    subprocess.run(
+        ["git", "clean", "-ffdx"],
+        cwd=workspace.path,
+        capture_output=True,
+        check=True,
+    )
+    workspace.sync_stats = asdict(
+        sync_repo_paths(
+            source_path,
+            workspace.path,
+            list_dirty_repo_paths(source_path),
+        )
+    )
+
+
+class WorkspacePool:
+    """pipeline stage 用 isolated workspace の再利用プール
+
+    返却された workspace は次の acquire 時に source の HEAD へ reset し、
+    source 側で HEAD と異なるパスだけを同期してから払い出す。
+    read-only stage には acquire_shared で source 世代ごとに固定した
+    単一 workspace を参照カウント付きで共有する。
+    """
+
+    def __init__(self, source_root: str | Path, max_idle: int) -> None:
+        self.source_root = Path(source_root)
+        self.max_idle = max(0, max_idle)
+        self._idle: list[IsolatedWorkspace] = []
+        self._lock = threading.Lock()
+        self._shared_create_lock = threading.Lock()
+        self._generation = 0
+        self._shared: dict[Path, dict[str, Any]] = {}
+
+    def acquire(self, stage_label: str) -> IsolatedWorkspace:
+        while True:
+            with self._lock:
+                workspace = self._idle.pop() if self._idle else None
+            if workspace is None:
+                break
+            try:
+                reset_isolated_workspace(workspace, self.source_root)
+            except Exception:
+                destroy_isolated_workspace(workspace, self.source_root)
+                continue
+            workspace.pool = self
+            return workspace
+        workspace = create_isolated_workspace(self.source_root, stage_label)
+        workspace.pool = self
+        return workspace
+
+    def acquire_shared(self, stage_label: str) -> IsolatedWorkspace:
+        with self._shared_create_lock:
+            with self._lock:
+                entry = next(
+                    (
+                        item
+                        for item in self._shared.values()
+                        if item["generation"] == self._generation
+                    ),
+                    None,
+                )
+                if entry is not None:
+                    entry["refs"] += 1
+            sync_stats: dict[str, int] = {}
+            if entry is None:
+                base = self.acquire(stage_label)
+                base.pool = None
+                sync_stats = base.sync_stats
+                with self._lock:
+                    entry = {
+                        "workspace": base,
+                        "generation": self._generation,
+                        "refs": 1,
+                    }
+                    self._shared[base.path] = entry
+        base = entry["workspace"]
+        return IsolatedWorkspace(
+            path=base.path,
+            cleanup_root=base.cleanup_root,
+            mode="shared",
+            pool=self,
+            sync_stats=sync_stats,
+        )
+
+    def invalidate_shared(self) -> None:
+        """source への promote 後に呼び、以降の共有 workspace を作り直す"""
+        with self._lock:
+            self._generation += 1
+            stale = self._pop_unused_shared_locked()
+        for workspace in stale:
+            self.release(workspace)
+
+    def _pop_unused_shared_locked(self) -> list[IsolatedWorkspace]:
+        stale: list[IsolatedWorkspace] = []
+        for path, entry in list(self._shared.items()):
+            if entry["refs"] == 0 and entry["generation"] != self._generation:
+                stale.append(entry["workspace"])
+                del self._shared[path]
+        return stale
+
+    def release(self, workspace: IsolatedWorkspace) -> None:
+        workspace.pool = None
+        if workspace.mode == "shared":
+            with self._lock:
+                entry = self._shared.get(workspace.path)
+                if entry is None:
+                    return
+                entry["refs"] -= 1
+                stale = self._pop_unused_shared_locked()
+            for base in stale:
+                self.release(base)
+            return
+        with self._lock:
+            if len(self._idle) < self.max_idle:
+                self._idle.append(workspace)
+                return
+        destroy_isolated_workspace(workspace, self.source_root)
+
+    def close(self) -> None:
+        with self._lock:
+            idle, self._idle = self._idle, []
+            shared = [entry["workspace"] for entry in self._shared.values()]
+            self._shared = {}
+        for workspace in idle + shared:
+            destroy_isolated_workspace(workspace, self.source_root)
+
+
+def resolve_workspace_workdir(
+    workdir: str | None,
+    workspace_root: str | Path,
+) -> str:
+    workspace_path = Path(workspace_root)
+    if workdir is None:
+        return str(workspace_path)
+    candidate = Path(workdir)
+    if not candidate.is_absolute():
+        relative = normalize_repo_relative_path(candidate.as_posix())
+        return str(workspace_path / relative)
     try:
         relative = candidate.relative_to(ROOT_DIR)
     except ValueError:
@@ -1121,19 +2253,177 @@ def resolve_workspace_workdir(
     return str(workspace_path / normalized)
 
 
-def detect_conflicting_stage_changes(
+def _split_text_lines(data: bytes) -> list[str] | None:
+    if b"\0" in data:
+        return None
+    try:
+        return data.decode("utf-8").splitlines(keepends=True)
+    except UnicodeDecodeError:
+        return None
+
+
+def merge_text_three_way(
+    base: list[str],
+    ours: list[str],
+    theirs: list[str],
+) -> list[str] | None:
+    """base からの ours / theirs の hunk を合成する（真の衝突なら None）
+
+    同じ位置への純粋な挿入は changelog への追記のような変更を想定して ours →
+    theirs の順に連結する。base の同じ行に両側が異なる変更を加えた場合だけ
+    衝突とみなす。
+    """
+    hunks: list[tuple[int, int, int, list[str]]] = []
+    for side, other in enumerate((ours, theirs)):
+        matcher = difflib.SequenceMatcher(None, base, other, autojunk=False)
+        hunks.extend(
+            (i1, i2, side, other[j1:j2])
+            for tag, i1, i2, j1, j2 in matcher.get_opcodes()
+            if tag != "equal"
+        )
+    hunks.sort(key=lambda hunk: hunk[:3])
+    merged: list[str] = []
+    cursor = 0
+    previous: tuple[int, int, list[str]] | None = None
+    for start, end, _, lines in hunks:
+        if previous == (start, end, lines):
+            continue
+        if start < cursor:
+            return None
+        merged.extend(base[cursor:start])
+        merged.extend(lines)
+        cursor = end
+        previous = (start, end, lines)
+    merged.extend(base[cursor:])
+    return merged
+
+
+def _read_snapshot_entry_bytes(entry: RepoSnapshotEntry) -> bytes:
+    if entry.content is not None:
+        return entry.content
+    if entry.blob_path is not None:
+        return Path(entry.blob_path).read_bytes()
+    raise ValueError("file snapshot entry requires content")
+
+
+def merge_repo_snapshot_entries(
+    base: RepoSnapshotEntry | None,
+    entries: list[RepoSnapshotEntry | None],
+) -> tuple[bool, RepoSnapshotEntry | None]:
+    """同じパスへの複数 stage の変更を 1 つにまとめる（merge 可否, 結果）"""
+    identities = {
+        (
+            None
+            if entry is None
+            else (entry.kind, entry.mode, entry.digest, entry.link_target)
+        )
+        for entry in entries
+    }
+    if len(identities) == 1:
+        return True, entries[-1]
+    # 削除・symlink・新規作成の食い違いは行単位で合成できない
+    if base is None or base.kind != "file":
+        return False, None
+    file_entries = [
+        entry
+        for entry in entries
+        if entry is not None and entry.kind == "file"
+    ]
+    if len(file_entries) != len(entries):
+        return False, None
+    changed_modes = {
+        entry.mode for entry in file_entries if entry.mode != base.mode
+    }
+    if len(changed_modes) > 1:
+        return False, None
+    base_lines = _split_text_lines(_read_snapshot_entry_bytes(base))
+    if base_lines is None:
+        return False, None
+    merged: list[str] | None = None
+    for entry in file_entries:
+        lines = _split_text_lines(_read_snapshot_entry_bytes(entry))
+        if lines is None:
+            return False, None
+        merged = (
+            lines
+            if merged is None
+            else merge_text_three_way(base_lines, merged, lines)
+        )
+        if merged is None:
+            return False, None
+    content = "".join(merged or []).encode("utf-8")
+    return True, RepoSnapshotEntry(
+        kind="file",
+        mode=changed_modes.pop() if changed_modes else base.mode,
+        mtime_ns=time.time_ns(),
+        content=content,
+        size=len(content),
+        digest=hashlib.sha256(content).hexdigest(),
+    )
+
+
+def load_stage_repo_changes(
+    outcome: dict[str, Any],
+) -> dict[str, RepoSnapshotEntry | None]:
+    # stage キャッシュから再生した outcome は workspace を持たず変更だけを持つ
+    changes = outcome.get("repo_changes")
+    if changes is None:
+        workspace = outcome.get("workspace")
+        if workspace is None:
+            return {}
+        promotable_files = list(outcome.get("promotable_files") or [])
+        snapshot = capture_repo_paths(workspace.path, promotable_files)
+        changes = build_repo_change_set(snapshot, promotable_files)
+        outcome["repo_changes"] = changes
+    return changes
+
+
+def merge_parallel_stage_changes(
     stage_outcomes: list[dict[str, Any]],
-) -> list[str]:
-    changed_by_path: dict[str, str] = {}
-    conflicts: set[str] = set()
+    root: str | Path = ROOT_DIR,
+) -> tuple[list[str], list[str]]:
+    """同じファイルを変えた並列 stage の変更を pre-stage snapshot を base に合成する
+
+    合成結果は最後に promote する outcome にだけ残し、(merged, conflicts) を
+    返す。base の内容を source tree から取り込めない（キャッシュから再生した、
+    または workspace 作成後に source が変わった）場合は root の現在の内容を
+    base にする。重なる write_roots の promote は保留されるので同じ内容になる。
+    """
+    touched: dict[str, list[dict[str, Any]]] = {}
     for outcome in stage_outcomes:
-        for rel_path in outcome.get("promotable_files", []):
-            previous_stage = changed_by_path.get(rel_path)
-            if previous_stage and previous_stage != outcome["policy"].stage_id:
-                conflicts.add(rel_path)
-            else:
-                changed_by_path[rel_path] = outcome["policy"].stage_id
-    return sorted(conflicts)
+        for rel_path in load_stage_repo_changes(outcome):
+            touched.setdefault(rel_path, []).append(outcome)
+    merged_files: list[str] = []
+    conflicts: list[str] = []
+    for rel_path in sorted(touched):
+        outcomes = touched[rel_path]
+        if len(outcomes) < 2:
+            continue
+        base: RepoSnapshotEntry | None = None
+        hydrated = False
+        for outcome in outcomes:
+            if rel_path not in (outcome.get("base_entries") or {}):
+                continue
+            hydrated, base = hydrate_snapshot_entry(
+                outcome["base_entries"][rel_path],
+                Path(outcome.get("base_root") or root) / rel_path,
+            )
+            if hydrated:
+                break
+        if not hydrated:
+            base = capture_repo_paths(root, [rel_path]).get(rel_path)
+        mergeable, entry = merge_repo_snapshot_entries(
+            base,
+            [outcome["repo_changes"][rel_path] for outcome in outcomes],
+        )
+        if not mergeable:
+            conflicts.append(rel_path)
+            continue
+        for outcome in outcomes[:-1]:
+            del outcome["repo_changes"][rel_path]
+        outcomes[-1]["repo_changes"][rel_path] = entry
+        merged_files.append(rel_path)
+    return merged_files, conflicts
 
 
 def cleanup_stage_workspace(outcome: dict[str, Any]) -> None:
@@ -1148,18 +2438,21 @@ def promote_stage_workspace(
     outcome: dict[str, Any],
     root: str | Path = ROOT_DIR,
 ) -> None:
-    workspace = outcome.get("workspace")
-    if workspace is None:
-        return
-    snapshot = capture_repo_snapshot(workspace.path)
-    changes = build_repo_change_set(
-        snapshot,
-        list(outcome.get("promotable_files") or []),
-    )
-    apply_repo_changes(changes, root=root)
+    apply_repo_changes(load_stage_repo_changes(outcome), root=root)
     cleanup_stage_workspace(outcome)
 
 
+def store_stage_cache_entry(outcome: dict[str, Any]) -> None:
+    """commit と promote が成功した stage だけをキャッシュに書く
+
+    patch の適用失敗やグループの衝突で捨てた結果を再生し続けないよう、
+    StageExecutionContext.finish ではなく commit 側から呼ぶ。
+    """
+    entry = outcome.pop("cache_entry", None)
+    if entry is not None:
+        get_stage_cache().put(entry["key"], entry["payload"])
+
+
 def select_capsule_inputs(
     capsule: dict[str, Any],
     input_keys: list[str],
@@ -1168,9 +2461,11 @@ def select_capsule_inputs(
         "schema_version": capsule.get("schema_version"),
         "pipeline_run_id": capsule.get("pipeline_run_id"),
     }
+    # capsule は変更しない値として扱う（apply_capsule_patch が経路だけを
+    # コピーする）ので、部分木は複製せずに共有する
     for key in input_keys:
         if key in capsule:
-            selected[key] = json.loads(json.dumps(capsule[key]))
+            selected[key] = capsule[key]
     return selected
 
 
@@ -1188,13 +2483,145 @@ def get_pipeline_state_path(
     return get_pipeline_artifact_dir(log_dir, pipeline_run_id) / "state.json"
 
 
+def get_pipeline_journal_path(state_path: str | Path) -> Path:
+    return Path(state_path).with_name(PIPELINE_STATE_JOURNAL_NAME)
+
+
+def _fsync_directory(directory: Path) -> None:
+    try:
+        dir_fd = os.open(directory, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(dir_fd)
+    except OSError:
+        pass
+    finally:
+        os.close(dir_fd)
+
+
 def write_pipeline_state(path: str | Path, payload: dict[str, Any]) -> None:
+    """スナップショットを一時ファイル + fsync + rename で原子的に書く"""
     state_path = Path(path)
     state_path.parent.mkdir(parents=True, exist_ok=True)
-    state_path.write_text(
-        json.dumps(payload, ensure_ascii=False, indent=2),
-        encoding="utf-8",
+    fd, tmp_name = tempfile.mkstemp(
+        prefix=".state-", suffix=".tmp", dir=state_path.parent
+    )
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(payload, f, ensure_ascii=False, separators=(",", ":"))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_name, state_path)
+    except BaseException:
+        Path(tmp_name).unlink(missing_ok=True)
+        raise
+    _fsync_directory(state_path.parent)
+
+
+class PipelineCheckpoint:
+    """パイプライン状態のチェックポイント（追記ジャーナル + 圧縮スナップショット）
+
+    ステージごとの差分は state.journal.jsonl へ 1 行ずつ追記して fsync し、
+    compact_every 件ごとに state.json を原子的に書き直してジャーナルを空にする。
+    レコードの seq とスナップショットの checkpoint_seq を突き合わせるので、
+    スナップショット後・ジャーナル切り詰め前に落ちても二重適用しない。
+    """
+
+    def __init__(
+        self,
+        state_path: str | Path,
+        seq: int = 0,
+        compact_every: int = PIPELINE_STATE_COMPACT_EVERY,
+    ) -> None:
+        self.state_path = Path(state_path)
+        self.journal_path = get_pipeline_journal_path(self.state_path)
+        self.seq = seq
+        self.compact_every = max(1, compact_every)
+        self.pending = 0
+
+    def append(self, record: dict[str, Any]) -> None:
+        self.seq += 1
+        line = json.dumps(
+            {"seq": self.seq, **record},
+            ensure_ascii=False,
+            separators=(",", ":"),
+        )
+        self.journal_path.parent.mkdir(parents=True, exist_ok=True)
+        with self.journal_path.open("a", encoding="utf-8") as f:
+            f.write(line + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        self.pending += 1
+
+    def should_compact(self) -> bool:
+        return self.pending >= self.compact_every
+
+    def compact(self, payload: dict[str, Any]) -> None:
+        write_pipeline_state(
+            self.state_path, {**payload, "checkpoint_seq": self.seq}
+        )
+        # スナップショットに取り込み済みなのでジャーナルは捨ててよい
+        self.journal_path.unlink(missing_ok=True)
+        self.pending = 0
+
+
+def replay_pipeline_journal(
+    state: dict[str, Any],
+    journal_path: str | Path,
+) -> dict[str, Any]:
+    """スナップショットにジャーナルの未反映レコードを順に適用する"""
+    path = Path(journal_path)
+    if not path.exists():
+        return state
+    replayed = dict(state)
+    seq = int(replayed.get("checkpoint_seq") or 0)
+    capsule = replayed.get("capsule") or {}
+    stage_results = list(replayed.get("stage_results") or [])
+    stage_logs = list(replayed.get("stage_logs") or [])
+    attempts_by_stage = dict(replayed.get("attempts_by_stage") or {})
+    completed_stage_ids = set(replayed.get("completed_stage_ids") or [])
+    with path.open(encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                # 追記途中で落ちた末尾行は捨てる
+                break
+            if not isinstance(record, dict):
+                break
+            record_seq = int(record.get("seq") or 0)
+            if record_seq <= seq:
+                continue
+            kind = record.get("type")
+            if kind == "stage_outcome":
+                attempts_by_stage[str(record["stage_id"])] = int(
+                    record["attempt_count"]
+                )
+                stage_logs.extend(record.get("attempt_logs") or [])
+                stage_results.append(record["stage_result"])
+                if record.get("unauthorized_write"):
+                    replayed["unauthorized_write_detected"] = True
+            elif kind == "commit":
+                capsule = apply_capsule_patch(
+                    capsule, record.get("capsule_patch") or []
+                )
+                completed_stage_ids.update(record.get("stage_ids") or [])
+            elif kind == "final":
+                replayed["success"] = record.get("success")
+                replayed["error_message"] = record.get("error_message", "")
+            seq = record_seq
+    replayed.update(
+        {
+            "capsule": capsule,
+            "stage_results": stage_results,
+            "stage_logs": stage_logs,
+            "attempts_by_stage": attempts_by_stage,
+            "completed_stage_ids": sorted(completed_stage_ids),
+            "checkpoint_seq": seq,
+        }
     )
+    return replayed
 
 
 def load_pipeline_state(path: str | Path) -> dict[str, Any]:
@@ -1204,8 +2631,11 @@ def load_pipeline_state(path: str | Path) -> dict[str, Any]:
     if not state_path.exists():
         raise ValueError("resume state not found")
     try:
-        return json.loads(state_path.read_text(encoding="utf-8"))
-    except (OSError, json.JSONDecodeError) as exc:
+        state = json.loads(state_path.read_text(encoding="utf-8"))
+        return replay_pipeline_journal(
+            state, get_pipeline_journal_path(state_path)
+        )
+    except (OSError, json.JSONDecodeError, KeyError) as exc:
         raise ValueError("resume state is invalid") from exc
 
 
@@ -1245,16 +2675,64 @@ def resolve_capsule_path(
     return Path(log_dir) / "artifacts" / pipeline_run_id / "capsule.json"
 
 
-def serialize_capsule(capsule: dict[str, Any]) -> str:
+def serialize_capsule(capsule: dict[str, Any], compact: bool = False) -> str:
     return json.dumps(
         capsule,
         sort_keys=True,
         ensure_ascii=False,
         separators=(",", ":"),
-        indent=2,
+        indent=None if compact else 2,
     )
 
 
+def _truncate_capsule_strings(value: Any, max_chars: int) -> tuple[Any, int]:
+    if isinstance(value, str):
+        if len(value) <= max_chars:
+            return value, 0
+        return truncate_output(value, max_chars), 1
+    if isinstance(value, list):
+        items = [_truncate_capsule_strings(v, max_chars) for v in value]
+        return [v for v, _ in items], sum(n for _, n in items)
+    if isinstance(value, dict):
+        items = {
+            k: _truncate_capsule_strings(v, max_chars)
+            for k, v in value.items()
+        }
+        return {k: v for k, (v, _) in items.items()}, sum(
+            n for _, n in items.values()
+        )
+    return value, 0
+
+
+def summarize_capsule(
+    capsule: dict[str, Any],
+    max_items: int = CAPSULE_COMPACT_LIST_ITEMS,
+    max_chars: int = CAPSULE_COMPACT_STRING_CHARS,
+) -> dict[str, Any]:
+    """長い配列は末尾 max_items 件、長い文字列は先頭 max_chars 文字に縮める
+
+    配列の index を JSON Patch で参照できるよう、省略した件数と表示中の
+    先頭 index を capsule_compaction に残す。
+    """
+    summarized: dict[str, Any] = {}
+    notes: dict[str, Any] = {}
+    for key, value in capsule.items():
+        if key in {"schema_version", "pipeline_run_id"}:
+            summarized[key] = value
+            continue
+        if isinstance(value, list) and len(value) > max_items:
+            omitted = len(value) - max_items
+            value = value[omitted:]
+            notes[key] = {"omitted_items": omitted, "first_index": omitted}
+        value, truncated = _truncate_capsule_strings(value, max_chars)
+        if truncated:
+            notes.setdefault(key, {})["truncated_strings"] = truncated
+        summarized[key] = value
+    if notes:
+        summarized["capsule_compaction"] = notes
+    return summarized
+
+
 def _extract_json_object(text: str) -> dict[str, Any]:
     decoder = json.JSONDecoder()
     idx = 0
@@ -1296,6 +2774,7 @@ def build_stage_prompt(
     stage_spec: dict[str, Any] | None,
     allow_dynamic: bool,
     stage_policy: StageExecutionPolicy | None = None,
+    compact_capsule: bool = False,
 ) -> str:
     if capsule_store not in {"embed", "file"}:
         raise ValueError("capsule_store must be embed|file")
@@ -1324,6 +2803,15 @@ def build_stage_prompt(
                 else "(none)"
             )
         )
+        if stage_policy.patch_prefixes is not None:
+            policy_lines.append(
+                "- Allowed capsule_patch prefixes: "
+                + (
+                    ", ".join(stage_policy.patch_prefixes)
+                    if stage_policy.patch_prefixes
+                    else "(none)"
+                )
+            )
         if stage_policy.node_kind == "manager":
             policy_lines.extend(
                 [
@@ -1351,7 +2839,9 @@ def build_stage_prompt(
         policy_block = "Stage Policy:\n" + "\n".join(policy_lines) + "\n\n"
 
     if capsule_store == "embed":
-        capsule_block = f"CAPSULE_JSON:\n{serialize_capsule(capsule)}"
+        capsule_block = (
+            f"CAPSULE_JSON:\n{serialize_capsule(capsule, compact_capsule)}"
+        )
     else:
         capsule_block = f"CAPSULE_PATH: {capsule_path}"
 
@@ -1393,6 +2883,106 @@ def build_stage_prompt(
     )
 
 
+@dataclass
+class StagePromptBudget:
+    """予算内に収めた stage prompt と、圧縮の経過"""
+
+    prompt: str
+    capsule: dict[str, Any]
+    capsule_store: str
+    capsule_path: Path | None
+    max_chars: int | None
+    before_chars: int
+    steps: list[str] = field(default_factory=list)
+
+    def to_log(self) -> dict[str, Any]:
+        return {
+            "max_total_prompt_chars": self.max_chars,
+            "before_chars": self.before_chars,
+            "after_chars": len(self.prompt),
+            "steps": self.steps,
+            "capsule_store": self.capsule_store,
+        }
+
+
+def budget_stage_prompt(
+    stage_id: str,
+    base_prompt: str,
+    capsule: dict[str, Any],
+    capsule_store: str,
+    capsule_path: str | Path | None,
+    stage_spec: dict[str, Any] | None,
+    max_total_prompt_chars: int | None,
+    allow_dynamic: bool,
+    stage_policy: StageExecutionPolicy | None = None,
+    file_fallback_path: str | Path | None = None,
+) -> StagePromptBudget:
+    """予算超過時は capsule を段階的に圧縮してから上限を確認する
+
+    minify → 長い配列/文字列の要約 →（file_fallback_path があれば）
+    ファイル渡し、の順に試し、収まった時点で止める。input_keys による
+    絞り込みは呼び出し側（select_capsule_inputs）で済んでいる前提。
+    どれでも収まらなければ ensure_prompt_limit で拒否する。
+    """
+
+    def build(
+        current: dict[str, Any], store: str, path: Any, compact: bool
+    ) -> str:
+        return build_stage_prompt(
+            stage_id=stage_id,
+            base_prompt=base_prompt,
+            capsule=current,
+            capsule_store=store,
+            capsule_path=path,
+            stage_spec=stage_spec,
+            stage_policy=stage_policy,
+            allow_dynamic=allow_dynamic,
+            compact_capsule=compact,
+        )
+
+    prompt = build(capsule, capsule_store, capsule_path, False)
+    budget = StagePromptBudget(
+        prompt=prompt,
+        capsule=capsule,
+        capsule_store=capsule_store,
+        capsule_path=Path(capsule_path) if capsule_path else None,
+        max_chars=max_total_prompt_chars,
+        before_chars=len(prompt),
+    )
+
+    def fits() -> bool:
+        return (
+            max_total_prompt_chars is None
+            or len(budget.prompt) <= max_total_prompt_chars
+        )
+
+    if capsule_store == "embed":
+        current = capsule
+        compactions: list[tuple[str, Any]] = [
+            ("minify", lambda c: c),
+            ("summarize", summarize_capsule),
+        ]
+        for step, compact in compactions:
+            if fits():
+                break
+            compacted = compact(current)
+            if step != "minify" and compacted == current:
+                continue
+            current = compacted
+            budget.prompt = build(current, "embed", None, True)
+            budget.capsule = current
+            budget.steps.append(step)
+        if not fits() and file_fallback_path is not None:
+            budget.capsule = capsule
+            budget.capsule_store = "file"
+            budget.capsule_path = Path(file_fallback_path)
+            budget.prompt = build(capsule, "file", file_fallback_path, True)
+            budget.steps.append("file")
+
+    ensure_prompt_limit(budget.prompt, max_total_prompt_chars)
+    return budget
+
+
 def prepare_stage_prompt(
     stage_id: str,
     base_prompt: str,
@@ -1404,7 +2994,7 @@ def prepare_stage_prompt(
     allow_dynamic: bool,
     stage_policy: StageExecutionPolicy | None = None,
 ) -> str:
-    prompt = build_stage_prompt(
+    return budget_stage_prompt(
         stage_id=stage_id,
         base_prompt=base_prompt,
         capsule=capsule,
@@ -1412,10 +3002,9 @@ def prepare_stage_prompt(
         capsule_path=capsule_path,
         stage_spec=stage_spec,
         stage_policy=stage_policy,
+        max_total_prompt_chars=max_total_prompt_chars,
         allow_dynamic=allow_dynamic,
-    )
-    ensure_prompt_limit(prompt, max_total_prompt_chars)
-    return prompt
+    ).prompt
 
 
 def stage_result_from_exec_failure(
@@ -1457,8 +3046,13 @@ def build_stage_log(
             "agent_id": exec_result.agent_id,
             "model": exec_result.metadata.get("model"),
             "output": truncate_output(exec_result.output),
+            "output_chars": len(exec_result.output),
             "stderr": truncate_output(exec_result.stderr),
             "tokens_used": exec_result.tokens_used,
+            "input_tokens": exec_result.input_tokens,
+            "output_tokens": exec_result.output_tokens,
+            "cached_input_tokens": exec_result.cached_input_tokens,
+            "token_source": exec_result.token_source,
             "execution_time": exec_result.execution_time,
             "success": exec_result.success,
             "returncode": exec_result.returncode,
@@ -1466,6 +3060,7 @@ def build_stage_log(
             "timeout_seconds": exec_result.timeout_seconds,
             "output_is_partial": exec_result.output_is_partial,
             "error_message": exec_result.error_message,
+            "event_log": exec_result.metadata.get("event_log"),
         },
         "stage_result": stage_result,
     }
@@ -1662,6 +3257,23 @@ def write_capsule_file(path: str | Path, capsule: dict[str, Any]) -> None:
     capsule_path.write_text(serialize_capsule(capsule), encoding="utf-8")
 
 
+def write_capsule_blob(path: str | Path, capsule: dict[str, Any]) -> bool:
+    """内容アドレス化された capsule を書く（既にあれば書かずに False）"""
+    blob_path = Path(path)
+    if blob_path.exists():
+        return False
+    blob_path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp_name = tempfile.mkstemp(prefix=".capsule-", dir=blob_path.parent)
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(serialize_capsule(capsule))
+        os.replace(tmp_name, blob_path)
+    except BaseException:
+        Path(tmp_name).unlink(missing_ok=True)
+        raise
+    return True
+
+
 def resolve_capsule_delivery(
     store_mode_arg: str,
     capsule: dict[str, Any],
@@ -1711,6 +3323,38 @@ def _is_allowed_patch_path(path: str) -> bool:
     return False
 
 
+def patch_ops_within_prefixes(
+    ops: list[dict[str, Any]],
+    prefixes: list[str],
+) -> bool:
+    for op in ops:
+        path = op.get("path") if isinstance(op, dict) else None
+        if not isinstance(path, str):
+            return False
+        if not any(
+            path == prefix or path.startswith(prefix.rstrip("/") + "/")
+            for prefix in prefixes
+        ):
+            return False
+    return True
+
+
+def can_speculate_stage(
+    stage_spec: dict[str, Any],
+    upstream_spec: dict[str, Any],
+) -> bool:
+    """upstream の patch が stage の入力に届かないと宣言されていれば先行実行できる
+
+    patch_prefixes を宣言しない upstream は capsule のどこでも書けるので予測しない。
+    repo を書く stage は upstream の promote 前の tree を見てしまうので対象外。
+    """
+    prefixes = upstream_spec.get("patch_prefixes")
+    if prefixes is None or stage_spec.get("write_roots"):
+        return False
+    written_keys = {prefix.split("/")[1] for prefix in prefixes}
+    return not written_keys.intersection(stage_spec.get("input_keys") or [])
+
+
 def validate_patch_ops(ops: list[dict[str, Any]]) -> None:
     if not isinstance(ops, list):
         raise ValueError("capsule_patch must be an array")
@@ -1816,7 +3460,22 @@ def _parse_json_pointer(path: str) -> list[str]:
     return [_decode_pointer_segment(p) for p in parts]
 
 
-def _resolve_parent(container: Any, pointer: list[str]) -> tuple[Any, str]:
+def _own_container(node: Any, owned: dict[int, Any]) -> Any:
+    """このパッチ適用中に作った複製でなければ浅くコピーして所有する"""
+    if id(node) in owned or not isinstance(node, list | dict):
+        return node
+    copy = list(node) if isinstance(node, list) else dict(node)
+    # 参照を保持して id の再利用による取り違えを防ぐ
+    owned[id(copy)] = copy
+    return copy
+
+
+def _resolve_parent(
+    container: Any,
+    pointer: list[str],
+    owned: dict[int, Any] | None = None,
+) -> tuple[Any, str]:
+    """pointer の親を返す（owned 指定時は経路上のコンテナを copy-on-write）"""
     if not pointer:
         raise ValueError("json pointer cannot be empty")
     current = container
@@ -1830,14 +3489,18 @@ def _resolve_parent(container: Any, pointer: list[str]) -> tuple[Any, str]:
                 raise ValueError("json pointer index is invalid") from exc
             if index < 0 or index >= len(current):
                 raise ValueError("json pointer index out of range")
-            current = current[index]
-            continue
-        if isinstance(current, dict):
+            step: int | str = index
+        elif isinstance(current, dict):
             if segment not in current:
                 raise ValueError("json pointer path not found")
-            current = current[segment]
-            continue
-        raise ValueError("json pointer path not found")
+            step = segment
+        else:
+            raise ValueError("json pointer path not found")
+        child = current[step]
+        if owned is not None:
+            child = _own_container(child, owned)
+            current[step] = child
+        current = child
     return current, pointer[-1]
 
 
@@ -1845,14 +3508,20 @@ def apply_capsule_patch(
     capsule: dict[str, Any],
     ops: list[dict[str, Any]],
 ) -> dict[str, Any]:
+    """JSON Patch を適用した新しい capsule を返す（入力は変更しない）
+
+    変更される経路上の dict/list だけを浅くコピーし、それ以外の部分木は
+    元の capsule と共有する（構造共有）。
+    """
     validate_patch_ops(ops)
-    updated = json.loads(json.dumps(capsule))
+    owned: dict[int, Any] = {}
+    updated = _own_container(capsule, owned)
     for op in ops:
         op_name = op["op"]
         path = op["path"]
         value = op.get("value")
         pointer = _parse_json_pointer(path)
-        parent, key = _resolve_parent(updated, pointer)
+        parent, key = _resolve_parent(updated, pointer, owned)
         if op_name == "add":
             if isinstance(parent, list):
                 if key == "-":
@@ -2041,6 +3710,161 @@ def _decode_text(data: bytes | str | None) -> str:
     return data
 
 
+TOKENIZER_ENV = "CODEX_SUBAGENT_TOKENIZER"
+_TOKENS_USED_RE = re.compile(r"tokens used\b[:\s]*([\d,]+)", re.IGNORECASE)
+
+
+@dataclass
+class TokenUsage:
+    """codex exec 1 回分のトークン数（source は取得元）"""
+
+    input_tokens: int = 0
+    output_tokens: int = 0
+    cached_input_tokens: int = 0
+    total_tokens: int = 0
+    source: str = ""
+
+
+def _count_tokens_bytes(text: str) -> int:
+    # 英文は 1 token ≒ 4 bytes、日本語は 1 文字 ≒ 3 bytes でおおむね一致する
+    return (len(text.encode("utf-8")) + 3) // 4
+
+
+_TIKTOKEN_ENCODING: Any = None
+
+
+def _count_tokens_tiktoken(text: str) -> int:
+    global _TIKTOKEN_ENCODING
+    if _TIKTOKEN_ENCODING is None:
+        import tiktoken
+
+        _TIKTOKEN_ENCODING = tiktoken.get_encoding("o200k_base")
+    return len(_TIKTOKEN_ENCODING.encode(text, disallowed_special=()))
+
+
+_TOKENIZERS: dict[str, Callable[[str], int]] = {
+    "bytes": _count_tokens_bytes,
+    "tiktoken": _count_tokens_tiktoken,
+}
+
+
+def register_tokenizer(name: str, count: Callable[[str], int]) -> None:
+    """ローカル推定に使うトークナイザを登録（env TOKENIZER_ENV で選択）"""
+    _TOKENIZERS[name] = count
+
+
+def resolve_tokenizer(
+    name: str | None = None,
+) -> tuple[str, Callable[[str], int]]:
+    requested = name or os.environ.get(TOKENIZER_ENV) or "auto"
+    if requested == "auto":
+        try:
+            import tiktoken  # noqa: F401
+        except ImportError:
+            requested = "bytes"
+        else:
+            requested = "tiktoken"
+    count = _TOKENIZERS.get(requested)
+    if count is None:
+        print(
+            f"Warning: unknown tokenizer {requested!r}, using bytes",
+            file=sys.stderr,
+        )
+        requested, count = "bytes", _count_tokens_bytes
+    return requested, count
+
+
+def _usage_from_dict(usage: dict[str, Any], source: str) -> TokenUsage:
+    def as_int(key: str) -> int:
+        value = usage.get(key)
+        return int(value) if isinstance(value, int | float) else 0
+
+    input_tokens = as_int("input_tokens")
+    output_tokens = as_int("output_tokens")
+    return TokenUsage(
+        input_tokens=input_tokens,
+        output_tokens=output_tokens,
+        cached_input_tokens=as_int("cached_input_tokens"),
+        total_tokens=as_int("total_tokens") or input_tokens + output_tokens,
+        source=source,
+    )
+
+
+def parse_codex_usage(stdout_text: str, stderr_text: str) -> TokenUsage | None:
+    """codex 自身が出す使用量を読む
+
+    JSON イベント（turn.completed の usage / token_count の
+    total_token_usage）を優先し、無ければテキストモードの
+    "tokens used" 行から合計だけを拾う。
+    """
+    turns: list[TokenUsage] = []
+    cumulative: TokenUsage | None = None
+    for text in (stdout_text, stderr_text):
+        for line in text.splitlines():
+            line = line.strip()
+            if not line.startswith("{"):
+                continue
+            try:
+                event = json.loads(line)
+            except ValueError:
+                continue
+            if not isinstance(event, dict):
+                continue
+            if event.get("type") == "turn.completed" and isinstance(
+                event.get("usage"), dict
+            ):
+                turns.append(_usage_from_dict(event["usage"], "codex"))
+                continue
+            payload = event.get("payload") or event.get("msg") or {}
+            info = payload.get("info") if isinstance(payload, dict) else None
+            total = info.get("total_token_usage") if info else None
+            if isinstance(total, dict):
+                cumulative = _usage_from_dict(total, "codex")
+    if turns:
+        return TokenUsage(
+            input_tokens=sum(u.input_tokens for u in turns),
+            output_tokens=sum(u.output_tokens for u in turns),
+            cached_input_tokens=sum(u.cached_input_tokens for u in turns),
+            total_tokens=sum(u.total_tokens for u in turns),
+            source="codex",
+        )
+    if cumulative is not None:
+        return cumulative
+
+    for text in (stderr_text, stdout_text):
+        matches = _TOKENS_USED_RE.findall(text)
+        if matches:
+            return TokenUsage(
+                total_tokens=int(matches[-1].replace(",", "")),
+                source="codex_total",
+            )
+    return None
+
+
+def account_tokens(
+    prompt: str, stdout_text: str, stderr_text: str
+) -> TokenUsage:
+    """codex の使用量を優先し、足りない内訳はローカルトークナイザで推定"""
+    usage = parse_codex_usage(stdout_text, stderr_text)
+    if usage is not None and usage.source == "codex":
+        return usage
+    name, count = resolve_tokenizer()
+    input_tokens = count(prompt)
+    output_tokens = count(stdout_text)
+    if usage is not None:
+        # 合計は codex の値を使い、入出力の内訳だけ推定で埋める
+        usage.input_tokens = input_tokens
+        usage.output_tokens = output_tokens
+        usage.source = f"codex_total+{name}"
+        return usage
+    return TokenUsage(
+        input_tokens=input_tokens,
+        output_tokens=output_tokens,
+        total_tokens=input_tokens + output_tokens,
+        source=name,
+    )
+
+
 def _terminate_process_group_sync(
     proc: subprocess.Popen[str],
     grace_seconds: float = 1.5,
@@ -2066,6 +3890,14 @@ def _terminate_process_group_sync(
         pass
 
 
+def _kill_process_group(pid: int) -> None:
+    """leader の終了後も pipe を握る子孫が残っていればグループごと止める"""
+    try:
+        os.killpg(pid, signal.SIGKILL)
+    except (ProcessLookupError, PermissionError):
+        pass
+
+
 async def _terminate_process_group_async(
     process: asyncio.subprocess.Process,
     grace_seconds: float = 1.5,
@@ -2088,47 +3920,212 @@ async def _terminate_process_group_async(
     await process.wait()
 
 
-async def _collect_stream(
-    stream: asyncio.StreamReader | None,
-    max_bytes: int = MAX_CAPTURE_BYTES,
-) -> tuple[bytes, bool]:
-    if stream is None:
-        return b"", False
-    buf = bytearray()
-    truncated = False
+async def _wait_process_exit(
+    process: asyncio.subprocess.Process, timeout: float
+) -> bool:
+    """プロセスの終了を待つ（timeout までに終わらなければ False）
+
+    Python 3.11 の wait() は pipe が閉じるまで返らないので、子孫が pipe を
+    開いたままでも終了を検知できるよう returncode も確認する。
+    """
+    deadline = time.monotonic() + timeout
+    waiter = asyncio.ensure_future(process.wait())
     try:
-        while True:
-            chunk = await stream.read(4096)
-            if not chunk:
-                break
-            if len(buf) < max_bytes:
-                remaining = max_bytes - len(buf)
-                buf.extend(chunk[:remaining])
-                if len(chunk) > remaining:
-                    truncated = True
-            else:
-                truncated = True
-    except asyncio.CancelledError:
-        # Return what we have (partial) on cancellation.
-        pass
-    return bytes(buf), truncated
+        while process.returncode is None:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            await asyncio.wait(
+                [waiter], timeout=min(PROCESS_EXIT_POLL_SECONDS, remaining)
+            )
+        return True
+    finally:
+        waiter.cancel()
 
 
-# ============================================================================
-# LLM-as-Judge (using codex exec)
-# ============================================================================
+class ExecEventLog:
+    """codex exec 1 回分の出力を逐次追記する JSONL イベントファイル
 
+    1 行 1 イベントで書き込み毎に flush するため、プロセスが途中で落ちても
+    そこまでの出力が残り、別プロセスから tail で進捗を追える。
+    """
 
-async def evaluate_with_llm(
-    output: str,
-    prompt: str,
-    task_type: TaskType,
-    timeout: int = 60,
-    profile: str | None = None,
-    model: str | None = None,
-) -> dict[str, Any] | None:
-    """codex exec を使った LLM 評価"""
-    eval_prompt = f"""You are an expert code evaluator. Evaluate the following output.
+    def __init__(self, path: str | Path) -> None:
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._file = open(self.path, "a", encoding="utf-8")
+        self._lock = threading.Lock()
+
+    def emit(self, event: str, **fields: Any) -> None:
+        record = {"ts": datetime.now(UTC).isoformat(), "event": event}
+        record.update(fields)
+        line = json.dumps(record, ensure_ascii=False) + "\n"
+        with self._lock:
+            if self._file.closed:
+                return
+            self._file.write(line)
+            self._file.flush()
+
+    def close(self) -> None:
+        with self._lock:
+            self._file.close()
+
+
+def open_exec_event_log(path: str | Path | None) -> ExecEventLog | None:
+    if path is None:
+        return None
+    try:
+        return ExecEventLog(path)
+    except OSError as e:
+        print(f"Warning: Failed to open event log: {e}", file=sys.stderr)
+        return None
+
+
+class StreamCapture:
+    """stdout/stderr を上限付きリングバッファへ取り込み、イベントログへ流す
+
+    保持するのは末尾 max_bytes のみで、溢れた分は truncated として扱う。
+    """
+
+    def __init__(
+        self,
+        name: str,
+        max_bytes: int | None = None,
+        event_log: ExecEventLog | None = None,
+    ) -> None:
+        self.name = name
+        if max_bytes is None:
+            max_bytes = MAX_CAPTURE_BYTES
+        self.max_bytes = max(0, max_bytes)
+        self.event_log = event_log
+        self.total_bytes = 0
+        self.truncated = False
+        self._chunks: deque[bytes] = deque()
+        self._size = 0
+        self._decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        # pump スレッドが書き込み中でも getvalue() で一貫した内容を読む
+        self._lock = threading.Lock()
+
+    def feed(self, chunk: bytes) -> None:
+        if not chunk:
+            return
+        with self._lock:
+            self._feed_locked(chunk)
+
+    def _feed_locked(self, chunk: bytes) -> None:
+        self.total_bytes += len(chunk)
+        if self.event_log is not None:
+            text = self._decoder.decode(chunk)
+            if text:
+                self.event_log.emit(self.name, data=text)
+        self._chunks.append(chunk)
+        self._size += len(chunk)
+        while self._size > self.max_bytes:
+            self.truncated = True
+            head = self._chunks.popleft()
+            overflow = self._size - self.max_bytes
+            if len(head) > overflow:
+                self._chunks.appendleft(head[overflow:])
+                self._size -= overflow
+            else:
+                self._size -= len(head)
+
+    def finish(self) -> None:
+        if self.event_log is not None:
+            text = self._decoder.decode(b"", final=True)
+            if text:
+                self.event_log.emit(self.name, data=text)
+
+    def getvalue(self) -> bytes:
+        with self._lock:
+            return b"".join(self._chunks)
+
+
+def _pump_stream_sync(stream: Any, capture: StreamCapture) -> None:
+    try:
+        while True:
+            chunk = stream.read1(STREAM_READ_CHUNK_BYTES)
+            if not chunk:
+                break
+            capture.feed(chunk)
+    except (OSError, ValueError):
+        pass
+    finally:
+        capture.finish()
+
+
+def _join_stream_pumps(
+    pumps: list[threading.Thread | None],
+    timeout: float,
+) -> bool:
+    deadline = time.monotonic() + timeout
+    for pump in pumps:
+        if pump is not None:
+            pump.join(timeout=max(0.0, deadline - time.monotonic()))
+    return not any(pump is not None and pump.is_alive() for pump in pumps)
+
+
+def _start_stream_pump(
+    stream: Any,
+    capture: StreamCapture,
+) -> threading.Thread | None:
+    if stream is None:
+        return None
+    thread = threading.Thread(
+        target=_pump_stream_sync,
+        args=(stream, capture),
+        daemon=True,
+    )
+    thread.start()
+    return thread
+
+
+def build_exec_event_log_path(
+    event_log_dir: str | Path | None,
+    agent_id: str,
+) -> Path | None:
+    if event_log_dir is None:
+        return None
+    return Path(event_log_dir) / f"{agent_id}.jsonl"
+
+
+async def _collect_stream(
+    stream: asyncio.StreamReader | None,
+    max_bytes: int = MAX_CAPTURE_BYTES,
+    capture: StreamCapture | None = None,
+) -> tuple[bytes, bool]:
+    if stream is None:
+        return b"", False
+    if capture is None:
+        capture = StreamCapture("stream", max_bytes)
+    try:
+        while True:
+            chunk = await stream.read(STREAM_READ_CHUNK_BYTES)
+            if not chunk:
+                break
+            capture.feed(chunk)
+    except asyncio.CancelledError:
+        # Return what we have (partial) on cancellation.
+        pass
+    capture.finish()
+    return capture.getvalue(), capture.truncated
+
+
+# ============================================================================
+# LLM-as-Judge (using codex exec)
+# ============================================================================
+
+
+async def evaluate_with_llm(
+    output: str,
+    prompt: str,
+    task_type: TaskType,
+    timeout: int = 60,
+    profile: str | None = None,
+    model: str | None = None,
+) -> dict[str, Any] | None:
+    """codex exec を使った LLM 評価"""
+    eval_prompt = f"""You are an expert code evaluator. Evaluate the following output.
 
 Task Type: {task_type.value}
 Original Prompt: {prompt[:500]}
@@ -2245,6 +4242,217 @@ def should_run_llm_eval(
 # Core Execution Functions
 # ============================================================================
 
+RESULT_CACHE_VOLATILE_METADATA = {
+    "cache",
+    "cancelled",
+    "event_log",
+    "queue_wait_seconds",
+}
+_RESULT_CACHE: ExecResultCache | None = None
+
+
+def get_result_cache() -> ExecResultCache:
+    global _RESULT_CACHE
+    if _RESULT_CACHE is None or _RESULT_CACHE.root != RESULT_CACHE_DIR:
+        _RESULT_CACHE = ExecResultCache(RESULT_CACHE_DIR)
+    return _RESULT_CACHE
+
+
+def _git_toplevel(path: str | Path) -> Path | None:
+    try:
+        result = subprocess.run(
+            ["git", "rev-parse", "--show-toplevel"],
+            cwd=path,
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return Path(result.stdout.strip())
+
+
+def compute_repo_tree_hash(root: str | Path) -> str | None:
+    """HEAD の tree と未コミット変更の内容から作業ツリーのハッシュを求める"""
+    root_path = Path(root)
+    try:
+        tree = subprocess.run(
+            ["git", "rev-parse", "--verify", "HEAD^{tree}"],
+            cwd=root_path,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+        dirty_paths = list_dirty_repo_paths(root_path)
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    digest = hashlib.sha256(tree.encode("ascii"))
+    for rel_path in dirty_paths:
+        digest.update(b"\0" + rel_path.encode("utf-8", "surrogateescape"))
+        path = root_path / rel_path
+        try:
+            if path.is_symlink():
+                digest.update(b"l" + os.fsencode(os.readlink(path)))
+            elif path.is_file():
+                digest.update(b"f" + hash_file_sha256(path).encode("ascii"))
+            else:
+                digest.update(b"-")
+        except OSError:
+            digest.update(b"?")
+    return digest.hexdigest()
+
+
+def build_result_cache_key(
+    prompt: str,
+    sandbox: SandboxMode,
+    agent_id: str,
+    workdir: str | None,
+    profile: str | None,
+    model: str | None,
+) -> str | None:
+    """キャッシュ可能な実行なら結果キャッシュのキーを返す
+
+    書き込みを伴う sandbox はファイル変更を再現できないため対象外。
+    """
+    if RESULT_CACHE_MODE == "off" or sandbox != SandboxMode.READ_ONLY:
+        return None
+    cwd = Path(workdir) if workdir else Path.cwd()
+    top = _git_toplevel(cwd)
+    if top is None:
+        return None
+    tree_hash = compute_repo_tree_hash(top)
+    if tree_hash is None:
+        return None
+    payload = {
+        "prompt": prompt,
+        "sandbox": sandbox.value,
+        "agent_id": agent_id,
+        "cwd": os.path.relpath(cwd.resolve(), top.resolve()),
+        "profile": profile,
+        "model": model,
+        "tree": tree_hash,
+    }
+    return hashlib.sha256(
+        json.dumps(payload, sort_keys=True, ensure_ascii=False).encode("utf-8")
+    ).hexdigest()
+
+
+def load_cached_result(
+    cache_key: str | None,
+    agent_id: str,
+) -> CodexResult | None:
+    if cache_key is None:
+        return None
+    payload = get_result_cache().get(cache_key)
+    if payload is None:
+        return None
+    metadata = dict(payload.get("metadata") or {})
+    metadata["cache"] = "hit"
+    metadata["cached_execution_time"] = payload.get("execution_time", 0.0)
+    return CodexResult(
+        agent_id=agent_id,
+        output=payload.get("output", ""),
+        stderr=payload.get("stderr", ""),
+        tokens_used=payload.get("tokens_used", 0),
+        execution_time=0.0,
+        success=True,
+        returncode=payload.get("returncode"),
+        input_tokens=payload.get("input_tokens", 0),
+        output_tokens=payload.get("output_tokens", 0),
+        cached_input_tokens=payload.get("cached_input_tokens", 0),
+        token_source=payload.get("token_source", ""),
+        metadata=metadata,
+    )
+
+
+def store_cached_result(cache_key: str | None, result: CodexResult) -> None:
+    if cache_key is None or RESULT_CACHE_MODE != "readwrite":
+        return
+    if not result.success or result.output_is_partial:
+        return
+    get_result_cache().put(
+        cache_key,
+        {
+            "created_at": datetime.now(UTC).isoformat(),
+            "output": result.output,
+            "stderr": result.stderr,
+            "tokens_used": result.tokens_used,
+            "input_tokens": result.input_tokens,
+            "output_tokens": result.output_tokens,
+            "cached_input_tokens": result.cached_input_tokens,
+            "token_source": result.token_source,
+            "execution_time": result.execution_time,
+            "returncode": result.returncode,
+            "metadata": {
+                key: value
+                for key, value in result.metadata.items()
+                if key not in RESULT_CACHE_VOLATILE_METADATA
+            },
+        },
+    )
+
+
+_STAGE_CACHE: ExecResultCache | None = None
+
+
+def get_stage_cache() -> ExecResultCache:
+    """pipeline stage の結果キャッシュ（codex exec 結果と同じ寿命で管理）"""
+    global _STAGE_CACHE
+    root = RESULT_CACHE_DIR / STAGE_CACHE_DIRNAME
+    if _STAGE_CACHE is None or _STAGE_CACHE.root != root:
+        _STAGE_CACHE = ExecResultCache(root)
+    return _STAGE_CACHE
+
+
+def encode_repo_changes(
+    changes: dict[str, RepoSnapshotEntry | None],
+) -> dict[str, dict[str, Any] | None]:
+    """ファイル変更を blob の digest で JSON 化する（中身は blob store 側）"""
+    encoded: dict[str, dict[str, Any] | None] = {}
+    for rel_path, entry in changes.items():
+        if entry is None:
+            encoded[rel_path] = None
+            continue
+        if entry.kind == "file" and entry.digest is None:
+            raise ValueError("file change is not stored in the blob store")
+        encoded[rel_path] = {
+            "kind": entry.kind,
+            "mode": entry.mode,
+            "mtime_ns": entry.mtime_ns,
+            "size": entry.size,
+            "digest": entry.digest,
+            "link_target": entry.link_target,
+        }
+    return encoded
+
+
+def decode_repo_changes(
+    payload: dict[str, dict[str, Any] | None],
+    blob_store: RepoBlobStore | None = None,
+) -> dict[str, RepoSnapshotEntry | None] | None:
+    """encode_repo_changes の逆変換（blob が消えていれば None）"""
+    store = blob_store or get_default_blob_store()
+    changes: dict[str, RepoSnapshotEntry | None] = {}
+    for rel_path, item in payload.items():
+        if item is None:
+            changes[rel_path] = None
+            continue
+        blob_path = None
+        if item["kind"] == "file":
+            blob_path = store.path_for(item["digest"])
+            if not blob_path.exists():
+                return None
+        changes[rel_path] = RepoSnapshotEntry(
+            kind=item["kind"],
+            mode=int(item["mode"]),
+            mtime_ns=int(item["mtime_ns"]),
+            link_target=item.get("link_target"),
+            size=int(item.get("size") or 0),
+            digest=item.get("digest"),
+            blob_path=str(blob_path) if blob_path is not None else None,
+        )
+    return changes
+
 
 def run_codex_exec(
     prompt: str,
@@ -2254,8 +4462,79 @@ def run_codex_exec(
     workdir: str | None = None,
     profile: str | None = None,
     model: str | None = None,
+    event_log_path: str | Path | None = None,
 ) -> CodexResult:
-    """単一の codex exec を実行"""
+    """単一の codex exec を実行（--cache 有効時は結果キャッシュを参照）"""
+    cache_key = build_result_cache_key(
+        prompt, sandbox, agent_id, workdir, profile, model
+    )
+    cached = load_cached_result(cache_key, agent_id)
+    if cached is not None:
+        return cached
+    result = _spawn_codex_exec(
+        prompt=prompt,
+        sandbox=sandbox,
+        timeout=timeout,
+        agent_id=agent_id,
+        workdir=workdir,
+        profile=profile,
+        model=model,
+        event_log_path=event_log_path,
+    )
+    store_cached_result(cache_key, result)
+    return result
+
+
+async def run_codex_exec_async(
+    prompt: str,
+    sandbox: SandboxMode = SandboxMode.READ_ONLY,
+    timeout: int = 360,
+    agent_id: str = "agent_0",
+    workdir: str | None = None,
+    profile: str | None = None,
+    model: str | None = None,
+    event_log_path: str | Path | None = None,
+) -> CodexResult:
+    """非同期で codex exec を実行（--cache 有効時は結果キャッシュを参照）"""
+    cache_key = None
+    if RESULT_CACHE_MODE != "off":
+        cache_key = await asyncio.to_thread(
+            build_result_cache_key,
+            prompt,
+            sandbox,
+            agent_id,
+            workdir,
+            profile,
+            model,
+        )
+    cached = load_cached_result(cache_key, agent_id)
+    if cached is not None:
+        return cached
+    result = await _spawn_codex_exec_async(
+        prompt=prompt,
+        sandbox=sandbox,
+        timeout=timeout,
+        agent_id=agent_id,
+        workdir=workdir,
+        profile=profile,
+        model=model,
+        event_log_path=event_log_path,
+    )
+    store_cached_result(cache_key, result)
+    return result
+
+
+def _spawn_codex_exec(
+    prompt: str,
+    sandbox: SandboxMode = SandboxMode.READ_ONLY,
+    timeout: int = 360,
+    agent_id: str = "agent_0",
+    workdir: str | None = None,
+    profile: str | None = None,
+    model: str | None = None,
+    event_log_path: str | Path | None = None,
+) -> CodexResult:
+    """codex exec プロセスを起動し、出力をストリーミングで収集"""
     start_time = time.time()
 
     cmd = ["codex", "exec", "--sandbox", sandbox.value]
@@ -2267,39 +4546,52 @@ def run_codex_exec(
         cmd.extend(["--cd", workdir])
     cmd.append(prompt)
 
-    proc: subprocess.Popen[str] | None = None
+    metadata: dict[str, Any] = {"model": model}
+    event_log = open_exec_event_log(event_log_path)
+    if event_log is not None:
+        metadata["event_log"] = str(event_log.path)
+    proc: subprocess.Popen[bytes] | None = None
     try:
-        proc: subprocess.Popen[str] = subprocess.Popen(
+        proc = subprocess.Popen(
             cmd,
-            text=True,
             stdout=subprocess.PIPE,
             stderr=subprocess.PIPE,
             start_new_session=True,
         )
+        if event_log is not None:
+            event_log.emit("start", agent_id=agent_id, pid=proc.pid)
+        stdout_capture = StreamCapture("stdout", event_log=event_log)
+        stderr_capture = StreamCapture("stderr", event_log=event_log)
+        pumps = [
+            _start_stream_pump(proc.stdout, stdout_capture),
+            _start_stream_pump(proc.stderr, stderr_capture),
+        ]
         timed_out = False
-        output_is_partial = False
-        stdout_text = ""
-        stderr_text = ""
 
         try:
-            stdout_text, stderr_text = proc.communicate(timeout=timeout)
-        except subprocess.TimeoutExpired as e:
+            proc.wait(timeout=timeout)
+        except subprocess.TimeoutExpired:
             timed_out = True
-            output_is_partial = True
-            stdout_text = _decode_text(getattr(e, "stdout", None) or e.output)
-            stderr_text = _decode_text(getattr(e, "stderr", None))
             _terminate_process_group_sync(proc)
-            try:
-                stdout_rest, stderr_rest = proc.communicate(timeout=1)
-                stdout_text += stdout_rest
-                stderr_text += stderr_rest
-            except Exception:
-                pass
+        # 子孫が pipe を開いたままなら短い猶予の後にグループごと止める
+        drain_incomplete = not _join_stream_pumps(
+            pumps, STREAM_DRAIN_GRACE_SECONDS
+        )
+        if drain_incomplete:
+            _kill_process_group(proc.pid)
+            _join_stream_pumps(pumps, STREAM_DRAIN_GRACE_SECONDS)
 
         execution_time = timeout if timed_out else (time.time() - start_time)
+        stdout_text = _decode_text(stdout_capture.getvalue())
+        stderr_text = _decode_text(stderr_capture.getvalue())
+        output_is_partial = (
+            timed_out
+            or drain_incomplete
+            or stdout_capture.truncated
+            or stderr_capture.truncated
+        )
 
-        # トークン数を出力から抽出（概算）
-        tokens_used = len(stdout_text.split()) * 2  # 概算
+        usage = account_tokens(prompt, stdout_text, stderr_text)
 
         returncode = proc.returncode
         success = (returncode == 0) and not timed_out
@@ -2312,11 +4604,21 @@ def run_codex_exec(
         else:
             error_message = ""
 
+        if event_log is not None:
+            event_log.emit(
+                "exit",
+                returncode=returncode,
+                timed_out=timed_out,
+                stdout_bytes=stdout_capture.total_bytes,
+                stderr_bytes=stderr_capture.total_bytes,
+                output_is_partial=output_is_partial,
+                drain_incomplete=drain_incomplete,
+            )
         return CodexResult(
             agent_id=agent_id,
             output=stdout_text,
             stderr=stderr_text,
-            tokens_used=tokens_used,
+            tokens_used=usage.total_tokens,
             execution_time=execution_time,
             success=success,
             error_message=error_message,
@@ -2324,11 +4626,17 @@ def run_codex_exec(
             timed_out=timed_out,
             timeout_seconds=timeout if timed_out else None,
             output_is_partial=output_is_partial,
-            metadata={"model": model},
+            input_tokens=usage.input_tokens,
+            output_tokens=usage.output_tokens,
+            cached_input_tokens=usage.cached_input_tokens,
+            token_source=usage.source,
+            metadata=metadata,
         )
     except Exception as e:
         if proc is not None:
             _terminate_process_group_sync(proc)
+        if event_log is not None:
+            event_log.emit("error", error_message=str(e))
         return CodexResult(
             agent_id=agent_id,
             output="",
@@ -2339,11 +4647,14 @@ def run_codex_exec(
             timed_out=False,
             timeout_seconds=None,
             output_is_partial=False,
-            metadata={"model": model},
+            metadata=metadata,
         )
+    finally:
+        if event_log is not None:
+            event_log.close()
 
 
-async def run_codex_exec_async(
+async def _spawn_codex_exec_async(
     prompt: str,
     sandbox: SandboxMode = SandboxMode.READ_ONLY,
     timeout: int = 360,
@@ -2351,8 +4662,9 @@ async def run_codex_exec_async(
     workdir: str | None = None,
     profile: str | None = None,
     model: str | None = None,
+    event_log_path: str | Path | None = None,
 ) -> CodexResult:
-    """非同期で codex exec を実行"""
+    """codex exec プロセスを非同期に起動し、出力をストリーミングで収集"""
     start_time = time.time()
 
     cmd = ["codex", "exec", "--sandbox", sandbox.value]
@@ -2364,6 +4676,10 @@ async def run_codex_exec_async(
         cmd.extend(["--cd", workdir])
     cmd.append(prompt)
 
+    metadata: dict[str, Any] = {"model": model}
+    event_log = open_exec_event_log(event_log_path)
+    if event_log is not None:
+        metadata["event_log"] = str(event_log.path)
     process: asyncio.subprocess.Process | None = None
     stdout_task: asyncio.Task[tuple[bytes, bool]] | None = None
     stderr_task: asyncio.Task[tuple[bytes, bool]] | None = None
@@ -2374,25 +4690,46 @@ async def run_codex_exec_async(
             stderr=asyncio.subprocess.PIPE,
             start_new_session=True,
         )
-        stdout_task = asyncio.create_task(_collect_stream(process.stdout))
-        stderr_task = asyncio.create_task(_collect_stream(process.stderr))
+        if event_log is not None:
+            event_log.emit("start", agent_id=agent_id, pid=process.pid)
+        stdout_capture = StreamCapture("stdout", event_log=event_log)
+        stderr_capture = StreamCapture("stderr", event_log=event_log)
+        stdout_task = asyncio.create_task(
+            _collect_stream(process.stdout, capture=stdout_capture)
+        )
+        stderr_task = asyncio.create_task(
+            _collect_stream(process.stderr, capture=stderr_capture)
+        )
 
         timed_out = False
-        try:
-            await asyncio.wait_for(process.wait(), timeout=timeout)
-        except TimeoutError:
+        if not await _wait_process_exit(process, timeout):
             timed_out = True
             await _terminate_process_group_async(process)
 
+        # codex が終了しても子孫が pipe を開いたままだと EOF が来ないので、
+        # 同期版と同じ猶予で打ち切ってグループごと止め、そこまでの出力で返す
+        _, pending = await asyncio.wait(
+            [stdout_task, stderr_task], timeout=STREAM_DRAIN_GRACE_SECONDS
+        )
+        drain_incomplete = bool(pending)
+        if drain_incomplete:
+            _kill_process_group(process.pid)
+            for task in pending:
+                task.cancel()
         stdout, stdout_truncated = await stdout_task
         stderr, stderr_truncated = await stderr_task
-        output_is_partial = timed_out or stdout_truncated or stderr_truncated
+        output_is_partial = (
+            timed_out
+            or drain_incomplete
+            or stdout_truncated
+            or stderr_truncated
+        )
 
         execution_time = timeout if timed_out else (time.time() - start_time)
 
         output = _decode_text(stdout)
         stderr_text = _decode_text(stderr)
-        tokens_used = len(output.split()) * 2
+        usage = account_tokens(prompt, output, stderr_text)
 
         returncode = process.returncode
         success = (returncode == 0) and not timed_out
@@ -2405,11 +4742,21 @@ async def run_codex_exec_async(
         else:
             error_message = ""
 
+        if event_log is not None:
+            event_log.emit(
+                "exit",
+                returncode=returncode,
+                timed_out=timed_out,
+                stdout_bytes=stdout_capture.total_bytes,
+                stderr_bytes=stderr_capture.total_bytes,
+                output_is_partial=output_is_partial,
+                drain_incomplete=drain_incomplete,
+            )
         return CodexResult(
             agent_id=agent_id,
             output=output,
             stderr=stderr_text,
-            tokens_used=tokens_used,
+            tokens_used=usage.total_tokens,
             execution_time=execution_time,
             success=success,
             error_message=error_message,
@@ -2417,8 +4764,22 @@ async def run_codex_exec_async(
             timed_out=timed_out,
             timeout_seconds=timeout if timed_out else None,
             output_is_partial=output_is_partial,
-            metadata={"model": model},
+            input_tokens=usage.input_tokens,
+            output_tokens=usage.output_tokens,
+            cached_input_tokens=usage.cached_input_tokens,
+            token_source=usage.source,
+            metadata=metadata,
         )
+    except asyncio.CancelledError:
+        if process is not None:
+            await _terminate_process_group_async(process)
+        if stdout_task is not None:
+            stdout_task.cancel()
+        if stderr_task is not None:
+            stderr_task.cancel()
+        if event_log is not None:
+            event_log.emit("cancelled")
+        raise
     except Exception as e:
         if process is not None:
             await _terminate_process_group_async(process)
@@ -2426,6 +4787,8 @@ async def run_codex_exec_async(
             stdout_task.cancel()
         if stderr_task is not None:
             stderr_task.cancel()
+        if event_log is not None:
+            event_log.emit("error", error_message=str(e))
         return CodexResult(
             agent_id=agent_id,
             output="",
@@ -2436,8 +4799,67 @@ async def run_codex_exec_async(
             timed_out=False,
             timeout_seconds=None,
             output_is_partial=False,
-            metadata={"model": model},
+            metadata=metadata,
         )
+    finally:
+        if event_log is not None:
+            event_log.close()
+
+
+class TokenBucket:
+    """codex exec 起動のレート制限（トークンバケット）"""
+
+    def __init__(self, rate: float, burst: int = 1) -> None:
+        self.rate = rate
+        self.capacity = max(1, burst)
+        self._tokens = float(self.capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self) -> float:
+        """トークンを 1 つ予約し、使えるようになるまでの待ち秒数を返す"""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(
+                self.capacity,
+                self._tokens + (now - self._updated) * self.rate,
+            )
+            self._updated = now
+            self._tokens -= 1
+            if self._tokens >= 0:
+                return 0.0
+            return -self._tokens / self.rate
+
+    async def acquire(self) -> None:
+        delay = self.reserve()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+
+_RATE_LIMITERS: dict[tuple[str | None, str | None], TokenBucket] = {}
+_RATE_LIMITERS_LOCK = threading.Lock()
+
+
+def get_rate_limiter(
+    model: str | None,
+    profile: str | None,
+    rate: float | None,
+    burst: int = 1,
+) -> TokenBucket | None:
+    """model/profile ごとにプロセス内で共有するトークンバケットを返す"""
+    if not rate or rate <= 0:
+        return None
+    key = (model, profile)
+    with _RATE_LIMITERS_LOCK:
+        bucket = _RATE_LIMITERS.get(key)
+        if (
+            bucket is None
+            or bucket.rate != rate
+            or bucket.capacity != max(1, burst)
+        ):
+            bucket = TokenBucket(rate, burst)
+            _RATE_LIMITERS[key] = bucket
+        return bucket
 
 
 async def execute_parallel(
@@ -2447,21 +4869,113 @@ async def execute_parallel(
     workdir: str | None = None,
     profile: str | None = None,
     model: str | None = None,
+    event_log_dir: str | Path | None = None,
+    max_concurrency: int | None = None,
+    rate_limit: float | None = None,
+    rate_burst: int = 1,
+    priorities: list[int] | None = None,
+    quorum: int | None = None,
+    stop_when: Callable[[CodexResult], bool] | None = None,
 ) -> list[CodexResult]:
-    """複数のプロンプトを並列実行"""
-    tasks = [
-        run_codex_exec_async(
-            prompt=p,
-            sandbox=sandbox,
-            timeout=timeout,
-            agent_id=f"agent_{i}",
-            workdir=workdir,
-            profile=profile,
-            model=model,
+    """複数のプロンプトを並列実行
+
+    同時実行は max_concurrency 件までで、priorities の昇順（同値は投入順）に
+    起動する。quorum 件が成功するか stop_when を満たす結果が出た時点で、
+    実行中・待機中の残りを打ち切る。
+    """
+    if priorities is not None and len(priorities) != len(prompts):
+        raise ValueError("priorities must match prompts")
+    if not prompts:
+        return []
+    limit = len(prompts)
+    if max_concurrency is not None and max_concurrency > 0:
+        limit = min(limit, max_concurrency)
+    bucket = get_rate_limiter(model, profile, rate_limit, rate_burst)
+    pending = deque(
+        sorted(
+            range(len(prompts)),
+            key=lambda i: (priorities[i] if priorities else 0, i),
+        )
+    )
+    enqueued_at = time.monotonic()
+    results: list[CodexResult | None] = [None] * len(prompts)
+    successes = 0
+    workers: list[asyncio.Task[None]] = []
+
+    async def worker() -> None:
+        nonlocal successes
+        while pending:
+            index = pending.popleft()
+            if bucket is not None:
+                await bucket.acquire()
+            queue_wait = time.monotonic() - enqueued_at
+            try:
+                result = await run_codex_exec_async(
+                    prompt=prompts[index],
+                    sandbox=sandbox,
+                    timeout=timeout,
+                    agent_id=f"agent_{index}",
+                    workdir=workdir,
+                    profile=profile,
+                    model=model,
+                    event_log_path=build_exec_event_log_path(
+                        event_log_dir, f"agent_{index}"
+                    ),
+                )
+            except Exception as exc:
+                # 起動側の例外は早期終了のキャンセルと区別して失敗に残す
+                error = f"{type(exc).__name__}: {exc}"
+                results[index] = CodexResult(
+                    agent_id=f"agent_{index}",
+                    output="",
+                    success=False,
+                    error_message=error,
+                    metadata={
+                        "model": model,
+                        "worker_error": error,
+                        "queue_wait_seconds": round(queue_wait, 3),
+                    },
+                )
+                continue
+            result.metadata["queue_wait_seconds"] = round(queue_wait, 3)
+            stop = False
+            if stop_when is not None:
+                try:
+                    stop = bool(stop_when(result))
+                except Exception as exc:
+                    # codex の実行自体は終わっているので結果は捨てない
+                    result.metadata["worker_error"] = (
+                        f"{type(exc).__name__}: {exc}"
+                    )
+            results[index] = result
+            if result.success:
+                successes += 1
+            if (quorum and successes >= quorum) or stop:
+                pending.clear()
+                current = asyncio.current_task()
+                for task in workers:
+                    if task is not current:
+                        task.cancel()
+                return
+
+    workers.extend(asyncio.create_task(worker()) for _ in range(limit))
+    await asyncio.gather(*workers, return_exceptions=True)
+    cancelled_wait = round(time.monotonic() - enqueued_at, 3)
+    return [
+        result
+        or CodexResult(
+            agent_id=f"agent_{index}",
+            output="",
+            success=False,
+            error_message="cancelled: early stop",
+            metadata={
+                "model": model,
+                "cancelled": True,
+                "queue_wait_seconds": cancelled_wait,
+            },
         )
-        for i, p in enumerate(prompts)
+        for index, result in enumerate(results)
     ]
-    return await asyncio.gather(*tasks)
 
 
 async def execute_competition(
@@ -2475,8 +4989,27 @@ async def execute_competition(
     workdir: str | None = None,
     profile: str | None = None,
     model: str | None = None,
+    event_log_dir: str | Path | None = None,
+    max_concurrency: int | None = None,
+    rate_limit: float | None = None,
+    rate_burst: int = 1,
+    early_stop_score: float | None = None,
 ) -> CompetitionOutcome:
-    """コンペモード: 複数実行 → 評価 → 最良選択"""
+    """コンペモード: 複数実行 → 評価 → 最良選択
+
+    early_stop_score を指定すると、完了した候補から順に評価し、
+    スコアが閾値以上の候補が出た時点で残りのプロセスグループを終了する。
+    """
+    stop_when = None
+    if early_stop_score is not None:
+
+        def stop_when(result: CodexResult) -> bool:
+            return (
+                result.success
+                and evaluate_result(result, task_type).combined_score
+                >= early_stop_score
+            )
+
     # 同一プロンプトで複数回実行
     prompts = [prompt] * count
     results = await execute_parallel(
@@ -2486,7 +5019,13 @@ async def execute_competition(
         workdir,
         profile=profile,
         model=model,
+        event_log_dir=event_log_dir,
+        max_concurrency=max_concurrency,
+        rate_limit=rate_limit,
+        rate_burst=rate_burst,
+        stop_when=stop_when,
     )
+    cancelled = [r.agent_id for r in results if r.metadata.get("cancelled")]
 
     # 成功した結果のみ評価
     successful = [r for r in results if r.success]
@@ -2517,6 +5056,10 @@ async def execute_competition(
         "heuristic_winner": best.result.agent_id,
         "selected_by": "heuristic",
     }
+    if early_stop_score is not None:
+        selection["early_stop_score"] = early_stop_score
+        selection["early_stopped"] = bool(cancelled)
+        selection["cancelled"] = cancelled
     if judge_mode == JudgeMode.HYBRID and len(evaluated) >= 2:
         ranked = sorted(
             evaluated, key=lambda item: item.combined_score, reverse=True
@@ -2551,6 +5094,15 @@ async def execute_competition(
     return CompetitionOutcome(best=best, results=results, selection=selection)
 
 
+def resolve_early_stop_score(
+    early_stop: bool,
+    early_stop_score: float | None,
+) -> float | None:
+    if early_stop_score is not None:
+        return early_stop_score
+    return COMPETITION_PASS_SCORE if early_stop else None
+
+
 def evaluate_result(
     result: CodexResult, task_type: TaskType
 ) -> EvaluatedResult:
@@ -2707,7 +5259,9 @@ def select_best(
 
     elif strategy == SelectionStrategy.CONSERVATIVE:
         # 実行時間が短く、合格ラインを満たすもの
-        qualified = [e for e in evaluated if e.combined_score >= 3.5]
+        qualified = [
+            e for e in evaluated if e.combined_score >= COMPETITION_PASS_SCORE
+        ]
         if qualified:
             return min(qualified, key=lambda e: e.result.execution_time)
         return min(evaluated, key=lambda e: e.result.execution_time)
@@ -2786,7 +5340,13 @@ def format_output(
     if verbose:
         lines.append(f"Agent ID: {result.result.agent_id}")
         lines.append(f"Execution Time: {result.result.execution_time:.2f}s")
-        lines.append(f"Tokens: {result.result.tokens_used}")
+        lines.append(
+            f"Tokens: {result.result.tokens_used} "
+            f"(input {result.result.input_tokens}, "
+            f"cached {result.result.cached_input_tokens}, "
+            f"output {result.result.output_tokens}; "
+            f"{result.result.token_source or 'unknown'})"
+        )
         lines.append(f"Score: {result.combined_score:.2f}")
         lines.append(f"  - Correctness: {result.score.correctness:.1f}")
         lines.append(f"  - Completeness: {result.score.completeness:.1f}")
@@ -2801,14 +5361,23 @@ def format_output(
     return "\n".join(lines)
 
 
-def build_stage_prompt_capsule_path(
+def build_capsule_blob_path(
+    pipeline_run_id: str,
+    capsule_hash: str,
+    log_dir: str | Path,
+) -> Path:
+    artifact_dir = get_pipeline_artifact_dir(log_dir, pipeline_run_id)
+    return artifact_dir / "capsules" / f"{capsule_hash}.json"
+
+
+def build_stage_event_log_path(
     pipeline_run_id: str,
     stage_id: str,
     attempt: int,
     log_dir: str | Path,
 ) -> Path:
     artifact_dir = get_pipeline_artifact_dir(log_dir, pipeline_run_id)
-    return artifact_dir / "stage-inputs" / f"{stage_id}-attempt-{attempt}.json"
+    return artifact_dir / "events" / f"{stage_id}-attempt-{attempt}.jsonl"
 
 
 def build_pipeline_state_payload(
@@ -2853,10 +5422,448 @@ def build_pipeline_state_payload(
             "max_stages": args.max_stages,
             "max_parallel_stages": args.max_parallel_stages,
             "judge_mode": args.judge_mode,
+            "snapshot_mode": args.snapshot_mode,
+            "read_only_workspace": args.read_only_workspace,
         },
     }
 
 
+@dataclass
+class StageAttempt:
+    """stage 1 回分の試行で、codex exec の前後に引き継ぐ状態"""
+
+    attempt: int
+    workspace: IsolatedWorkspace
+    prompt: str
+    prompt_budget: StagePromptBudget
+    prompt_capsule_hash: str
+    store_mode: str
+    capsule_path: Path | None
+    size_bytes: int
+    capsule_blob_written: bool | None
+    before_snapshot: dict[str, RepoSnapshotEntry]
+    effective_workdir: str | None
+    event_log_path: Path
+    watcher: RepoChangeWatcher | None = None
+
+    def stop_watcher(self) -> set[str] | None:
+        if self.watcher is None:
+            return None
+        watcher, self.watcher = self.watcher, None
+        return watcher.stop()
+
+
+@dataclass
+class StageExecutionContext:
+    """stage の retry ループ（同期 / 非同期）が共有する試行前後の処理"""
+
+    stage_spec: dict[str, Any]
+    capsule_state: dict[str, Any]
+    base_prompt: str
+    pipeline_run_id: str
+    log_dir: str | Path
+    timeout: int
+    profile: str | None
+    model: str | None
+    default_workdir: str | None
+    capsule_store_arg: str
+    capsule_path_arg: str | None
+    max_total_prompt_chars: int | None
+    allow_dynamic: bool
+    source_root: str | Path = ROOT_DIR
+    snapshot_mode: str = "walk"
+    workspace_pool: WorkspacePool | None = None
+    read_only_workspace: str = "isolated"
+
+    def __post_init__(self) -> None:
+        if self.snapshot_mode not in SNAPSHOT_MODE_VALUES:
+            raise ValueError("snapshot_mode must be walk|watch")
+        if self.read_only_workspace not in READ_ONLY_WORKSPACE_VALUES:
+            raise ValueError("read_only_workspace must be isolated|shared")
+        self.policy = build_stage_policy(self.stage_spec)
+        self.share_workspace = (
+            self.read_only_workspace == "shared"
+            and self.workspace_pool is not None
+            and self.policy.sandbox == SandboxMode.READ_ONLY
+            and not self.policy.write_roots
+        )
+        self.cache_key: str | None = None
+
+    def build_cache_key(self) -> str | None:
+        """capsule 入力・stage spec・model・作業ツリーから stage のキーを作る"""
+        if RESULT_CACHE_MODE == "off":
+            return None
+        tree_hash = compute_repo_tree_hash(self.source_root)
+        if tree_hash is None:
+            return None
+        prompt_capsule = select_capsule_inputs(
+            self.capsule_state, self.policy.input_keys
+        )
+        payload = {
+            "stage_spec": self.stage_spec,
+            "capsule": compute_capsule_hash(prompt_capsule),
+            "base_prompt": self.base_prompt,
+            "profile": self.profile,
+            "model": self.model,
+            "default_workdir": self.default_workdir,
+            "max_total_prompt_chars": self.max_total_prompt_chars,
+            "allow_dynamic": self.allow_dynamic,
+            "tree": tree_hash,
+        }
+        return hashlib.sha256(
+            json.dumps(payload, sort_keys=True, ensure_ascii=False).encode(
+                "utf-8"
+            )
+        ).hexdigest()
+
+    def load_cached(self, attempt: int) -> dict[str, Any] | None:
+        """同じ入力で成功済みの stage を codex を起動せずに再生する"""
+        self.cache_key = self.build_cache_key()
+        if self.cache_key is None:
+            return None
+        payload = get_stage_cache().get(self.cache_key)
+        if payload is None:
+            return None
+        changes = decode_repo_changes(payload.get("changes") or {})
+        if changes is None:
+            return None
+        policy = self.policy
+        stage_result = payload["stage_result"]
+        prompt_capsule = select_capsule_inputs(
+            self.capsule_state, policy.input_keys
+        )
+        result = CodexResult(
+            agent_id="agent_0",
+            output=payload.get("output", ""),
+            tokens_used=payload.get("tokens_used", 0),
+            execution_time=0.0,
+            success=True,
+            returncode=0,
+            metadata={"model": self.model, "cache": "hit"},
+        )
+        stage_log = build_stage_log(
+            stage_id=policy.stage_id,
+            pipeline_run_id=self.pipeline_run_id,
+            capsule_state=self.capsule_state,
+            store_mode="embed",
+            capsule_path=None,
+            size_bytes=capsule_size_bytes(prompt_capsule),
+            exec_result=result,
+            stage_result=stage_result,
+        )
+        stage_log["attempt"] = attempt
+        stage_log["role"] = policy.role
+        stage_log["cache_hit"] = True
+        stage_log["cached_execution_time"] = payload.get("execution_time", 0.0)
+        if "output_chars" in payload:
+            stage_log["exec"]["output_chars"] = payload["output_chars"]
+        stage_log["input_capsule_hash"] = compute_capsule_hash(prompt_capsule)
+        stage_log["sandbox"] = policy.sandbox.value
+        stage_log["workdir"] = policy.workdir or self.default_workdir
+        stage_log["write_roots"] = policy.write_roots
+        stage_log["input_keys"] = policy.input_keys
+        stage_log["depends_on"] = policy.depends_on
+        stage_log["merge_strategy"] = policy.merge_strategy
+        stage_log["changed_files"] = sorted(changes)
+        stage_log["unauthorized_files"] = []
+        stage_log["authorized"] = True
+        return {
+            "stage_result": stage_result,
+            "attempt_logs": [stage_log],
+            "attempt_count": attempt,
+            "policy": policy,
+            "unauthorized_write": False,
+            "workspace": None,
+            "workspace_cleaned": False,
+            "promotable_files": sorted(changes),
+            "repo_changes": changes,
+        }
+
+    def build_cache_entry(
+        self,
+        stage_result: dict[str, Any],
+        changes: dict[str, RepoSnapshotEntry | None],
+        result: CodexResult,
+    ) -> dict[str, Any] | None:
+        """成功した stage の再生用エントリを作る（書き込みは commit 後）"""
+        if self.cache_key is None or RESULT_CACHE_MODE != "readwrite":
+            return None
+        if stage_result.get("status") != "ok" or stage_result.get(
+            "output_is_partial"
+        ):
+            return None
+        try:
+            encoded_changes = encode_repo_changes(changes)
+        except ValueError:
+            return None
+        return {
+            "key": self.cache_key,
+            "payload": {
+                "created_at": datetime.now(UTC).isoformat(),
+                "stage_result": stage_result,
+                "changes": encoded_changes,
+                "output": truncate_output(result.output),
+                "output_chars": len(result.output),
+                "tokens_used": result.tokens_used,
+                "execution_time": result.execution_time,
+            },
+        }
+
+    def acquire_workspace(self, attempt: int) -> IsolatedWorkspace:
+        workspace_label = (
+            f"{self.pipeline_run_id}-{self.policy.stage_id}-attempt-{attempt}"
+        )
+        if self.share_workspace:
+            return self.workspace_pool.acquire_shared(workspace_label)
+        if self.workspace_pool is not None:
+            return self.workspace_pool.acquire(workspace_label)
+        return create_isolated_workspace(self.source_root, workspace_label)
+
+    def prepare(
+        self, attempt: int, workspace: IsolatedWorkspace
+    ) -> StageAttempt:
+        policy = self.policy
+        prompt_capsule = select_capsule_inputs(
+            self.capsule_state, policy.input_keys
+        )
+        prompt_capsule_hash = compute_capsule_hash(prompt_capsule)
+        prompt_capsule_path_arg = self.capsule_path_arg
+        content_addressed = (
+            self.capsule_store_arg in {"auto", "file"}
+            and prompt_capsule_path_arg is None
+        )
+        if content_addressed:
+            # 同じ入力の retry / 兄弟 stage は同じファイルを参照する
+            prompt_capsule_path_arg = str(
+                build_capsule_blob_path(
+                    self.pipeline_run_id, prompt_capsule_hash, self.log_dir
+                )
+            )
+        store_mode, prompt_capsule_path, size_bytes = resolve_capsule_delivery(
+            self.capsule_store_arg,
+            prompt_capsule,
+            prompt_capsule_path_arg,
+            self.log_dir,
+            self.pipeline_run_id,
+        )
+        prompt_budget = budget_stage_prompt(
+            stage_id=policy.stage_id,
+            base_prompt=self.base_prompt,
+            capsule=prompt_capsule,
+            capsule_store=store_mode,
+            capsule_path=prompt_capsule_path,
+            stage_spec=self.stage_spec,
+            stage_policy=policy,
+            max_total_prompt_chars=self.max_total_prompt_chars,
+            allow_dynamic=self.allow_dynamic,
+            # --capsule-store auto のときだけ予算超過でファイル渡しに切替
+            file_fallback_path=(
+                prompt_capsule_path_arg
+                if self.capsule_store_arg == "auto"
+                else None
+            ),
+        )
+        store_mode = prompt_budget.capsule_store
+        prompt_capsule_path = prompt_budget.capsule_path
+        capsule_blob_written: bool | None = None
+        if store_mode == "file" and prompt_capsule_path:
+            if content_addressed:
+                capsule_blob_written = write_capsule_blob(
+                    prompt_capsule_path, prompt_capsule
+                )
+            else:
+                write_capsule_file(prompt_capsule_path, prompt_capsule)
+        before_snapshot = capture_repo_snapshot(workspace.path, stat_only=True)
+        effective_workdir = resolve_workspace_workdir(
+            policy.workdir or self.default_workdir,
+            workspace.path,
+        )
+        return StageAttempt(
+            attempt=attempt,
+            workspace=workspace,
+            prompt=prompt_budget.prompt,
+            prompt_budget=prompt_budget,
+            prompt_capsule_hash=prompt_capsule_hash,
+            store_mode=store_mode,
+            capsule_path=prompt_capsule_path,
+            size_bytes=size_bytes,
+            capsule_blob_written=capsule_blob_written,
+            before_snapshot=before_snapshot,
+            effective_workdir=effective_workdir,
+            event_log_path=build_stage_event_log_path(
+                self.pipeline_run_id,
+                policy.stage_id,
+                attempt,
+                self.log_dir,
+            ),
+            watcher=(
+                start_repo_change_watcher(workspace.path)
+                if self.snapshot_mode == "watch"
+                else None
+            ),
+        )
+
+    def exec_kwargs(self, attempt: StageAttempt) -> dict[str, Any]:
+        return {
+            "prompt": attempt.prompt,
+            "sandbox": self.policy.sandbox,
+            "timeout": self.timeout,
+            "workdir": attempt.effective_workdir,
+            "profile": self.profile,
+            "model": self.model,
+            "event_log_path": attempt.event_log_path,
+        }
+
+    def finish(
+        self,
+        attempt: StageAttempt,
+        result: CodexResult,
+        changed_hint: set[str] | None,
+        attempt_logs: list[dict[str, Any]],
+    ) -> tuple[dict[str, Any] | None, int]:
+        """試行結果を検証して stage log を積む
+
+        retry しない場合は outcome を、retry する場合は (None, backoff 秒) を返す。
+        """
+        policy = self.policy
+        workspace = attempt.workspace
+        if not result.success:
+            stage_result = stage_result_from_exec_failure(
+                policy.stage_id, result
+            )
+        else:
+            try:
+                stage_result = parse_stage_result_output(
+                    result.output,
+                    allow_dynamic=self.allow_dynamic,
+                )
+            except ValueError as exc:
+                stage_result = {
+                    "schema_version": SCHEMA_VERSION,
+                    "stage_id": policy.stage_id,
+                    "status": "fatal_error",
+                    "output_is_partial": True,
+                    "capsule_patch": [],
+                    "summary": f"stage_result parse failed: {exc}",
+                }
+        if changed_hint is not None:
+            effective_snapshot_mode = "watch"
+            after_snapshot = capture_repo_snapshot_delta(
+                workspace.path, attempt.before_snapshot, changed_hint
+            )
+        else:
+            effective_snapshot_mode = (
+                "walk_fallback" if self.snapshot_mode == "watch" else "walk"
+            )
+            after_snapshot = capture_repo_snapshot(
+                workspace.path, previous=attempt.before_snapshot
+            )
+        write_policy = enforce_stage_write_policy(
+            policy,
+            attempt.before_snapshot,
+            workspace_root=workspace.path,
+            after_snapshot=after_snapshot,
+            restore_unauthorized=False,
+        )
+        if write_policy["unauthorized_files"]:
+            stage_result = {
+                "schema_version": SCHEMA_VERSION,
+                "stage_id": policy.stage_id,
+                "status": "fatal_error",
+                "output_is_partial": False,
+                "capsule_patch": [],
+                "summary": "unauthorized writes detected",
+            }
+        elif (
+            policy.patch_prefixes is not None
+            and stage_result.get("status") == "ok"
+            and not patch_ops_within_prefixes(
+                stage_result.get("capsule_patch") or [],
+                policy.patch_prefixes,
+            )
+        ):
+            # 後続 stage の先行実行は patch_prefixes の宣言を前提にしている
+            stage_result = {
+                "schema_version": SCHEMA_VERSION,
+                "stage_id": policy.stage_id,
+                "status": "fatal_error",
+                "output_is_partial": False,
+                "capsule_patch": [],
+                "summary": "capsule_patch outside patch_prefixes",
+            }
+        promotable_changes: dict[str, RepoSnapshotEntry | None] = {}
+        if write_policy["authorized"]:
+            promotable_changes = build_repo_change_set(
+                after_snapshot,
+                write_policy["changed_files"],
+            )
+        stage_log = build_stage_log(
+            stage_id=policy.stage_id,
+            pipeline_run_id=self.pipeline_run_id,
+            capsule_state=self.capsule_state,
+            store_mode=attempt.store_mode,
+            capsule_path=attempt.capsule_path,
+            size_bytes=attempt.size_bytes,
+            exec_result=result,
+            stage_result=stage_result,
+        )
+        stage_log["attempt"] = attempt.attempt
+        stage_log["role"] = policy.role
+        stage_log["prompt_budget"] = attempt.prompt_budget.to_log()
+        stage_log["input_capsule_hash"] = attempt.prompt_capsule_hash
+        stage_log["input_capsule_reused"] = (
+            None
+            if attempt.capsule_blob_written is None
+            else not attempt.capsule_blob_written
+        )
+        stage_log["sandbox"] = policy.sandbox.value
+        stage_log["workdir"] = policy.workdir or self.default_workdir
+        stage_log["effective_workdir"] = attempt.effective_workdir
+        stage_log["workspace_mode"] = workspace.mode
+        stage_log["snapshot_mode"] = effective_snapshot_mode
+        stage_log["workspace_sync"] = workspace.sync_stats
+        stage_log["write_roots"] = policy.write_roots
+        stage_log["input_keys"] = policy.input_keys
+        stage_log["depends_on"] = policy.depends_on
+        stage_log["merge_strategy"] = policy.merge_strategy
+        stage_log["changed_files"] = write_policy["changed_files"]
+        stage_log["unauthorized_files"] = write_policy["unauthorized_files"]
+        stage_log["authorized"] = write_policy["authorized"]
+        stage_log["cache_hit"] = False
+        attempt_logs.append(stage_log)
+        if (
+            stage_result.get("status") != "retryable_error"
+            or attempt.attempt >= policy.max_attempts
+        ):
+            cache_entry = (
+                self.build_cache_entry(
+                    stage_result, promotable_changes, result
+                )
+                if write_policy["authorized"]
+                else None
+            )
+            return {
+                "stage_result": stage_result,
+                "attempt_logs": attempt_logs,
+                "attempt_count": attempt.attempt,
+                "policy": policy,
+                "unauthorized_write": bool(write_policy["unauthorized_files"]),
+                "workspace": workspace,
+                "workspace_cleaned": False,
+                "promotable_files": sorted(promotable_changes),
+                "base_entries": {
+                    path: attempt.before_snapshot.get(path)
+                    for path in promotable_changes
+                },
+                "base_root": self.source_root,
+                "cache_entry": cache_entry,
+            }, 0
+        backoff_seconds = compute_retry_backoff_seconds(attempt.attempt)
+        stage_log["retry_scheduled"] = True
+        stage_log["retry_backoff_seconds"] = backoff_seconds
+        return None, backoff_seconds
+
+
 def execute_stage_with_retry(
     *,
     stage_spec: dict[str, Any],
@@ -2874,157 +5881,50 @@ def execute_stage_with_retry(
     allow_dynamic: bool,
     previous_attempts: int,
     source_root: str | Path = ROOT_DIR,
+    snapshot_mode: str = "walk",
+    workspace_pool: WorkspacePool | None = None,
+    read_only_workspace: str = "isolated",
 ) -> dict[str, Any]:
-    policy = build_stage_policy(stage_spec)
+    context = StageExecutionContext(
+        stage_spec=stage_spec,
+        capsule_state=capsule_state,
+        base_prompt=base_prompt,
+        pipeline_run_id=pipeline_run_id,
+        log_dir=log_dir,
+        timeout=timeout,
+        profile=profile,
+        model=model,
+        default_workdir=default_workdir,
+        capsule_store_arg=capsule_store_arg,
+        capsule_path_arg=capsule_path_arg,
+        max_total_prompt_chars=max_total_prompt_chars,
+        allow_dynamic=allow_dynamic,
+        source_root=source_root,
+        snapshot_mode=snapshot_mode,
+        workspace_pool=workspace_pool,
+        read_only_workspace=read_only_workspace,
+    )
+    cached = context.load_cached(previous_attempts + 1)
+    if cached is not None:
+        return cached
     attempt_logs: list[dict[str, Any]] = []
     attempt_count = previous_attempts
-    while attempt_count < policy.max_attempts:
+    while attempt_count < context.policy.max_attempts:
         attempt_count += 1
         keep_workspace = False
-        workspace = create_isolated_workspace(
-            source_root,
-            f"{pipeline_run_id}-{policy.stage_id}-attempt-{attempt_count}",
-        )
+        workspace = context.acquire_workspace(attempt_count)
         try:
-            prompt_capsule = select_capsule_inputs(
-                capsule_state, policy.input_keys
-            )
-            prompt_capsule_path_arg = capsule_path_arg
-            if (
-                capsule_store_arg in {"auto", "file"}
-                and prompt_capsule_path_arg is None
-            ):
-                prompt_capsule_path_arg = str(
-                    build_stage_prompt_capsule_path(
-                        pipeline_run_id,
-                        policy.stage_id,
-                        attempt_count,
-                        log_dir,
-                    )
-                )
-            store_mode, prompt_capsule_path, size_bytes = (
-                resolve_capsule_delivery(
-                    capsule_store_arg,
-                    prompt_capsule,
-                    prompt_capsule_path_arg,
-                    log_dir,
-                    pipeline_run_id,
-                )
-            )
-            if store_mode == "file" and prompt_capsule_path:
-                write_capsule_file(prompt_capsule_path, prompt_capsule)
-            stage_prompt = prepare_stage_prompt(
-                stage_id=policy.stage_id,
-                base_prompt=base_prompt,
-                capsule=prompt_capsule,
-                capsule_store=store_mode,
-                capsule_path=prompt_capsule_path,
-                stage_spec=stage_spec,
-                stage_policy=policy,
-                max_total_prompt_chars=max_total_prompt_chars,
-                allow_dynamic=allow_dynamic,
-            )
-            before_snapshot = capture_repo_snapshot(workspace.path)
-            effective_workdir = resolve_workspace_workdir(
-                policy.workdir or default_workdir,
-                workspace.path,
-            )
-            result = run_codex_exec(
-                prompt=stage_prompt,
-                sandbox=policy.sandbox,
-                timeout=timeout,
-                workdir=effective_workdir,
-                profile=profile,
-                model=model,
-            )
-            if not result.success:
-                stage_result = stage_result_from_exec_failure(
-                    policy.stage_id, result
-                )
-            else:
-                try:
-                    stage_result = parse_stage_result_output(
-                        result.output,
-                        allow_dynamic=allow_dynamic,
-                    )
-                except ValueError as exc:
-                    stage_result = {
-                        "schema_version": SCHEMA_VERSION,
-                        "stage_id": policy.stage_id,
-                        "status": "fatal_error",
-                        "output_is_partial": True,
-                        "capsule_patch": [],
-                        "summary": f"stage_result parse failed: {exc}",
-                    }
-            after_snapshot = capture_repo_snapshot(workspace.path)
-            write_policy = enforce_stage_write_policy(
-                policy,
-                before_snapshot,
-                workspace_root=workspace.path,
-                after_snapshot=after_snapshot,
-                restore_unauthorized=False,
-            )
-            if write_policy["unauthorized_files"]:
-                stage_result = {
-                    "schema_version": SCHEMA_VERSION,
-                    "stage_id": policy.stage_id,
-                    "status": "fatal_error",
-                    "output_is_partial": False,
-                    "capsule_patch": [],
-                    "summary": "unauthorized writes detected",
-                }
-            promotable_changes: dict[str, bytes | None] = {}
-            if write_policy["authorized"]:
-                promotable_changes = build_repo_change_set(
-                    after_snapshot,
-                    write_policy["changed_files"],
-                )
-            stage_log = build_stage_log(
-                stage_id=policy.stage_id,
-                pipeline_run_id=pipeline_run_id,
-                capsule_state=capsule_state,
-                store_mode=store_mode,
-                capsule_path=prompt_capsule_path,
-                size_bytes=size_bytes,
-                exec_result=result,
-                stage_result=stage_result,
+            attempt = context.prepare(attempt_count, workspace)
+            try:
+                result = run_codex_exec(**context.exec_kwargs(attempt))
+            finally:
+                changed_hint = attempt.stop_watcher()
+            outcome, backoff_seconds = context.finish(
+                attempt, result, changed_hint, attempt_logs
             )
-            stage_log["attempt"] = attempt_count
-            stage_log["role"] = policy.role
-            stage_log["sandbox"] = policy.sandbox.value
-            stage_log["workdir"] = policy.workdir or default_workdir
-            stage_log["effective_workdir"] = effective_workdir
-            stage_log["workspace_mode"] = workspace.mode
-            stage_log["write_roots"] = policy.write_roots
-            stage_log["input_keys"] = policy.input_keys
-            stage_log["depends_on"] = policy.depends_on
-            stage_log["merge_strategy"] = policy.merge_strategy
-            stage_log["changed_files"] = write_policy["changed_files"]
-            stage_log["unauthorized_files"] = write_policy[
-                "unauthorized_files"
-            ]
-            stage_log["authorized"] = write_policy["authorized"]
-            attempt_logs.append(stage_log)
-            if (
-                stage_result.get("status") != "retryable_error"
-                or attempt_count >= policy.max_attempts
-            ):
+            if outcome is not None:
                 keep_workspace = True
-                return {
-                    "stage_result": stage_result,
-                    "attempt_logs": attempt_logs,
-                    "attempt_count": attempt_count,
-                    "policy": policy,
-                    "unauthorized_write": bool(
-                        write_policy["unauthorized_files"]
-                    ),
-                    "workspace": workspace,
-                    "workspace_cleaned": False,
-                    "promotable_files": sorted(promotable_changes),
-                }
-            backoff_seconds = compute_retry_backoff_seconds(attempt_count)
-            stage_log["retry_scheduled"] = True
-            stage_log["retry_backoff_seconds"] = backoff_seconds
+                return outcome
         finally:
             if not keep_workspace:
                 cleanup_isolated_workspace(workspace)
@@ -3032,12 +5932,118 @@ def execute_stage_with_retry(
     raise AssertionError("retry loop exited unexpectedly")
 
 
+async def execute_stage_with_retry_async(
+    *,
+    stage_spec: dict[str, Any],
+    capsule_state: dict[str, Any],
+    base_prompt: str,
+    pipeline_run_id: str,
+    log_dir: str | Path,
+    timeout: int,
+    profile: str | None,
+    model: str | None,
+    default_workdir: str | None,
+    capsule_store_arg: str,
+    capsule_path_arg: str | None,
+    max_total_prompt_chars: int | None,
+    allow_dynamic: bool,
+    previous_attempts: int,
+    source_root: str | Path = ROOT_DIR,
+    snapshot_mode: str = "walk",
+    workspace_pool: WorkspacePool | None = None,
+    read_only_workspace: str = "isolated",
+    exec_slots: PrioritySlots | None = None,
+    slot_priority: Any = 0,
+    slot_ticket: asyncio.Future[None] | None = None,
+    hand_back_slot: bool = False,
+) -> dict[str, Any]:
+    """execute_stage_with_retry の非同期版（run_codex_exec_async で実行）
+
+    exec_slots の枠は試行中だけ保持し、retry の backoff 中は手放す（取り直しは
+    slot_priority 順）。slot_ticket は呼び出し側が起動時に request した初回の
+    順番待ち。hand_back_slot では結果を返すときの枠を release(deferred=True)
+    で戻し、呼び出し側が dispatch するまで他の stage へ渡さない。待機中の
+    stage はスレッドも枠も占有しないので、1 つの event loop で大量に抱えられる。
+    キャンセルは run_codex_exec_async へ伝わり、プロセスグループごと止まる。
+    """
+    context = StageExecutionContext(
+        stage_spec=stage_spec,
+        capsule_state=capsule_state,
+        base_prompt=base_prompt,
+        pipeline_run_id=pipeline_run_id,
+        log_dir=log_dir,
+        timeout=timeout,
+        profile=profile,
+        model=model,
+        default_workdir=default_workdir,
+        capsule_store_arg=capsule_store_arg,
+        capsule_path_arg=capsule_path_arg,
+        max_total_prompt_chars=max_total_prompt_chars,
+        allow_dynamic=allow_dynamic,
+        source_root=source_root,
+        snapshot_mode=snapshot_mode,
+        workspace_pool=workspace_pool,
+        read_only_workspace=read_only_workspace,
+    )
+    slots = exec_slots or PrioritySlots(1)
+    ticket = slot_ticket
+    try:
+        cached = await asyncio.to_thread(
+            context.load_cached, previous_attempts + 1
+        )
+        if cached is not None:
+            return cached
+        attempt_logs: list[dict[str, Any]] = []
+        attempt_count = previous_attempts
+        while attempt_count < context.policy.max_attempts:
+            attempt_count += 1
+            pending, ticket = ticket or slots.request(slot_priority), None
+            await slots.acquire(pending)
+            outcome: dict[str, Any] | None = None
+            try:
+                workspace = await asyncio.to_thread(
+                    context.acquire_workspace, attempt_count
+                )
+                try:
+                    attempt = await asyncio.to_thread(
+                        context.prepare, attempt_count, workspace
+                    )
+                    try:
+                        result = await run_codex_exec_async(
+                            **context.exec_kwargs(attempt)
+                        )
+                    finally:
+                        changed_hint = attempt.stop_watcher()
+                    outcome, backoff_seconds = await asyncio.to_thread(
+                        context.finish,
+                        attempt,
+                        result,
+                        changed_hint,
+                        attempt_logs,
+                    )
+                    if outcome is not None:
+                        return outcome
+                finally:
+                    if outcome is None:
+                        await asyncio.to_thread(
+                            cleanup_isolated_workspace, workspace
+                        )
+            finally:
+                slots.release(deferred=hand_back_slot and outcome is not None)
+            await asyncio.sleep(backoff_seconds)
+    finally:
+        if ticket is not None:
+            slots.discard(ticket)
+    raise AssertionError("retry loop exited unexpectedly")
+
+
 def run_pipeline_mode(
     args: argparse.Namespace,
     task_type: TaskType,
     enable_logging: bool,
 ) -> int:
     del task_type  # pipeline currently uses deterministic grading
+    get_default_blob_store().prune(REPO_BLOB_CACHE_MAX_AGE_SECONDS)
     raw_pipeline_spec = (
         load_pipeline_spec(args.pipeline_spec) if args.pipeline_spec else None
     )
@@ -3102,9 +6108,25 @@ def run_pipeline_mode(
         unauthorized_write_detected = False
 
     state_path = get_pipeline_state_path(pipeline_log_dir, pipeline_run_id)
-    write_pipeline_state(
+    checkpoint = PipelineCheckpoint(
         state_path,
-        build_pipeline_state_payload(
+        seq=(
+            int(resume_state.get("checkpoint_seq") or 0)
+            if args.resume_run
+            else 0
+        ),
+    )
+    stage_specs = list(canonical_spec["stages"])
+    stage_spec_map = {stage["id"]: stage for stage in stage_specs}
+    allow_dynamic = bool(canonical_spec.get("allow_dynamic_stages", False))
+    max_total_prompt_chars = canonical_spec.get("max_total_prompt_chars")
+    allowed_stage_ids = set(canonical_spec.get("allowed_stage_ids") or [])
+
+    def build_state_payload(
+        success: bool | None = None,
+        error_message: str = "",
+    ) -> dict[str, Any]:
+        return build_pipeline_state_payload(
             pipeline_run_id=pipeline_run_id,
             log_dir=pipeline_log_dir,
             prompt=prompt,
@@ -3117,45 +6139,50 @@ def run_pipeline_mode(
             completed_stage_ids=sorted(completed_stage_ids),
             unauthorized_write_detected=unauthorized_write_detected,
             args=args,
-        ),
-    )
+            success=success,
+            error_message=error_message,
+        )
 
-    stage_specs = list(canonical_spec["stages"])
-    stage_spec_map = {stage["id"]: stage for stage in stage_specs}
-    allow_dynamic = bool(canonical_spec.get("allow_dynamic_stages", False))
-    max_total_prompt_chars = canonical_spec.get("max_total_prompt_chars")
-    allowed_stage_ids = set(canonical_spec.get("allowed_stage_ids") or [])
+    def persist_state(record: dict[str, Any]) -> None:
+        # 差分だけをジャーナルへ追記し、一定件数ごとにスナップショットへ畳む
+        checkpoint.append(record)
+        if checkpoint.should_compact():
+            checkpoint.compact(build_state_payload())
 
-    def persist_state(
-        *,
-        success: bool | None = None,
-        error_message: str = "",
+    def persist_commit(
+        stage_ids: list[str],
+        committed_results: list[dict[str, Any]],
     ) -> None:
-        write_pipeline_state(
-            state_path,
-            build_pipeline_state_payload(
-                pipeline_run_id=pipeline_run_id,
-                log_dir=pipeline_log_dir,
-                prompt=prompt,
-                canonical_spec=canonical_spec,
-                raw_pipeline_spec=raw_pipeline_spec,
-                capsule=capsule,
-                stage_results=pipeline_stage_results,
-                stage_logs=stage_logs,
-                attempts_by_stage=attempts_by_stage,
-                completed_stage_ids=sorted(completed_stage_ids),
-                unauthorized_write_detected=unauthorized_write_detected,
-                args=args,
-                success=success,
-                error_message=error_message,
-            ),
+        persist_state(
+            {
+                "type": "commit",
+                "stage_ids": stage_ids,
+                "capsule_patch": [
+                    op
+                    for result in committed_results
+                    for op in result.get("capsule_patch", [])
+                ],
+            }
+        )
+
+    def persist_final(success: bool, error_message: str) -> None:
+        checkpoint.append(
+            {
+                "type": "final",
+                "success": success,
+                "error_message": error_message,
+            }
         )
+        checkpoint.compact(build_state_payload(success, error_message))
+
+    checkpoint.compact(build_state_payload())
 
     def apply_stage_results_atomically(
         base_capsule: dict[str, Any],
         results_to_apply: list[dict[str, Any]],
     ) -> tuple[dict[str, Any], bool]:
-        candidate = json.loads(json.dumps(base_capsule))
+        # apply_capsule_patch は入力を変更しないので複製は不要
+        candidate = base_capsule
         for stage_result in results_to_apply:
             candidate, applied = apply_stage_result(
                 candidate,
@@ -3167,6 +6194,46 @@ def run_pipeline_mode(
                 return base_capsule, False
         return candidate, True
 
+    def commit_stage_group(group_outcomes: list[dict[str, Any]]) -> str:
+        nonlocal capsule
+        group_results = [outcome["stage_result"] for outcome in group_outcomes]
+        candidate_capsule, applied = apply_stage_results_atomically(
+            capsule,
+            group_results,
+        )
+        if not applied:
+            for outcome in group_outcomes:
+                cleanup_stage_workspace(outcome)
+            return "pipeline execution failed"
+        merged_files, conflicting_files = merge_parallel_stage_changes(
+            group_outcomes, root=ROOT_DIR
+        )
+        if conflicting_files:
+            for outcome in group_outcomes:
+                cleanup_stage_workspace(outcome)
+            return "parallel stage file conflicts detected: " + ", ".join(
+                conflicting_files
+            )
+        if any(outcome.get("promotable_files") for outcome in group_outcomes):
+            workspace_pool.invalidate_shared()
+        for outcome in group_outcomes:
+            if merged_files and outcome["attempt_logs"]:
+                outcome["attempt_logs"][-1]["merged_files"] = sorted(
+                    set(merged_files).intersection(
+                        outcome.get("promotable_files") or []
+                    )
+                )
+            promote_stage_workspace(outcome, root=ROOT_DIR)
+        for outcome in group_outcomes:
+            store_stage_cache_entry(outcome)
+        capsule = candidate_capsule
+        group_stage_ids = [
+            outcome["policy"].stage_id for outcome in group_outcomes
+        ]
+        completed_stage_ids.update(group_stage_ids)
+        persist_commit(group_stage_ids, group_results)
+        return ""
+
     def record_stage_outcome(outcome: dict[str, Any]) -> None:
         nonlocal unauthorized_write_detected
         policy: StageExecutionPolicy = outcome["policy"]
@@ -3174,17 +6241,28 @@ def run_pipeline_mode(
         stage_logs.extend(outcome["attempt_logs"])
         if outcome["unauthorized_write"]:
             unauthorized_write_detected = True
-        persist_state()
+        persist_state(
+            {
+                "type": "stage_outcome",
+                "stage_id": policy.stage_id,
+                "attempt_count": outcome["attempt_count"],
+                "attempt_logs": outcome["attempt_logs"],
+                "stage_result": outcome["stage_result"],
+                "unauthorized_write": bool(outcome["unauthorized_write"]),
+            }
+        )
 
-    def run_stage_once(
-        stage_spec: dict[str, Any], current_capsule: dict[str, Any]
+    async def run_stage_once(
+        stage_spec: dict[str, Any],
+        current_capsule: dict[str, Any],
+        **slot_kwargs: Any,
     ) -> dict[str, Any]:
         previous_attempts = (
             attempts_by_stage.get(stage_spec["id"], 0)
             if stage_spec["id"] in completed_stage_ids
             else 0
         )
-        return execute_stage_with_retry(
+        return await execute_stage_with_retry_async(
             stage_spec=stage_spec,
             capsule_state=current_capsule,
             base_prompt=prompt,
@@ -3200,8 +6278,100 @@ def run_pipeline_mode(
             allow_dynamic=allow_dynamic,
             previous_attempts=previous_attempts,
             source_root=ROOT_DIR,
+            snapshot_mode=args.snapshot_mode,
+            workspace_pool=workspace_pool,
+            read_only_workspace=args.read_only_workspace,
+            **slot_kwargs,
         )
 
+    async def run_graph_stages() -> str:
+        """graph pipeline を 1 つの event loop で実行し、失敗理由を返す
+
+        ready な stage はすぐ task にし、codex を走らせる worker 枠
+        （max_parallel_stages）は PrioritySlots で残り経路の長い順に渡す。
+        retry の backoff 中の stage は枠を手放す。完了した stage の枠は
+        commit と後続の登録を済ませてから dispatch するので、後から ready に
+        なった長い経路の stage が先に並んだ優先度の低い stage に抜かれない。
+        失敗が確定したら走行中の task をキャンセルし、プロセスグループごと止める。
+        """
+        scheduler = CriticalPathScheduler(stage_specs, completed_stage_ids)
+        write_roots_by_stage = {
+            stage["id"]: list(stage.get("write_roots") or [])
+            for stage in stage_specs
+        }
+        slots = PrioritySlots(args.max_parallel_stages)
+        running: dict[asyncio.Task[dict[str, Any]], str] = {}
+        finished: dict[str, dict[str, Any]] = {}
+        failure = ""
+        try:
+            while True:
+                while not failure and (stage_id := scheduler.pop_ready()):
+                    rank = scheduler.rank(stage_id)
+                    # capsule は不変値として共有する（stage は読むだけ）
+                    task = asyncio.create_task(
+                        run_stage_once(
+                            stage_spec_map[stage_id],
+                            capsule,
+                            exec_slots=slots,
+                            slot_priority=rank,
+                            slot_ticket=slots.request(rank),
+                            hand_back_slot=True,
+                        )
+                    )
+                    running[task] = stage_id
+                slots.dispatch()
+                if not running:
+                    break
+                done, _ = await asyncio.wait(
+                    running, return_when=asyncio.FIRST_COMPLETED
+                )
+                for task in sorted(
+                    done, key=lambda item: scheduler.order[running[item]]
+                ):
+                    stage_id = running.pop(task)
+                    outcome = task.result()
+                    pipeline_stage_results.append(outcome["stage_result"])
+                    await asyncio.to_thread(record_stage_outcome, outcome)
+                    finished[stage_id] = outcome
+                # write_roots が重なる stage が走っている間は promote を保留し、
+                # 重なる stage 同士をまとめて原子的に適用する
+                running_ids = set(running.values())
+                for group in group_overlapping_stages(
+                    [*finished, *running_ids], write_roots_by_stage
+                ):
+                    if running_ids.intersection(group):
+                        continue
+                    group_outcomes = [
+                        finished.pop(stage_id)
+                        for stage_id in sorted(
+                            group, key=scheduler.order.__getitem__
+                        )
+                    ]
+                    if failure:
+                        for outcome in group_outcomes:
+                            await asyncio.to_thread(
+                                cleanup_stage_workspace, outcome
+                            )
+                        continue
+                    # merge / promote / journal の fsync は event loop の外で行い、
+                    # 走行中の stage の出力収集や timeout 処理を止めない
+                    failure = await asyncio.to_thread(
+                        commit_stage_group, group_outcomes
+                    )
+                    if not failure:
+                        for outcome in group_outcomes:
+                            scheduler.mark_done(outcome["policy"].stage_id)
+                if failure:
+                    break
+        finally:
+            for task in running:
+                task.cancel()
+            results = await asyncio.gather(*running, return_exceptions=True)
+            for outcome in [*finished.values(), *results]:
+                if isinstance(outcome, dict):
+                    await asyncio.to_thread(cleanup_stage_workspace, outcome)
+        return failure
+
     def register_dynamic_stages(
         queue: list[str],
         index: int,
@@ -3232,107 +6402,87 @@ def run_pipeline_mode(
         for offset, stage_id_value in enumerate(inserted, start=1):
             queue.insert(index + offset, stage_id_value)
 
-    wrapper_error = False
-    success = False
-    error_message = ""
-    if canonical_spec.get("uses_graph"):
-        ordered_outcomes: list[dict[str, Any]] = []
-        try:
-            layers = build_stage_layers(stage_specs)
-            for layer in layers:
-                pending_stage_ids = [
-                    stage_id
-                    for stage_id in layer
-                    if stage_id not in completed_stage_ids
-                ]
-                if not pending_stage_ids:
-                    continue
-                layer_snapshot = json.loads(json.dumps(capsule))
-                layer_outcomes: dict[str, dict[str, Any]] = {}
-                with concurrent.futures.ThreadPoolExecutor(
-                    max_workers=max(1, args.max_parallel_stages)
-                ) as executor:
-                    future_map = {
-                        executor.submit(
-                            run_stage_once,
-                            stage_spec_map[stage_id],
-                            layer_snapshot,
-                        ): stage_id
-                        for stage_id in pending_stage_ids
-                    }
-                    for future in concurrent.futures.as_completed(future_map):
-                        stage_id = future_map[future]
-                        layer_outcomes[stage_id] = future.result()
-                ordered_outcomes = [
-                    layer_outcomes[stage_id] for stage_id in pending_stage_ids
-                ]
-                ordered_stage_results = [
-                    outcome["stage_result"] for outcome in ordered_outcomes
-                ]
-                pipeline_stage_results.extend(ordered_stage_results)
-                for outcome in ordered_outcomes:
-                    record_stage_outcome(outcome)
-                candidate_capsule, applied = apply_stage_results_atomically(
-                    layer_snapshot,
-                    ordered_stage_results,
-                )
-                if not applied:
-                    for outcome in ordered_outcomes:
-                        cleanup_stage_workspace(outcome)
-                    error_message = "pipeline execution failed"
-                    break
-                conflicting_files = detect_conflicting_stage_changes(
-                    ordered_outcomes
-                )
-                if conflicting_files:
-                    error_message = (
-                        "parallel stage file conflicts detected: "
-                        + ", ".join(conflicting_files)
-                    )
-                    for outcome in ordered_outcomes:
-                        cleanup_stage_workspace(outcome)
-                    break
-                for outcome in ordered_outcomes:
-                    promote_stage_workspace(outcome, root=ROOT_DIR)
-                capsule = candidate_capsule
-                completed_stage_ids.update(pending_stage_ids)
-                persist_state()
-                ordered_outcomes = []
-            success = len(completed_stage_ids) == len(stage_specs)
-            if success:
-                error_message = ""
-            elif not error_message:
-                error_message = "pipeline execution failed"
-        except ValueError as exc:
-            for outcome in ordered_outcomes:
-                cleanup_stage_workspace(outcome)
-            wrapper_error = True
-            error_message = str(exc)
-    else:
+    async def discard_speculation(
+        speculation: tuple[str, dict[str, Any], asyncio.Task[dict[str, Any]]],
+        reason: str,
+    ) -> None:
+        _, _, task = speculation
+        task.cancel()
+        (result,) = await asyncio.gather(task, return_exceptions=True)
+        if not isinstance(result, dict):
+            return
+        await asyncio.to_thread(cleanup_stage_workspace, result)
+        for stage_log in result["attempt_logs"]:
+            stage_log["speculative"] = True
+            stage_log["speculation"] = f"discarded: {reason}"
+        stage_logs.extend(result["attempt_logs"])
+
+    async def run_linear_stages() -> str:
+        """直列 pipeline を実行し、失敗理由を返す
+
+        --speculative-stages では、走行中の stage の patch_prefixes が次の
+        stage の input_keys と交わらなければ、次の stage を現在の capsule で
+        先行起動する。upstream の commit 後に入力 capsule が変わらず repo への
+        promote も無ければ結果を採用し、そうでなければ破棄して再実行する。
+        """
+        nonlocal capsule
         dynamic_stage_specs: dict[str, dict[str, Any]] = {}
         queue = [
             stage["id"]
             for stage in stage_specs
             if stage["id"] not in completed_stage_ids
         ]
+        speculate = args.speculative_stages and args.max_parallel_stages > 1
+
+        def resolve_stage_spec(stage_id: str) -> dict[str, Any]:
+            stage_spec = find_stage_spec(
+                canonical_spec,
+                stage_id,
+                dynamic_stage_specs,
+            )
+            if not isinstance(stage_spec, dict):
+                raise ValueError("stage spec not found")
+            return stage_spec
+
         index = 0
+        speculation: (
+            tuple[str, dict[str, Any], asyncio.Task[dict[str, Any]]] | None
+        ) = None
+        stage_task: asyncio.Task[dict[str, Any]] | None = None
         outcome: dict[str, Any] | None = None
         try:
             while index < len(queue):
                 if len(queue) > args.max_stages:
                     raise ValueError("pipeline stages exceed max_stages")
                 stage_id = queue[index]
-                stage_spec = find_stage_spec(
-                    canonical_spec,
-                    stage_id,
-                    dynamic_stage_specs,
-                )
-                if not isinstance(stage_spec, dict):
-                    raise ValueError("stage spec not found")
-                outcome = run_stage_once(stage_spec, capsule)
+                stage_spec = resolve_stage_spec(stage_id)
+                speculative = speculation is not None
+                if speculation is not None:
+                    stage_task = speculation[2]
+                    speculation = None
+                else:
+                    stage_task = asyncio.create_task(
+                        run_stage_once(stage_spec, capsule)
+                    )
+                if speculate and index + 1 < len(queue):
+                    next_spec = resolve_stage_spec(queue[index + 1])
+                    if can_speculate_stage(next_spec, stage_spec):
+                        speculation = (
+                            next_spec["id"],
+                            capsule,
+                            asyncio.create_task(
+                                run_stage_once(next_spec, capsule)
+                            ),
+                        )
+                outcome = await stage_task
+                stage_task = None
+                if speculative:
+                    for stage_log in outcome["attempt_logs"]:
+                        stage_log["speculative"] = True
+                        stage_log["speculation"] = "accepted"
                 stage_result = outcome["stage_result"]
                 pipeline_stage_results.append(stage_result)
-                record_stage_outcome(outcome)
+                await asyncio.to_thread(record_stage_outcome, outcome)
                 candidate_capsule, applied = apply_stage_result(
                     capsule,
                     stage_result,
@@ -3340,10 +6490,14 @@ def run_pipeline_mode(
                     capsule_validator=validate_capsule_payload,
                 )
                 if not applied:
-                    error_message = "pipeline execution failed"
-                    cleanup_stage_workspace(outcome)
-                    break
-                promote_stage_workspace(outcome, root=ROOT_DIR)
+                    return "pipeline execution failed"
+                promoted = bool(outcome.get("promotable_files"))
+                if promoted:
+                    await asyncio.to_thread(workspace_pool.invalidate_shared)
+                await asyncio.to_thread(
+                    promote_stage_workspace, outcome, ROOT_DIR
+                )
+                await asyncio.to_thread(store_stage_cache_entry, outcome)
                 capsule = candidate_capsule
                 completed_stage_ids.add(stage_id)
                 register_dynamic_stages(
@@ -3352,21 +6506,72 @@ def run_pipeline_mode(
                     stage_result,
                     dynamic_stage_specs,
                 )
-                persist_state()
+                await asyncio.to_thread(
+                    persist_commit, [stage_id], [stage_result]
+                )
                 outcome = None
                 index += 1
-            success = index == len(queue)
-            if success:
-                error_message = ""
-            elif not error_message:
-                error_message = "pipeline execution failed"
-        except ValueError as exc:
+                if speculation is None:
+                    continue
+                # 予測ではなく実際の入力で検証するので、採用した結果は
+                # upstream の commit 後に逐次実行した場合と同じ入力に基づく
+                speculative_id, launch_capsule, _ = speculation
+                input_keys = resolve_stage_spec(speculative_id)["input_keys"]
+                if index >= len(queue) or queue[index] != speculative_id:
+                    reason = "queue changed"
+                elif promoted:
+                    reason = "upstream promoted repo changes"
+                elif compute_capsule_hash(
+                    select_capsule_inputs(launch_capsule, input_keys)
+                ) != compute_capsule_hash(
+                    select_capsule_inputs(capsule, input_keys)
+                ):
+                    reason = "input capsule changed"
+                else:
+                    continue
+                await discard_speculation(speculation, reason)
+                speculation = None
+            return ""
+        finally:
             if outcome is not None:
-                cleanup_stage_workspace(outcome)
-            wrapper_error = True
-            error_message = str(exc)
+                await asyncio.to_thread(cleanup_stage_workspace, outcome)
+            if stage_task is not None:
+                stage_task.cancel()
+                (result,) = await asyncio.gather(
+                    stage_task, return_exceptions=True
+                )
+                if isinstance(result, dict):
+                    await asyncio.to_thread(cleanup_stage_workspace, result)
+            if speculation is not None:
+                await discard_speculation(speculation, "pipeline stopped")
+
+    wrapper_error = False
+    success = False
+    error_message = ""
+    workspace_pool = WorkspacePool(ROOT_DIR, max_idle=args.max_parallel_stages)
+    try:
+        if canonical_spec.get("uses_graph"):
+            try:
+                error_message = asyncio.run(run_graph_stages())
+                success = len(completed_stage_ids) == len(stage_specs)
+                if success:
+                    error_message = ""
+                elif not error_message:
+                    error_message = "pipeline execution failed"
+            except ValueError as exc:
+                wrapper_error = True
+                error_message = str(exc)
+        else:
+            try:
+                error_message = asyncio.run(run_linear_stages())
+                success = not error_message
+            except ValueError as exc:
+                wrapper_error = True
+                error_message = str(exc)
+    finally:
+        workspace_pool.close()
 
-    persist_state(success=success, error_message=error_message)
+    persist_final(success, error_message)
     exit_code = determine_pipeline_exit_code(success, wrapper_error)
     if not success:
         final_store_mode, final_capsule_path, _ = resolve_capsule_delivery(
@@ -3398,7 +6603,7 @@ def run_pipeline_mode(
                 },
                 results=stage_logs,
                 evaluation={"heuristic": None, "human": None, "llm": None},
-                metadata=get_git_info(),
+                metadata=build_log_metadata(),
             )
             write_log(log)
         if args.json:
@@ -3446,7 +6651,6 @@ def run_pipeline_mode(
         used_graph=canonical_spec.get("uses_graph", False),
         allow_dynamic=allow_dynamic,
     )
-    persist_state(success=success, error_message=error_message)
 
     if enable_logging:
         log = ExecutionLog(
@@ -3468,7 +6672,7 @@ def run_pipeline_mode(
             },
             results=stage_logs,
             evaluation={"heuristic": evaluation, "human": None, "llm": None},
-            metadata=get_git_info(),
+            metadata=build_log_metadata(),
         )
         log_path = write_log(log)
         if args.verbose and log_path:
@@ -3516,6 +6720,51 @@ def main() -> int:
         default=3,
         help="並列/コンペモードでの実行回数",
     )
+    parser.add_argument(
+        "--max-concurrency",
+        type=int,
+        default=DEFAULT_MAX_CONCURRENCY,
+        help="並列/コンペモードで同時に起動する codex exec の上限（0: 無制限）",
+    )
+    parser.add_argument(
+        "--rate-limit",
+        type=float,
+        default=None,
+        help="model/profile ごとの codex exec 起動レート上限（回/秒）",
+    )
+    parser.add_argument(
+        "--rate-burst",
+        type=int,
+        default=1,
+        help="--rate-limit のバースト許容数",
+    )
+    parser.add_argument(
+        "--quorum",
+        type=int,
+        default=None,
+        help="並列モードで指定数が成功した時点で残りの実行を打ち切る",
+    )
+    parser.add_argument(
+        "--early-stop",
+        action="store_true",
+        help="コンペモードで合格スコアの候補が出た時点で残りの実行を打ち切る",
+    )
+    parser.add_argument(
+        "--early-stop-score",
+        type=float,
+        default=None,
+        help=f"--early-stop の合格スコア（既定: {COMPETITION_PASS_SCORE}）",
+    )
+    parser.add_argument(
+        "--cache",
+        type=str,
+        choices=list(RESULT_CACHE_MODE_VALUES),
+        default="off",
+        help=(
+            "結果キャッシュ（read-only 実行は prompt/model/profile/作業ツリー、"
+            "pipeline stage は capsule 入力/stage spec/model/作業ツリーで照合）"
+        ),
+    )
     parser.add_argument(
         "--sandbox",
         type=str,
@@ -3656,6 +6905,28 @@ def main() -> int:
         default=DEFAULT_MAX_PARALLEL_STAGES,
         help="pipeline graph の最大並列 stage 数",
     )
+    parser.add_argument(
+        "--speculative-stages",
+        action="store_true",
+        help=(
+            "直列 pipeline で、前段の patch_prefixes と input_keys が交わらない "
+            "stage を先行実行する（commit 後に入力を検証し、変われば再実行）"
+        ),
+    )
+    parser.add_argument(
+        "--snapshot-mode",
+        type=str,
+        choices=list(SNAPSHOT_MODE_VALUES),
+        default="walk",
+        help="pipeline stage の変更検出方式（watch: inotify、失敗時は走査）",
+    )
+    parser.add_argument(
+        "--read-only-workspace",
+        type=str,
+        choices=list(READ_ONLY_WORKSPACE_VALUES),
+        default="isolated",
+        help="read-only stage の workspace（shared: source 世代ごとに共有）",
+    )
     parser.add_argument(
         "--resume-run",
         type=str,
@@ -3672,8 +6943,12 @@ def main() -> int:
     # --no-log が指定されていたらログを無効化
     enable_logging = args.log and not args.no_log
 
-    global LOG_DIR
+    global LOG_DIR, RESULT_CACHE_MODE
     LOG_DIR = resolve_log_dir(args.log_dir, args.log_scope)
+    RESULT_CACHE_MODE = args.cache
+    if RESULT_CACHE_MODE != "off":
+        get_result_cache().prune()
+        get_stage_cache().prune()
 
     # Guardrails: fast/very-fast は「タスク極小化」前提でのみ使う。
     if args.profile in FAST_PROFILES:
@@ -3702,6 +6977,8 @@ def main() -> int:
     judge_mode = JudgeMode(args.judge_mode)
     merge_strat = MergeStrategy(args.merge)
     exit_code = EXIT_SUCCESS
+    run_id = str(uuid.uuid4())
+    event_log_dir = LOG_DIR / "events" / run_id if enable_logging else None
 
     if mode == ExecutionMode.SINGLE:
         result = run_codex_exec(
@@ -3711,6 +6988,7 @@ def main() -> int:
             workdir=args.workdir,
             profile=args.profile,
             model=args.model,
+            event_log_path=build_exec_event_log_path(event_log_dir, "agent_0"),
         )
 
         # ヒューリスティック評価
@@ -3746,6 +7024,7 @@ def main() -> int:
         # ログ出力
         if enable_logging:
             log = ExecutionLog(
+                run_id=run_id,
                 execution={
                     "mode": mode.value,
                     "prompt": truncate_output(args.prompt, 1000),
@@ -3761,8 +7040,13 @@ def main() -> int:
                         "agent_id": result.agent_id,
                         "model": result.metadata.get("model"),
                         "output": truncate_output(result.output),
+                        "output_chars": len(result.output),
                         "stderr": truncate_output(result.stderr),
                         "tokens_used": result.tokens_used,
+                        "input_tokens": result.input_tokens,
+                        "output_tokens": result.output_tokens,
+                        "cached_input_tokens": result.cached_input_tokens,
+                        "token_source": result.token_source,
                         "execution_time": result.execution_time,
                         "success": result.success,
                         "returncode": result.returncode,
@@ -3770,6 +7054,7 @@ def main() -> int:
                         "timeout_seconds": result.timeout_seconds,
                         "output_is_partial": result.output_is_partial,
                         "error_message": result.error_message,
+                        "event_log": result.metadata.get("event_log"),
                     }
                 ],
                 evaluation={
@@ -3777,7 +7062,7 @@ def main() -> int:
                     "human": None,
                     "llm": llm_eval,
                 },
-                metadata=get_git_info(),
+                metadata=build_log_metadata(),
             )
             log_path = write_log(log)
             if args.verbose and log_path:
@@ -3791,6 +7076,10 @@ def main() -> int:
                         "output": result.output,
                         "stderr": result.stderr,
                         "tokens_used": result.tokens_used,
+                        "input_tokens": result.input_tokens,
+                        "output_tokens": result.output_tokens,
+                        "cached_input_tokens": result.cached_input_tokens,
+                        "token_source": result.token_source,
                         "execution_time": result.execution_time,
                         "success": result.success,
                         "returncode": result.returncode,
@@ -3829,6 +7118,11 @@ def main() -> int:
                 workdir=args.workdir,
                 profile=args.profile,
                 model=args.model,
+                event_log_dir=event_log_dir,
+                max_concurrency=args.max_concurrency,
+                rate_limit=args.rate_limit,
+                rate_burst=args.rate_burst,
+                quorum=args.quorum,
             )
         )
         merged = merge_outputs(results, merge_strat)
@@ -3847,6 +7141,7 @@ def main() -> int:
         # ログ出力
         if enable_logging:
             log = ExecutionLog(
+                run_id=run_id,
                 execution={
                     "mode": mode.value,
                     "prompt": truncate_output(args.prompt, 1000),
@@ -3854,6 +7149,9 @@ def main() -> int:
                     "task_type": task_type.value,
                     "count": args.count,
                     "merge_strategy": merge_strat.value,
+                    "max_concurrency": args.max_concurrency,
+                    "rate_limit": args.rate_limit,
+                    "quorum": args.quorum,
                     "timeout_seconds": args.timeout,
                     "profile": args.profile,
                     "model": args.model,
@@ -3863,8 +7161,13 @@ def main() -> int:
                         "agent_id": r.agent_id,
                         "model": r.metadata.get("model"),
                         "output": truncate_output(r.output),
+                        "output_chars": len(r.output),
                         "stderr": truncate_output(r.stderr),
                         "tokens_used": r.tokens_used,
+                        "input_tokens": r.input_tokens,
+                        "output_tokens": r.output_tokens,
+                        "cached_input_tokens": r.cached_input_tokens,
+                        "token_source": r.token_source,
                         "execution_time": r.execution_time,
                         "success": r.success,
                         "returncode": r.returncode,
@@ -3872,6 +7175,10 @@ def main() -> int:
                         "timeout_seconds": r.timeout_seconds,
                         "output_is_partial": r.output_is_partial,
                         "error_message": r.error_message,
+                        "event_log": r.metadata.get("event_log"),
+                        "queue_wait_seconds": r.metadata.get(
+                            "queue_wait_seconds"
+                        ),
                     }
                     for r in results
                 ],
@@ -3880,7 +7187,7 @@ def main() -> int:
                     "human": None,
                     "llm": None,
                 },
-                metadata=get_git_info(),
+                metadata=build_log_metadata(),
             )
             log_path = write_log(log)
             if args.verbose and log_path:
@@ -3923,7 +7230,11 @@ def main() -> int:
                 print(f"Average Score: {avg_score:.2f}")
                 print("--- Merged Output ---")
             failures = [
-                r for r in results if not r.success and r.error_message
+                r
+                for r in results
+                if not r.success
+                and r.error_message
+                and not r.metadata.get("cancelled")
             ]
             for r in failures:
                 print(
@@ -3931,7 +7242,10 @@ def main() -> int:
                     file=sys.stderr,
                 )
             print(merged)
-        all_success = bool(results) and all(r.success for r in results)
+        if args.quorum:
+            all_success = sum(1 for r in results if r.success) >= args.quorum
+        else:
+            all_success = bool(results) and all(r.success for r in results)
         exit_code = EXIT_SUCCESS if all_success else EXIT_SUBAGENT_FAILED
 
     elif mode == ExecutionMode.COMPETITION:
@@ -3947,6 +7261,13 @@ def main() -> int:
                 workdir=args.workdir,
                 profile=args.profile,
                 model=args.model,
+                event_log_dir=event_log_dir,
+                max_concurrency=args.max_concurrency,
+                rate_limit=args.rate_limit,
+                rate_burst=args.rate_burst,
+                early_stop_score=resolve_early_stop_score(
+                    args.early_stop, args.early_stop_score
+                ),
             )
         )
         best = outcome.best
@@ -3982,6 +7303,7 @@ def main() -> int:
         # ログ出力
         if enable_logging:
             log = ExecutionLog(
+                run_id=run_id,
                 execution={
                     "mode": mode.value,
                     "prompt": truncate_output(args.prompt, 1000),
@@ -3989,7 +7311,12 @@ def main() -> int:
                     "task_type": task_type.value,
                     "count": args.count,
                     "strategy": strategy.value,
+                    "max_concurrency": args.max_concurrency,
+                    "rate_limit": args.rate_limit,
                     "judge_mode": judge_mode.value,
+                    "early_stop_score": resolve_early_stop_score(
+                        args.early_stop, args.early_stop_score
+                    ),
                     "timeout_seconds": args.timeout,
                     "profile": args.profile,
                     "model": args.model,
@@ -4000,8 +7327,13 @@ def main() -> int:
                             "agent_id": r.agent_id,
                             "model": r.metadata.get("model"),
                             "output": truncate_output(r.output),
+                            "output_chars": len(r.output),
                             "stderr": truncate_output(r.stderr),
                             "tokens_used": r.tokens_used,
+                            "input_tokens": r.input_tokens,
+                            "output_tokens": r.output_tokens,
+                            "cached_input_tokens": r.cached_input_tokens,
+                            "token_source": r.token_source,
                             "execution_time": r.execution_time,
                             "success": r.success,
                             "returncode": r.returncode,
@@ -4009,6 +7341,10 @@ def main() -> int:
                             "timeout_seconds": r.timeout_seconds,
                             "output_is_partial": r.output_is_partial,
                             "error_message": r.error_message,
+                            "event_log": r.metadata.get("event_log"),
+                            "queue_wait_seconds": r.metadata.get(
+                                "queue_wait_seconds"
+                            ),
                             "selected": r.agent_id == best.result.agent_id,
                         }
                     )
@@ -4020,7 +7356,7 @@ def main() -> int:
                     "llm": llm_eval,
                     "selection": outcome.selection,
                 },
-                metadata=get_git_info(),
+                metadata=build_log_metadata(),
             )
             log_path = write_log(log)
             if args.verbose and log_path:
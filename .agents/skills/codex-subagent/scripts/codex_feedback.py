@@ -18,10 +18,13 @@ from __future__ import annotations
 import argparse
 import json
 import os
+import sqlite3
 import sys
 from datetime import UTC, datetime
 from pathlib import Path
 
+import codex_log_index
+
 ROOT_DIR = Path(__file__).resolve().parents[4]
 LOG_ROOT_DIR = ROOT_DIR / ".codex" / "sessions" / "codex_exec"
 
@@ -55,10 +58,20 @@ LOG_DIR = resolve_log_dir()
 
 
 def find_latest_log() -> Path | None:
-    """最新のログファイルを検索"""
+    """最新のログファイルを検索（write_log が更新する latest ポインタを優先）"""
     if not LOG_DIR.exists():
         return None
 
+    try:
+        latest = codex_log_index.lookup_latest(
+            codex_log_index.resolve_index_root(LOG_DIR),
+            codex_log_index.scope_prefix(LOG_DIR),
+        )
+    except (OSError, sqlite3.Error):
+        latest = None
+    if latest is not None and latest.exists():
+        return latest
+
     # 日付ディレクトリを新しい順に探索
     log_files = list(LOG_DIR.rglob("run-*.jsonl"))
     if not log_files:
@@ -68,10 +81,28 @@ def find_latest_log() -> Path | None:
 
 
 def find_log_by_run_id(run_id: str) -> Path | None:
-    """run_id でログファイルを検索"""
+    """run_id でログファイルを検索（ログインデックスを優先）"""
     if not LOG_DIR.exists():
         return None
 
+    root = codex_log_index.resolve_index_root(LOG_DIR)
+    prefix = codex_log_index.scope_prefix(LOG_DIR)
+    try:
+        conn = codex_log_index.open_index(root)
+        try:
+            log_path = codex_log_index.lookup_run(conn, root, run_id, prefix)
+            if log_path is None or not log_path.exists():
+                # write_log 以外で増えたファイルを取り込んでから引き直す
+                codex_log_index.sync_index(conn, root)
+                log_path = codex_log_index.lookup_run(
+                    conn, root, run_id, prefix
+                )
+        finally:
+            conn.close()
+        return log_path
+    except (OSError, sqlite3.Error):
+        pass
+
     # run_id の先頭部分でファイル名検索
     for log_file in LOG_DIR.rglob(f"run-*-{run_id[:8]}*.jsonl"):
         return log_file
@@ -90,38 +121,54 @@ def find_log_by_run_id(run_id: str) -> Path | None:
     return None
 
 
+def read_last_log_entry(log_path: Path, chunk_size: int = 8192) -> dict | None:
+    """ファイル末尾から逆向きに読み、最後の JSONL レコードだけを返す"""
+    with open(log_path, "rb") as f:
+        f.seek(0, os.SEEK_END)
+        position = f.tell()
+        buffer = b""
+        while position > 0:
+            step = min(chunk_size, position)
+            position -= step
+            f.seek(position)
+            buffer = f.read(step) + buffer
+            lines = buffer.rstrip(b"\n").split(b"\n")
+            if len(lines) > 1 or position == 0:
+                last = lines[-1].strip()
+                return json.loads(last) if last else None
+    return None
+
+
 def add_feedback(
     log_path: Path,
     score: float,
     notes: str = "",
     tags: list | None = None,
 ) -> bool:
-    """ログファイルにフィードバックを追加"""
+    """ログの最後の実行にフィードバックを追加（ログ本体は書き換えない）"""
     try:
-        # 既存のログを読み込み
-        logs = []
-        with open(log_path, encoding="utf-8") as f:
-            for line in f:
-                logs.append(json.loads(line))
-
-        if not logs:
+        log = read_last_log_entry(log_path)
+        if not log:
             print("Error: Empty log file", file=sys.stderr)
             return False
 
-        # 最後のログにフィードバックを追加
-        log = logs[-1]
-        log["evaluation"]["human"] = {
-            "score": score,
-            "notes": notes,
-            "tags": tags or [],
-            "timestamp": datetime.now(UTC).isoformat(),
-        }
-
-        # ファイルを上書き
-        with open(log_path, "w", encoding="utf-8") as f:
-            for log_entry in logs:
-                f.write(json.dumps(log_entry, ensure_ascii=False) + "\n")
+        run_id = log.get("run_id")
+        if not run_id:
+            print("Error: Log entry has no run_id", file=sys.stderr)
+            return False
 
+        # run_id 単位の追記専用サイドカーに保存し、codex_query が結合する
+        codex_log_index.write_feedback(
+            codex_log_index.resolve_index_root(LOG_DIR),
+            run_id,
+            {
+                "score": score,
+                "notes": notes,
+                "tags": tags or [],
+                "timestamp": datetime.now(UTC).isoformat(),
+            },
+            log_path,
+        )
         return True
 
     except Exception as e:
@@ -131,10 +178,17 @@ def add_feedback(
 
 def show_log_summary(log_path: Path) -> None:
     """ログの概要を表示"""
+    root = codex_log_index.resolve_index_root(LOG_DIR)
     try:
         with open(log_path, encoding="utf-8") as f:
             for line in f:
                 log = json.loads(line)
+                codex_log_index.apply_feedback(
+                    log,
+                    codex_log_index.read_latest_feedback(
+                        root, log.get("run_id", "")
+                    ),
+                )
                 print(f"Run ID: {log.get('run_id', 'N/A')[:8]}...")
                 print(f"Timestamp: {log.get('timestamp', 'N/A')}")
                 print(f"Mode: {log.get('execution', {}).get('mode', 'N/A')}")
@@ -0,0 +1,612 @@
+"""
+codex_log_export.py - codex_exec 実行ログの列指向エクスポートと日次ロールアップ
+
+ログを runs / results / stages の 3 テーブルに平坦化し、Parquet または
+Arrow IPC へバッチ単位で書き出す（pyarrow が必要）。あわせて日付 × model ×
+mode × task_type ごとの件数・スコア分位・タイムアウト数を日次ロールアップ
+（JSON、依存なし）として書き出し、ダッシュボードが生の JSONL を読み直さずに
+済むようにする。分位はマージ可能なスケッチ（QuantileSketch）で求めるため、
+件数が増えてもメモリは一定で、codex_query --stats の性能集計にも使う。
+"""
+
+from __future__ import annotations
+
+import json
+import math
+import os
+import tempfile
+from collections.abc import Iterable
+from pathlib import Path
+from typing import Any
+
+try:
+    import pyarrow as pa
+    import pyarrow.ipc as pa_ipc
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pa_ipc = None
+    pq = None
+
+COLUMNAR_FORMATS = {"parquet": ".parquet", "arrow": ".arrow"}
+EXPORT_BATCH_ROWS = 8192
+ROLLUP_PERCENTILES = (50, 90, 99)
+SKETCH_RELATIVE_ACCURACY = 0.01
+SKETCH_MAX_BUCKETS = 2048
+# これ以下の値（0 秒・空出力など）は対数バケットに入れず別に数える
+SKETCH_MIN_VALUE = 1e-9
+
+TOKEN_FIELDS = (
+    "tokens_used",
+    "input_tokens",
+    "output_tokens",
+    "cached_input_tokens",
+)
+
+RUN_COLUMNS: tuple[tuple[str, str], ...] = (
+    ("run_id", "string"),
+    ("timestamp", "string"),
+    ("date", "string"),
+    ("mode", "string"),
+    ("model", "string"),
+    ("profile", "string"),
+    ("task_type", "string"),
+    ("prompt_chars", "int"),
+    ("result_count", "int"),
+    ("success", "bool"),
+    ("timed_out", "bool"),
+    ("execution_time", "float"),
+    ("tokens_used", "int"),
+    ("input_tokens", "int"),
+    ("output_tokens", "int"),
+    ("cached_input_tokens", "int"),
+    ("heuristic_score", "float"),
+    ("human_score", "float"),
+    ("llm_score", "float"),
+)
+RESULT_COLUMNS: tuple[tuple[str, str], ...] = (
+    ("run_id", "string"),
+    ("timestamp", "string"),
+    ("result_index", "int"),
+    ("agent_id", "string"),
+    ("model", "string"),
+    ("success", "bool"),
+    ("timed_out", "bool"),
+    ("returncode", "int"),
+    ("execution_time", "float"),
+    ("tokens_used", "int"),
+    ("input_tokens", "int"),
+    ("output_tokens", "int"),
+    ("cached_input_tokens", "int"),
+    ("token_source", "string"),
+    ("output_chars", "int"),
+    ("error_message", "string"),
+)
+STAGE_COLUMNS: tuple[tuple[str, str], ...] = (
+    ("run_id", "string"),
+    ("pipeline_run_id", "string"),
+    ("timestamp", "string"),
+    ("stage_index", "int"),
+    ("stage_id", "string"),
+    ("role", "string"),
+    ("status", "string"),
+    ("agent_id", "string"),
+    ("model", "string"),
+    ("success", "bool"),
+    ("timed_out", "bool"),
+    ("execution_time", "float"),
+    ("tokens_used", "int"),
+    ("input_tokens", "int"),
+    ("output_tokens", "int"),
+    ("cached_input_tokens", "int"),
+    ("output_chars", "int"),
+    ("capsule_size_bytes", "int"),
+)
+TABLE_COLUMNS = {
+    "runs": RUN_COLUMNS,
+    "results": RESULT_COLUMNS,
+    "stages": STAGE_COLUMNS,
+}
+
+
+def _as_float(value: Any) -> float | None:
+    if isinstance(value, bool) or not isinstance(value, int | float):
+        return None
+    return float(value)
+
+
+def _as_int(value: Any) -> int | None:
+    if isinstance(value, bool) or not isinstance(value, int | float):
+        return None
+    return int(value)
+
+
+def _score(value: Any) -> float | None:
+    # codex_query と同じく 0 / 空値は「評価なし」として扱う
+    score = _as_float(value)
+    return score if score else None
+
+
+def _exec_records(log: dict[str, Any]) -> list[dict[str, Any]]:
+    results = log.get("results") or []
+    if (log.get("execution") or {}).get("mode") == "pipeline":
+        return [r.get("exec") or {} for r in results]
+    return list(results)
+
+
+def flatten_run(log: dict[str, Any]) -> dict[str, Any]:
+    """1 実行を runs テーブルの 1 行に変換"""
+    exec_data = log.get("execution") or {}
+    eval_data = log.get("evaluation") or {}
+    heuristic = eval_data.get("heuristic") or {}
+    human = eval_data.get("human") or {}
+    llm = eval_data.get("llm") or {}
+    records = _exec_records(log)
+    times = [
+        t
+        for t in (_as_float(r.get("execution_time")) for r in records)
+        if t is not None
+    ]
+    timestamp = log.get("timestamp") or ""
+    return {
+        "run_id": log.get("run_id") or "",
+        "timestamp": timestamp,
+        "date": timestamp[:10],
+        "mode": exec_data.get("mode"),
+        "model": exec_data.get("model"),
+        "profile": exec_data.get("profile"),
+        "task_type": exec_data.get("task_type"),
+        "prompt_chars": len(exec_data.get("prompt") or ""),
+        "result_count": len(records),
+        "success": bool(records) and all(r.get("success") for r in records),
+        "timed_out": any(r.get("timed_out") for r in records),
+        "execution_time": max(times) if times else None,
+        **{
+            key: sum(_as_int(r.get(key)) or 0 for r in records)
+            for key in TOKEN_FIELDS
+        },
+        "heuristic_score": _as_float(
+            heuristic.get("combined_score", heuristic.get("average_score"))
+        ),
+        "human_score": _score(human.get("score")),
+        "llm_score": _score(llm.get("correctness")),
+    }
+
+
+def _output_chars(result: dict[str, Any]) -> int:
+    # output は MAX_OUTPUT_SIZE で切り詰めて記録されるので、記録時の実サイズを優先
+    # する（output_chars を持たない古いログは切り詰め後の長さで代用）
+    recorded = _as_int(result.get("output_chars"))
+    if recorded is not None:
+        return recorded
+    return len(result.get("output") or "")
+
+
+def flatten_results(log: dict[str, Any]) -> list[dict[str, Any]]:
+    """single/parallel/competition の results[] を 1 件 1 行に変換"""
+    exec_data = log.get("execution") or {}
+    if exec_data.get("mode") == "pipeline":
+        return []
+    rows = []
+    for index, result in enumerate(log.get("results") or []):
+        rows.append(
+            {
+                "run_id": log.get("run_id") or "",
+                "timestamp": log.get("timestamp") or "",
+                "result_index": index,
+                "agent_id": result.get("agent_id"),
+                "model": result.get("model") or exec_data.get("model"),
+                "success": bool(result.get("success")),
+                "timed_out": bool(result.get("timed_out")),
+                "returncode": _as_int(result.get("returncode")),
+                "execution_time": _as_float(result.get("execution_time")),
+                **{key: _as_int(result.get(key)) for key in TOKEN_FIELDS},
+                "token_source": result.get("token_source") or None,
+                "output_chars": _output_chars(result),
+                "error_message": result.get("error_message") or None,
+            }
+        )
+    return rows
+
+
+def flatten_stages(log: dict[str, Any]) -> list[dict[str, Any]]:
+    """pipeline の stage ログを 1 stage 1 行に変換"""
+    exec_data = log.get("execution") or {}
+    if exec_data.get("mode") != "pipeline":
+        return []
+    rows = []
+    for index, stage in enumerate(log.get("results") or []):
+        exec_result = stage.get("exec") or {}
+        stage_result = stage.get("stage_result") or {}
+        rows.append(
+            {
+                "run_id": log.get("run_id") or "",
+                "pipeline_run_id": stage.get("pipeline_run_id"),
+                "timestamp": log.get("timestamp") or "",
+                "stage_index": index,
+                "stage_id": stage.get("stage_id"),
+                "role": stage.get("role"),
+                "status": stage_result.get("status"),
+                "agent_id": exec_result.get("agent_id"),
+                "model": exec_result.get("model") or exec_data.get("model"),
+                "success": bool(exec_result.get("success")),
+                "timed_out": bool(exec_result.get("timed_out")),
+                "execution_time": _as_float(exec_result.get("execution_time")),
+                **{key: _as_int(exec_result.get(key)) for key in TOKEN_FIELDS},
+                "output_chars": _output_chars(exec_result),
+                "capsule_size_bytes": _as_int(stage.get("capsule_size_bytes")),
+            }
+        )
+    return rows
+
+
+def _arrow_schema(columns: tuple[tuple[str, str], ...]):
+    types = {
+        "string": pa.string(),
+        "int": pa.int64(),
+        "float": pa.float64(),
+        "bool": pa.bool_(),
+    }
+    return pa.schema([(name, types[kind]) for name, kind in columns])
+
+
+class ColumnarTableWriter:
+    """行をバッファし、EXPORT_BATCH_ROWS ごとに RecordBatch として書き出す"""
+
+    def __init__(
+        self,
+        path: str | Path,
+        columns: tuple[tuple[str, str], ...],
+        fmt: str = "parquet",
+        batch_rows: int = EXPORT_BATCH_ROWS,
+    ) -> None:
+        if pa is None:
+            raise RuntimeError(
+                "pyarrow is required for columnar export "
+                "(uv pip install pyarrow)"
+            )
+        if fmt not in COLUMNAR_FORMATS:
+            raise ValueError(f"unsupported columnar format: {fmt}")
+        self.path = Path(path)
+        self.columns = columns
+        self.schema = _arrow_schema(columns)
+        self.batch_rows = max(1, batch_rows)
+        self.rows_written = 0
+        self._rows: list[dict[str, Any]] = []
+        if fmt == "parquet":
+            self._writer = pq.ParquetWriter(self.path, self.schema)
+        else:
+            self._writer = pa_ipc.new_file(self.path, self.schema)
+
+    def write_rows(self, rows: Iterable[dict[str, Any]]) -> None:
+        for row in rows:
+            self._rows.append(row)
+            if len(self._rows) >= self.batch_rows:
+                self.flush()
+
+    def flush(self) -> None:
+        if not self._rows:
+            return
+        batch = pa.RecordBatch.from_pydict(
+            {
+                name: [row.get(name) for row in self._rows]
+                for name, _ in self.columns
+            },
+            schema=self.schema,
+        )
+        if isinstance(self._writer, pq.ParquetWriter):
+            self._writer.write_table(pa.Table.from_batches([batch]))
+        else:
+            self._writer.write_batch(batch)
+        self.rows_written += len(self._rows)
+        self._rows = []
+
+    def close(self) -> None:
+        self.flush()
+        self._writer.close()
+
+
+def export_columnar(
+    logs: Iterable[dict[str, Any]],
+    output_dir: str | Path,
+    fmt: str = "parquet",
+    batch_rows: int = EXPORT_BATCH_ROWS,
+) -> dict[str, int]:
+    """runs/results/stages をそれぞれ 1 ファイルに書き出し、行数を返す"""
+    directory = Path(output_dir)
+    directory.mkdir(parents=True, exist_ok=True)
+    suffix = COLUMNAR_FORMATS.get(fmt)
+    if suffix is None:
+        raise ValueError(f"unsupported columnar format: {fmt}")
+    writers: dict[str, ColumnarTableWriter] = {}
+    try:
+        for table, columns in TABLE_COLUMNS.items():
+            writers[table] = ColumnarTableWriter(
+                directory / f"{table}{suffix}", columns, fmt, batch_rows
+            )
+        for log in logs:
+            writers["runs"].write_rows([flatten_run(log)])
+            writers["results"].write_rows(flatten_results(log))
+            writers["stages"].write_rows(flatten_stages(log))
+    finally:
+        for writer in writers.values():
+            writer.close()
+    return {table: writer.rows_written for table, writer in writers.items()}
+
+
+class QuantileSketch:
+    """相対誤差つきの対数バケット分位スケッチ（DDSketch 方式）
+
+    値 x は ceil(log_gamma(x)) のバケットに数えるだけなので追加は O(1)、
+    同じ精度のスケッチ同士は件数を足すだけでマージできる。バケット数が
+    max_buckets を超えたら最小側から畳み込み、メモリを一定に保つ。
+    """
+
+    def __init__(
+        self,
+        relative_accuracy: float = SKETCH_RELATIVE_ACCURACY,
+        max_buckets: int = SKETCH_MAX_BUCKETS,
+    ) -> None:
+        self.relative_accuracy = relative_accuracy
+        self.max_buckets = max_buckets
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self.gamma)
+        self.buckets: dict[int, int] = {}
+        self.zero_count = 0
+        self.count = 0
+        self.total = 0.0
+        self.min: float | None = None
+        self.max: float | None = None
+
+    def add(self, value: float) -> None:
+        value = float(value)
+        self.count += 1
+        self.total += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+        if value <= SKETCH_MIN_VALUE:
+            self.zero_count += 1
+            return
+        key = math.ceil(math.log(value) / self._log_gamma)
+        self.buckets[key] = self.buckets.get(key, 0) + 1
+        if len(self.buckets) > self.max_buckets:
+            self._collapse()
+
+    def _collapse(self) -> None:
+        keys = sorted(self.buckets)
+        overflow = keys[: len(keys) - self.max_buckets + 1]
+        target = keys[len(overflow)]
+        for key in overflow:
+            self.buckets[target] += self.buckets.pop(key)
+
+    def merge(self, other: QuantileSketch) -> None:
+        if other.gamma != self.gamma:
+            raise ValueError("cannot merge sketches with different accuracy")
+        for key, n in other.buckets.items():
+            self.buckets[key] = self.buckets.get(key, 0) + n
+        self.zero_count += other.zero_count
+        self.count += other.count
+        self.total += other.total
+        for bound in (other.min, other.max):
+            if bound is not None:
+                self.min = bound if self.min is None else min(self.min, bound)
+                self.max = bound if self.max is None else max(self.max, bound)
+        if len(self.buckets) > self.max_buckets:
+            self._collapse()
+
+    def quantile(self, q: float) -> float | None:
+        """q パーセンタイル（0-100、nearest-rank）の近似値"""
+        if not self.count:
+            return None
+        rank = min(max(math.ceil(q / 100 * self.count), 1), self.count)
+        seen = self.zero_count
+        if rank <= seen:
+            value = 0.0
+        else:
+            value = self.max
+            for key in sorted(self.buckets):
+                seen += self.buckets[key]
+                if seen >= rank:
+                    value = 2 * self.gamma**key / (self.gamma + 1)
+                    break
+        return min(max(value, self.min), self.max)
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "relative_accuracy": self.relative_accuracy,
+            "buckets": {str(k): n for k, n in sorted(self.buckets.items())},
+            "zero_count": self.zero_count,
+            "count": self.count,
+            "sum": self.total,
+            "min": self.min,
+            "max": self.max,
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict[str, Any]) -> QuantileSketch:
+        sketch = cls(data.get("relative_accuracy", SKETCH_RELATIVE_ACCURACY))
+        sketch.buckets = {int(k): n for k, n in data["buckets"].items()}
+        sketch.zero_count = data.get("zero_count", 0)
+        sketch.count = data["count"]
+        sketch.total = data.get("sum", 0.0)
+        sketch.min = data.get("min")
+        sketch.max = data.get("max")
+        return sketch
+
+
+PERFORMANCE_METRICS = ("execution_time", "output_chars", "tokens_used")
+PERFORMANCE_DIMENSIONS = ("model", "profile", "mode", "stage_role")
+
+
+class PerformanceStats:
+    """実行（result / pipeline stage）単位の分位を次元別に 1 パスで集計"""
+
+    def __init__(self) -> None:
+        self.groups: dict[tuple[str, str], dict[str, Any]] = {}
+
+    def _group(self, dimension: str, value: str) -> dict[str, Any]:
+        return self.groups.setdefault(
+            (dimension, value),
+            {
+                "count": 0,
+                "timeouts": 0,
+                **{metric: QuantileSketch() for metric in PERFORMANCE_METRICS},
+            },
+        )
+
+    def add(self, log: dict[str, Any]) -> None:
+        run = flatten_run(log)
+        for record in [*flatten_results(log), *flatten_stages(log)]:
+            keys = {
+                "model": record.get("model") or run["model"],
+                "profile": run["profile"],
+                "mode": run["mode"],
+            }
+            if "stage_id" in record:
+                keys["stage_role"] = record.get("role")
+            for dimension, value in keys.items():
+                group = self._group(dimension, value or "unknown")
+                group["count"] += 1
+                group["timeouts"] += int(record["timed_out"])
+                for metric in PERFORMANCE_METRICS:
+                    if record.get(metric) is not None:
+                        group[metric].add(record[metric])
+
+    def merge(self, other: PerformanceStats) -> None:
+        for (dimension, value), theirs in other.groups.items():
+            group = self._group(dimension, value)
+            group["count"] += theirs["count"]
+            group["timeouts"] += theirs["timeouts"]
+            for metric in PERFORMANCE_METRICS:
+                group[metric].merge(theirs[metric])
+
+    def summary(self) -> dict[str, dict[str, dict[str, Any]]]:
+        """{dimension: {value: {count, timeout_rate, <metric>_pNN...}}}"""
+        result: dict[str, dict[str, dict[str, Any]]] = {}
+        for (dimension, value), group in sorted(
+            self.groups.items(),
+            key=lambda item: (item[0][0], -item[1]["count"]),
+        ):
+            row: dict[str, Any] = {
+                "count": group["count"],
+                "timeout_rate": group["timeouts"] / group["count"],
+            }
+            for metric in PERFORMANCE_METRICS:
+                for q in ROLLUP_PERCENTILES:
+                    row[f"{metric}_p{q}"] = group[metric].quantile(q)
+            result.setdefault(dimension, {})[value] = row
+        return result
+
+
+def summarize_performance(
+    logs: Iterable[dict[str, Any]],
+) -> dict[str, dict[str, dict[str, Any]]]:
+    stats = PerformanceStats()
+    for log in logs:
+        stats.add(log)
+    return stats.summary()
+
+
+class DailyRollup:
+    """日付 × model × mode × task_type ごとの集計を 1 件ずつ積み上げる"""
+
+    def __init__(self) -> None:
+        self._groups: dict[tuple[str, str, str, str], dict[str, Any]] = {}
+
+    def add(self, log: dict[str, Any]) -> None:
+        run = flatten_run(log)
+        key = (
+            run["date"] or "unknown",
+            run["model"] or "unknown",
+            run["mode"] or "unknown",
+            run["task_type"] or "unknown",
+        )
+        group = self._groups.setdefault(
+            key,
+            {
+                "runs": 0,
+                "successes": 0,
+                "timeouts": 0,
+                "tokens_used": 0,
+                "scores": QuantileSketch(),
+                "execution_times": QuantileSketch(),
+            },
+        )
+        group["runs"] += 1
+        group["successes"] += int(run["success"])
+        group["timeouts"] += int(run["timed_out"])
+        group["tokens_used"] += run["tokens_used"]
+        if run["heuristic_score"]:
+            group["scores"].add(run["heuristic_score"])
+        if run["execution_time"] is not None:
+            group["execution_times"].add(run["execution_time"])
+
+    def by_date(self) -> dict[str, list[dict[str, Any]]]:
+        rollups: dict[str, list[dict[str, Any]]] = {}
+        for (date, model, mode, task_type), group in sorted(
+            self._groups.items()
+        ):
+            scores = group["scores"]
+            times = group["execution_times"]
+            row: dict[str, Any] = {
+                "date": date,
+                "model": model,
+                "mode": mode,
+                "task_type": task_type,
+                "runs": group["runs"],
+                "successes": group["successes"],
+                "timeouts": group["timeouts"],
+                "tokens_used": group["tokens_used"],
+                "score_avg": (
+                    scores.total / scores.count if scores.count else None
+                ),
+            }
+            for q in ROLLUP_PERCENTILES:
+                row[f"score_p{q}"] = scores.quantile(q)
+            for q in ROLLUP_PERCENTILES:
+                row[f"execution_time_p{q}"] = times.quantile(q)
+            # 複数日・複数ファイルをまたいで分位を再計算できるよう残す
+            row["sketches"] = {
+                "score": scores.to_dict(),
+                "execution_time": times.to_dict(),
+            }
+            rollups.setdefault(date, []).append(row)
+        return rollups
+
+
+def build_daily_rollups(
+    logs: Iterable[dict[str, Any]],
+) -> dict[str, list[dict[str, Any]]]:
+    """日付ごとのロールアップ行を返す"""
+    rollup = DailyRollup()
+    for log in logs:
+        rollup.add(log)
+    return rollup.by_date()
+
+
+def write_daily_rollups(
+    rollup: DailyRollup | Iterable[dict[str, Any]],
+    output_dir: str | Path,
+) -> list[Path]:
+    """rollup-YYYY-MM-DD.json を日付ごとに書き出す（一時ファイル + rename）"""
+    directory = Path(output_dir)
+    directory.mkdir(parents=True, exist_ok=True)
+    if isinstance(rollup, DailyRollup):
+        rollups = rollup.by_date()
+    else:
+        rollups = build_daily_rollups(rollup)
+    written = []
+    for date, rows in rollups.items():
+        path = directory / f"rollup-{date}.json"
+        fd, tmp_name = tempfile.mkstemp(prefix=".rollup-", dir=directory)
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(
+                    {"date": date, "groups": rows}, f, ensure_ascii=False
+                )
+            os.replace(tmp_name, path)
+        except BaseException:
+            Path(tmp_name).unlink(missing_ok=True)
+            raise
+        written.append(path)
+    return written
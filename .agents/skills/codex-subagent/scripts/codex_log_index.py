@@ -0,0 +1,610 @@
+"""
+codex_log_index.py - codex_exec 実行ログの SQLite インデックス
+
+run-*.jsonl を 1 行 1 レコードとして索引化し、codex_query の検索・集計を
+JSONL の全走査なしで行えるようにする。インデックスはスコープ（human/auto）
+の親ディレクトリに 1 つ置き、パスはそこからの相対パスで保持する。
+write_log が追記のたびに更新し、codex_query --reindex で作り直せる。
+
+人間フィードバックはログ本体を書き換えず、feedback/<run_id>/ 以下に 1 件
+1 ファイルの追記専用サイドカーとして一時ファイル + rename で保存する。
+インデックスは runs_view でフィードバックを結合し、読み出し時に
+evaluation.human として重ねる。
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import re
+import sqlite3
+import sys
+import tempfile
+import uuid
+from collections.abc import Iterator
+from datetime import UTC, datetime
+from pathlib import Path
+from typing import Any
+
+import codex_log_export
+
+INDEX_FILENAME = "index.sqlite3"
+INDEX_SCHEMA_VERSION = 3
+FEEDBACK_DIRNAME = "feedback"
+LOG_SCOPES = {"human", "auto"}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    path TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS runs (
+    path TEXT NOT NULL,
+    line_no INTEGER NOT NULL,
+    run_id TEXT,
+    timestamp TEXT,
+    ts_epoch REAL,
+    mode TEXT,
+    model TEXT,
+    task_type TEXT,
+    score REAL NOT NULL,
+    timed_out INTEGER NOT NULL,
+    has_human INTEGER NOT NULL,
+    has_llm INTEGER NOT NULL,
+    human_score REAL,
+    llm_score REAL,
+    payload TEXT NOT NULL,
+    PRIMARY KEY (path, line_no)
+);
+CREATE INDEX IF NOT EXISTS runs_ts ON runs (ts_epoch);
+CREATE INDEX IF NOT EXISTS runs_mode ON runs (mode);
+CREATE INDEX IF NOT EXISTS runs_model ON runs (model);
+CREATE INDEX IF NOT EXISTS runs_task_type ON runs (task_type);
+CREATE INDEX IF NOT EXISTS runs_run_id ON runs (run_id);
+CREATE TABLE IF NOT EXISTS latest (
+    scope TEXT PRIMARY KEY,
+    path TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS feedback (
+    path TEXT PRIMARY KEY,
+    run_id TEXT NOT NULL,
+    score REAL,
+    payload TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS feedback_run ON feedback (run_id);
+CREATE VIEW IF NOT EXISTS runs_view AS
+SELECT
+    runs.path, runs.line_no, runs.run_id, runs.timestamp, runs.ts_epoch,
+    runs.mode, runs.model, runs.task_type, runs.score, runs.timed_out,
+    CASE WHEN fb.run_id IS NULL THEN runs.has_human ELSE 1 END AS has_human,
+    runs.has_llm,
+    CASE WHEN fb.run_id IS NULL THEN runs.human_score ELSE fb.score END
+        AS human_score,
+    runs.llm_score, runs.payload, fb.payload AS feedback
+FROM runs
+LEFT JOIN (
+    -- サイドカーのファイル名は時刻順なので MAX(path) が最新の 1 件
+    SELECT run_id, score, payload, MAX(path) FROM feedback GROUP BY run_id
+) AS fb ON fb.run_id = runs.run_id;
+"""
+
+
+def resolve_index_root(log_dir: str | Path) -> Path:
+    """スコープ付きディレクトリならその親をインデックスの置き場所とする"""
+    path = Path(log_dir)
+    if path.name in LOG_SCOPES:
+        return path.parent
+    return path
+
+
+def scope_prefix(log_dir: str | Path) -> str:
+    path = Path(log_dir)
+    return f"{path.name}/" if path.name in LOG_SCOPES else ""
+
+
+def open_index(root: str | Path) -> sqlite3.Connection:
+    root_path = Path(root)
+    root_path.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(root_path / INDEX_FILENAME, timeout=10)
+    conn.execute("PRAGMA journal_mode=WAL")
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+    if version != INDEX_SCHEMA_VERSION:
+        conn.executescript(
+            "DROP VIEW IF EXISTS runs_view; DROP TABLE IF EXISTS runs;"
+            " DROP TABLE IF EXISTS files; DROP TABLE IF EXISTS latest;"
+            " DROP TABLE IF EXISTS feedback;"
+        )
+        conn.execute(f"PRAGMA user_version={INDEX_SCHEMA_VERSION}")
+    conn.executescript(_SCHEMA)
+    return conn
+
+
+def _parse_epoch(timestamp: str) -> float | None:
+    # codex_query の日付比較と同じく tz を落とした naive 時刻で比較する
+    try:
+        ts = datetime.fromisoformat(timestamp.replace("Z", "+00:00"))
+    except (AttributeError, ValueError):
+        return None
+    return (ts.replace(tzinfo=None) - datetime(1970, 1, 1)).total_seconds()
+
+
+def _score_or_none(value: Any) -> float | None:
+    if not value or not isinstance(value, int | float):
+        return None
+    return float(value)
+
+
+def extract_index_fields(log: dict[str, Any]) -> dict[str, Any]:
+    exec_data = log.get("execution", {}) or {}
+    eval_data = log.get("evaluation", {}) or {}
+    heuristic = eval_data.get("heuristic") or {}
+    human = eval_data.get("human") or {}
+    llm = eval_data.get("llm") or {}
+    results = log.get("results", []) or []
+    timestamp = log.get("timestamp", "")
+    return {
+        "run_id": log.get("run_id", ""),
+        "timestamp": timestamp,
+        "ts_epoch": _parse_epoch(timestamp),
+        "mode": exec_data.get("mode"),
+        "model": exec_data.get("model"),
+        "task_type": exec_data.get("task_type"),
+        "score": heuristic.get(
+            "combined_score", heuristic.get("average_score", 0)
+        )
+        or 0,
+        "timed_out": int(any(r.get("timed_out") for r in results)),
+        "has_human": int(bool(eval_data.get("human"))),
+        "has_llm": int(bool(eval_data.get("llm"))),
+        "human_score": _score_or_none(human.get("score")),
+        "llm_score": _score_or_none(llm.get("correctness")),
+    }
+
+
+def _relative_key(root: Path, path: Path) -> str:
+    return path.relative_to(root).as_posix()
+
+
+def index_log_file(
+    conn: sqlite3.Connection,
+    root: str | Path,
+    path: str | Path,
+) -> int:
+    """1 ファイル分のレコードを入れ替え、索引化した行数を返す"""
+    root_path = Path(root)
+    log_path = Path(path)
+    key = _relative_key(root_path, log_path)
+    st = log_path.stat()
+    rows = []
+    with open(log_path, encoding="utf-8") as f:
+        for line_no, line in enumerate(f):
+            try:
+                log = json.loads(line)
+            except ValueError:
+                continue
+            if not isinstance(log, dict):
+                continue
+            fields = extract_index_fields(log)
+            rows.append(
+                (
+                    key,
+                    line_no,
+                    fields["run_id"],
+                    fields["timestamp"],
+                    fields["ts_epoch"],
+                    fields["mode"],
+                    fields["model"],
+                    fields["task_type"],
+                    fields["score"],
+                    fields["timed_out"],
+                    fields["has_human"],
+                    fields["has_llm"],
+                    fields["human_score"],
+                    fields["llm_score"],
+                    line,
+                )
+            )
+    with conn:
+        conn.execute("DELETE FROM runs WHERE path = ?", (key,))
+        conn.executemany(
+            "INSERT INTO runs VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            rows,
+        )
+        conn.execute(
+            "INSERT OR REPLACE INTO files VALUES (?, ?, ?)",
+            (key, st.st_size, st.st_mtime_ns),
+        )
+    return len(rows)
+
+
+def sync_index(conn: sqlite3.Connection, root: str | Path) -> dict[str, int]:
+    """サイズ/mtime が変わった JSONL だけを読み直して索引を最新化する"""
+    root_path = Path(root)
+    known = {
+        path: (size, mtime_ns)
+        for path, size, mtime_ns in conn.execute(
+            "SELECT path, size, mtime_ns FROM files"
+        )
+    }
+    stats = {
+        "indexed_files": 0,
+        "removed_files": 0,
+        "indexed_rows": 0,
+        "indexed_feedback": 0,
+    }
+    seen: set[str] = set()
+    if root_path.exists():
+        for log_path in root_path.rglob("run-*.jsonl"):
+            key = _relative_key(root_path, log_path)
+            seen.add(key)
+            try:
+                st = log_path.stat()
+            except OSError:
+                continue
+            if known.get(key) == (st.st_size, st.st_mtime_ns):
+                continue
+            try:
+                stats["indexed_rows"] += index_log_file(
+                    conn, root_path, log_path
+                )
+            except (OSError, UnicodeDecodeError):
+                continue
+            stats["indexed_files"] += 1
+        # サイドカーは書き換えないので未知のファイルだけ取り込めばよい
+        for feedback_path in iter_feedback_files(root_path):
+            key = _relative_key(root_path, feedback_path)
+            seen.add(key)
+            if key in known:
+                continue
+            try:
+                index_feedback_file(conn, root_path, feedback_path)
+            except (OSError, ValueError):
+                continue
+            stats["indexed_feedback"] += 1
+    removed = [key for key in known if key not in seen]
+    if removed:
+        with conn:
+            for key in removed:
+                conn.execute("DELETE FROM runs WHERE path = ?", (key,))
+                conn.execute("DELETE FROM feedback WHERE path = ?", (key,))
+                conn.execute("DELETE FROM files WHERE path = ?", (key,))
+        stats["removed_files"] = len(removed)
+    return stats
+
+
+def rebuild_index(root: str | Path) -> dict[str, int]:
+    conn = open_index(root)
+    try:
+        with conn:
+            conn.execute("DELETE FROM runs")
+            conn.execute("DELETE FROM feedback")
+            conn.execute("DELETE FROM files")
+        return sync_index(conn, root)
+    finally:
+        conn.close()
+
+
+def record_log_file(log_dir: str | Path, log_path: str | Path) -> None:
+    """write_log から呼ばれ、追記したファイルを索引化して latest を更新する"""
+    root = resolve_index_root(log_dir)
+    try:
+        conn = open_index(root)
+        try:
+            index_log_file(conn, root, log_path)
+            key = _relative_key(root, Path(log_path))
+            scopes = {"", scope_prefix(Path(root) / key.split("/", 1)[0])}
+            with conn:
+                conn.executemany(
+                    "INSERT OR REPLACE INTO latest VALUES (?, ?)",
+                    [(scope, key) for scope in scopes],
+                )
+        finally:
+            conn.close()
+    except (OSError, sqlite3.Error, ValueError) as e:
+        print(f"Warning: Failed to update log index: {e}", file=sys.stderr)
+
+
+def lookup_latest(root: str | Path, prefix: str = "") -> Path | None:
+    """write_log が最後に書いたログファイル（スコープ別）を返す"""
+    conn = open_index(root)
+    try:
+        row = conn.execute(
+            "SELECT path FROM latest WHERE scope = ?", (prefix,)
+        ).fetchone()
+    finally:
+        conn.close()
+    return Path(root) / row[0] if row else None
+
+
+def lookup_run(
+    conn: sqlite3.Connection,
+    root: str | Path,
+    run_id: str,
+    prefix: str = "",
+) -> Path | None:
+    """run_id（前方一致）を含むログファイルを返す"""
+    if not run_id:
+        return None
+    clauses = ["run_id >= ?", "run_id < ?"]
+    params: list[Any] = [run_id, run_id + "\U0010ffff"]
+    if prefix:
+        clauses.append("substr(path, 1, ?) = ?")
+        params.extend([len(prefix), prefix])
+    row = conn.execute(
+        f"SELECT path FROM runs WHERE {' AND '.join(clauses)} "
+        "ORDER BY ts_epoch DESC LIMIT 1",
+        params,
+    ).fetchone()
+    return Path(root) / row[0] if row else None
+
+
+def feedback_dir(root: str | Path, run_id: str) -> Path:
+    safe = re.sub(r"[^A-Za-z0-9._-]", "_", run_id) or "_"
+    return Path(root) / FEEDBACK_DIRNAME / safe
+
+
+def iter_feedback_files(root: str | Path) -> Iterator[Path]:
+    # 書き込み途中の一時ファイル（.fb-*.tmp）は対象外
+    base = Path(root) / FEEDBACK_DIRNAME
+    if base.exists():
+        yield from base.glob("*/*.json")
+
+
+def read_feedback_file(path: str | Path) -> dict[str, Any]:
+    with open(path, encoding="utf-8") as f:
+        record = json.load(f)
+    if not isinstance(record, dict) or not record.get("run_id"):
+        raise ValueError(f"invalid feedback record: {path}")
+    return record
+
+
+def index_feedback_file(
+    conn: sqlite3.Connection,
+    root: str | Path,
+    path: str | Path,
+) -> None:
+    root_path = Path(root)
+    feedback_path = Path(path)
+    key = _relative_key(root_path, feedback_path)
+    st = feedback_path.stat()
+    record = read_feedback_file(feedback_path)
+    human = record.get("human") or {}
+    with conn:
+        conn.execute(
+            "INSERT OR REPLACE INTO feedback VALUES (?, ?, ?, ?)",
+            (
+                key,
+                record["run_id"],
+                _score_or_none(human.get("score")),
+                json.dumps(record, ensure_ascii=False),
+            ),
+        )
+        conn.execute(
+            "INSERT OR REPLACE INTO files VALUES (?, ?, ?)",
+            (key, st.st_size, st.st_mtime_ns),
+        )
+
+
+def write_feedback(
+    root: str | Path,
+    run_id: str,
+    human: dict[str, Any],
+    log_path: str | Path | None = None,
+) -> Path:
+    """フィードバックを追記専用サイドカーとして書き、インデックスに登録する
+
+    1 件ごとに一時ファイルへ書いて fsync した後 rename するため、
+    ログ本体の大きさや並行する書き込みに関係なく O(1) で壊れない。
+    """
+    root_path = Path(root)
+    record: dict[str, Any] = {"run_id": run_id, "human": human}
+    if log_path is not None:
+        try:
+            record["log"] = _relative_key(root_path, Path(log_path))
+        except ValueError:
+            record["log"] = str(log_path)
+
+    directory = feedback_dir(root_path, run_id)
+    directory.mkdir(parents=True, exist_ok=True)
+    stamp = datetime.now(UTC).strftime("%Y%m%dT%H%M%S%fZ")
+    path = directory / f"{stamp}-{uuid.uuid4().hex[:8]}.json"
+    fd, tmp_name = tempfile.mkstemp(
+        prefix=".fb-", suffix=".tmp", dir=directory
+    )
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(record, f, ensure_ascii=False)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_name, path)
+    except BaseException:
+        Path(tmp_name).unlink(missing_ok=True)
+        raise
+    try:
+        dir_fd = os.open(directory, os.O_RDONLY)
+    except OSError:
+        dir_fd = None
+    if dir_fd is not None:
+        try:
+            os.fsync(dir_fd)
+        except OSError:
+            pass
+        finally:
+            os.close(dir_fd)
+
+    try:
+        conn = open_index(root_path)
+        try:
+            index_feedback_file(conn, root_path, path)
+        finally:
+            conn.close()
+    except (OSError, sqlite3.Error, ValueError) as e:
+        print(f"Warning: Failed to update log index: {e}", file=sys.stderr)
+    return path
+
+
+def read_latest_feedback(
+    root: str | Path, run_id: str
+) -> dict[str, Any] | None:
+    """1 run 分のサイドカーから最新のフィードバックを返す"""
+    directory = feedback_dir(root, run_id)
+    if not directory.exists():
+        return None
+    for path in sorted(directory.glob("*.json"), reverse=True):
+        try:
+            record = read_feedback_file(path)
+        except (OSError, ValueError):
+            continue
+        if record["run_id"] == run_id:
+            return record.get("human") or {}
+    return None
+
+
+def load_feedback(root: str | Path) -> dict[str, dict[str, Any]]:
+    """run_id ごとに最新のフィードバック（evaluation.human 相当）を返す"""
+    latest: dict[str, tuple[str, dict[str, Any]]] = {}
+    for path in iter_feedback_files(root):
+        try:
+            record = read_feedback_file(path)
+        except (OSError, ValueError):
+            continue
+        run_id = record["run_id"]
+        if run_id not in latest or latest[run_id][0] < path.name:
+            latest[run_id] = (path.name, record.get("human") or {})
+    return {run_id: human for run_id, (_, human) in latest.items()}
+
+
+def apply_feedback(
+    log: dict[str, Any], human: dict[str, Any] | None
+) -> dict[str, Any]:
+    """サイドカーのフィードバックを evaluation.human として重ねる"""
+    if human:
+        evaluation = dict(log.get("evaluation") or {})
+        evaluation["human"] = human
+        log["evaluation"] = evaluation
+    return log
+
+
+def _build_where(
+    prefix: str = "",
+    from_date: datetime | None = None,
+    to_date: datetime | None = None,
+    task_type: str | None = None,
+    mode: str | None = None,
+    model: str | None = None,
+    min_score: float | None = None,
+    max_score: float | None = None,
+    has_human_feedback: bool | None = None,
+    has_llm_eval: bool | None = None,
+    timed_out: bool | None = None,
+) -> tuple[str, list[Any]]:
+    clauses: list[str] = []
+    params: list[Any] = []
+    if prefix:
+        clauses.append("substr(path, 1, ?) = ?")
+        params.extend([len(prefix), prefix])
+    if from_date is not None:
+        clauses.append("ts_epoch >= ?")
+        params.append((from_date - datetime(1970, 1, 1)).total_seconds())
+    if to_date is not None:
+        clauses.append("ts_epoch <= ?")
+        params.append((to_date - datetime(1970, 1, 1)).total_seconds())
+    for column, value in (
+        ("task_type", task_type),
+        ("mode", mode),
+        ("model", model),
+    ):
+        if value:
+            clauses.append(f"{column} = ?")
+            params.append(value)
+    if min_score is not None:
+        clauses.append("score >= ?")
+        params.append(min_score)
+    if max_score is not None:
+        clauses.append("score <= ?")
+        params.append(max_score)
+    for column, value in (
+        ("has_human", has_human_feedback),
+        ("has_llm", has_llm_eval),
+        ("timed_out", timed_out),
+    ):
+        if value is not None:
+            clauses.append(f"{column} = ?")
+            params.append(int(value))
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+    return where, params
+
+
+def query_logs(
+    conn: sqlite3.Connection, limit: int | None = None, **filters: Any
+) -> Iterator[dict[str, Any]]:
+    """フィルタに一致するログを iter_logs と同じ順序（timestamp の新しい順）で返す
+
+    limit を渡すと SQL 側で件数を絞り、表示しない行の payload は decode しない。
+    """
+    where, params = _build_where(**filters)
+    sql = (
+        f"SELECT payload, feedback FROM runs_view {where} "
+        "ORDER BY ts_epoch DESC, path DESC, line_no DESC"
+    )
+    if limit is not None:
+        sql += " LIMIT ?"
+        params = [*params, max(0, limit)]
+    cursor = conn.execute(sql, params)
+    for payload, feedback in cursor:
+        log = json.loads(payload)
+        if feedback:
+            apply_feedback(log, json.loads(feedback).get("human"))
+        yield log
+
+
+def count_logs(conn: sqlite3.Connection, **filters: Any) -> int:
+    """フィルタに一致するログの件数"""
+    where, params = _build_where(**filters)
+    (count,) = conn.execute(
+        f"SELECT COUNT(*) FROM runs_view {where}", params
+    ).fetchone()
+    return count
+
+
+def query_stats(conn: sqlite3.Connection, **filters: Any) -> dict[str, Any]:
+    """codex_query.summarize_logs と同じ形の集計を SQL で求める"""
+    where, params = _build_where(**filters)
+
+    def aggregate(column: str) -> dict[str, float] | None:
+        extra = f"{column} IS NOT NULL AND {column} != 0"
+        clause = f"{where} AND {extra}" if where else f"WHERE {extra}"
+        count, avg, low, high = conn.execute(
+            f"SELECT COUNT(*), AVG({column}), MIN({column}), MAX({column}) "
+            f"FROM runs_view {clause}",
+            params,
+        ).fetchone()
+        if not count:
+            return None
+        return {"count": count, "avg": avg, "min": low, "max": high}
+
+    def group(expression: str) -> dict[str, int]:
+        rows = conn.execute(
+            f"SELECT {expression} AS key, COUNT(*) AS n FROM runs_view {where} "
+            "GROUP BY key ORDER BY n DESC, MIN(path) DESC",
+            params,
+        )
+        return {key: count for key, count in rows}
+
+    total = conn.execute(
+        f"SELECT COUNT(*) FROM runs_view {where}", params
+    ).fetchone()[0]
+    return {
+        "total": total,
+        "scores": aggregate("score"),
+        "human": aggregate("human_score"),
+        "llm": aggregate("llm_score"),
+        "by_mode": group("COALESCE(mode, 'unknown')"),
+        "by_model": group("COALESCE(NULLIF(model, ''), 'unknown')"),
+        "by_task_type": group("COALESCE(task_type, 'unknown')"),
+        # 分位は SQL で出せないので payload を 1 パスでスケッチに流す
+        "performance": codex_log_export.summarize_performance(
+            query_logs(conn, **filters)
+        ),
+    }
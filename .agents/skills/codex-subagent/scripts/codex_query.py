@@ -18,22 +18,38 @@ codex_query.py - ログ検索・分析CLI
     # CSV エクスポート
     python codex_query.py --export csv > analysis.csv
 
+    # Parquet（runs/results/stages）と日次ロールアップを書き出す
+    python codex_query.py --export parquet --output exports/ \
+        --rollup exports/rollups/
+
     # 統計サマリー
     python codex_query.py --stats
+
+    # SQLite インデックスを JSONL から作り直す
+    python codex_query.py --reindex
 """
 
 from __future__ import annotations
 
 import argparse
+import concurrent.futures
 import csv
+import heapq
+import itertools
 import json
 import os
+import re
+import sqlite3
 import sys
+from collections import deque
 from collections.abc import Iterator
-from datetime import datetime
+from datetime import datetime, timedelta
 from pathlib import Path
 from typing import Any
 
+import codex_log_export
+import codex_log_index
+
 ROOT_DIR = Path(__file__).resolve().parents[4]
 LOG_ROOT_DIR = ROOT_DIR / ".codex" / "sessions" / "codex_exec"
 
@@ -66,43 +82,234 @@ def resolve_log_dir(
 LOG_DIR = resolve_log_dir()
 
 
+# 並列パースに切り替えるファイル数の下限
+PARALLEL_PARSE_MIN_FILES = 32
+# 並列パースで同時に投入するファイル数（親プロセスが保持するログ量の上限）
+PARALLEL_PARSE_BATCH_FILES = 64
+# write_log のファイル名時刻はログの timestamp より後になるため、
+# 上限側の枝刈りにはこの猶予を持たせる
+FILENAME_TIME_SLACK = timedelta(hours=1)
+LOG_FILENAME_PATTERN = re.compile(r"run-(\d{8}T\d{6})-.*\.jsonl")
+EPOCH = datetime(1970, 1, 1)
+
+
+def _parse_log_time(ts_str: Any) -> datetime | None:
+    try:
+        ts = datetime.fromisoformat(ts_str.replace("Z", "+00:00"))
+    except (AttributeError, ValueError):
+        return None
+    return ts.replace(tzinfo=None)  # naive datetime に変換
+
+
+def _log_sort_key(log: dict[str, Any]) -> float:
+    ts = _parse_log_time(log.get("timestamp", ""))
+    if ts is None:
+        return float("-inf")
+    return (ts - EPOCH).total_seconds()
+
+
+def _date_partition_in_range(
+    parts: tuple[int, ...],
+    from_date: datetime | None,
+    to_date: datetime | None,
+) -> bool:
+    """YYYY / YYYY/MM / YYYY/MM/DD ディレクトリが日付範囲と重なるか"""
+    try:
+        if len(parts) == 1:
+            start = datetime(parts[0], 1, 1)
+            end = datetime(parts[0] + 1, 1, 1)
+        elif len(parts) == 2:
+            start = datetime(parts[0], parts[1], 1)
+            end = (start + timedelta(days=32)).replace(day=1)
+        else:
+            start = datetime(*parts[:3])
+            end = start + timedelta(days=1)
+    except ValueError:
+        return True
+    if from_date and end <= from_date:
+        return False
+    if to_date and start > to_date + FILENAME_TIME_SLACK:
+        return False
+    return True
+
+
+def _log_file_in_range(
+    name: str,
+    from_date: datetime | None,
+    to_date: datetime | None,
+) -> bool:
+    match = LOG_FILENAME_PATTERN.fullmatch(name)
+    if not match:
+        return name.startswith("run-") and name.endswith(".jsonl")
+    try:
+        written_at = datetime.strptime(match.group(1), "%Y%m%dT%H%M%S")
+    except ValueError:
+        return True
+    # 秒未満を切り捨てた書き込み時刻なので下限側は 1 秒の幅を持たせる
+    if from_date and written_at + timedelta(seconds=1) < from_date:
+        return False
+    if to_date and written_at > to_date + FILENAME_TIME_SLACK:
+        return False
+    return True
+
+
+def _log_file_written_at(path: Path) -> float:
+    """ファイル名の書き込み時刻（秒、切り上げ）。読めなければ +inf"""
+    match = LOG_FILENAME_PATTERN.fullmatch(path.name)
+    if not match:
+        return float("inf")
+    try:
+        written_at = datetime.strptime(match.group(1), "%Y%m%dT%H%M%S")
+    except ValueError:
+        return float("inf")
+    return (written_at - EPOCH).total_seconds() + 1
+
+
+def iter_log_files(
+    from_date: datetime | None = None,
+    to_date: datetime | None = None,
+) -> list[Path]:
+    """YYYY/MM/DD ディレクトリとファイル名の時刻で枝刈りしてログを列挙"""
+    found: list[Path] = []
+
+    def walk(directory: Path, parts: tuple[int, ...]) -> None:
+        try:
+            entries = list(os.scandir(directory))
+        except OSError:
+            return
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                width = 4 if not parts else 2
+                if (
+                    len(parts) < 3
+                    and len(entry.name) == width
+                    and entry.name.isdigit()
+                ):
+                    child = parts + (int(entry.name),)
+                    if _date_partition_in_range(child, from_date, to_date):
+                        walk(Path(entry.path), child)
+                else:
+                    walk(Path(entry.path), parts)
+            elif _log_file_in_range(entry.name, from_date, to_date):
+                found.append(Path(entry.path))
+
+    if LOG_DIR.exists():
+        walk(LOG_DIR, ())
+    return sorted(found, reverse=True)
+
+
+def load_log_file(
+    log_file: str | Path,
+    from_date: datetime | None = None,
+    to_date: datetime | None = None,
+) -> list[dict[str, Any]]:
+    """1 ファイルを読み、日付フィルタ後のログを新しい順で返す"""
+    logs = []
+    try:
+        with open(log_file, encoding="utf-8") as f:
+            for line in f:
+                log = json.loads(line)
+
+                # 日付フィルタ
+                if from_date or to_date:
+                    ts = _parse_log_time(log.get("timestamp", ""))
+                    if ts is None:
+                        continue
+                    if from_date and ts < from_date:
+                        continue
+                    if to_date and ts > to_date:
+                        continue
+
+                logs.append(log)
+    except Exception:
+        pass
+    logs.reverse()
+    logs.sort(key=_log_sort_key, reverse=True)
+    return logs
+
+
 def iter_logs(
     from_date: datetime | None = None,
     to_date: datetime | None = None,
 ) -> Iterator[dict[str, Any]]:
-    """ログを順次読み込み"""
-    if not LOG_DIR.exists():
+    """ログを timestamp の新しい順に順次読み込み
+
+    日付範囲外のディレクトリ/ファイルは開かずに除外し、残りのファイルが
+    多い場合はプロセスプールで並列にパースして k-way merge する。
+    フィードバックのサイドカーは run_id で結合して evaluation.human に重ねる。
+    """
+    log_files = iter_log_files(from_date, to_date)
+    if not log_files:
         return
 
-    log_files = sorted(LOG_DIR.rglob("run-*.jsonl"), reverse=True)
+    feedback = codex_log_index.load_feedback(
+        codex_log_index.resolve_index_root(LOG_DIR)
+    )
+    for log in _merge_log_files(log_files, from_date, to_date):
+        yield codex_log_index.apply_feedback(
+            log, feedback.get(log.get("run_id", ""))
+        )
 
-    for log_file in log_files:
-        try:
-            with open(log_file, encoding="utf-8") as f:
-                for line in f:
-                    log = json.loads(line)
-
-                    # 日付フィルタ
-                    if from_date or to_date:
-                        ts_str = log.get("timestamp", "")
-                        try:
-                            ts = datetime.fromisoformat(
-                                ts_str.replace("Z", "+00:00")
-                            )
-                            ts = ts.replace(
-                                tzinfo=None
-                            )  # naive datetime に変換
-                            if from_date and ts < from_date:
-                                continue
-                            if to_date and ts > to_date:
-                                continue
-                        except Exception:
-                            continue
-
-                    yield log
-
-        except Exception:
-            continue
+
+def _merge_log_files(
+    log_files: list[Path],
+    from_date: datetime | None,
+    to_date: datetime | None,
+) -> Iterator[dict[str, Any]]:
+    if len(log_files) < PARALLEL_PARSE_MIN_FILES:
+        streams = [
+            iter(load_log_file(log_file, from_date, to_date))
+            for log_file in log_files
+        ]
+        yield from heapq.merge(*streams, key=_log_sort_key, reverse=True)
+        return
+
+    # ログの timestamp はファイル名の書き込み時刻以前なので、書き込み時刻の
+    # 新しい順にバッチで読めば、未読ファイルの先頭の時刻より新しいログは
+    # 確定として返せる。投入中のバッチは 2 つまでに抑える
+    ordered = sorted(log_files, key=_log_file_written_at, reverse=True)
+    batches = deque(
+        ordered[index : index + PARALLEL_PARSE_BATCH_FILES]
+        for index in range(0, len(ordered), PARALLEL_PARSE_BATCH_FILES)
+    )
+    buffered: list[tuple[float, int, dict[str, Any]]] = []
+    sequence = itertools.count()
+    with concurrent.futures.ProcessPoolExecutor() as executor:
+        in_flight: deque[tuple[float, list[concurrent.futures.Future]]] = (
+            deque()
+        )
+
+        def submit_next() -> None:
+            if not batches:
+                return
+            batch = batches.popleft()
+            in_flight.append(
+                (
+                    _log_file_written_at(batch[0]),
+                    [
+                        executor.submit(
+                            load_log_file, str(log_file), from_date, to_date
+                        )
+                        for log_file in batch
+                    ],
+                )
+            )
+
+        submit_next()
+        submit_next()
+        while in_flight:
+            _, futures = in_flight.popleft()
+            for future in futures:
+                for log in future.result():
+                    heapq.heappush(
+                        buffered, (-_log_sort_key(log), next(sequence), log)
+                    )
+            submit_next()
+            unread_bound = in_flight[0][0] if in_flight else float("-inf")
+            while buffered and -buffered[0][0] > unread_bound:
+                yield heapq.heappop(buffered)[2]
+    while buffered:
+        yield heapq.heappop(buffered)[2]
 
 
 def filter_logs(
@@ -202,8 +409,10 @@ def format_log_row(log: dict[str, Any]) -> dict[str, Any]:
     }
 
 
-def print_table(logs: list[dict[str, Any]], limit: int = 10) -> None:
-    """ログをテーブル形式で出力"""
+def print_table(
+    logs: list[dict[str, Any]], limit: int = 10, total: int | None = None
+) -> None:
+    """ログをテーブル形式で出力（total は logs が先頭だけのときの全件数）"""
     if not logs:
         print("No logs found.")
         return
@@ -237,7 +446,8 @@ def print_table(logs: list[dict[str, Any]], limit: int = 10) -> None:
             f"{llm_score:<6}"
         )
 
-    total = len(logs)
+    if total is None:
+        total = len(logs)
     if total > limit:
         print(f"\n... and {total - limit} more (use --limit to show more)")
 
@@ -275,21 +485,18 @@ def export_json(logs: list[dict[str, Any]], output=sys.stdout) -> None:
     json.dump(logs, output, ensure_ascii=False, indent=2)
 
 
-def print_stats(logs: list[dict[str, Any]]) -> None:
-    """統計サマリーを出力"""
-    if not logs:
-        print("No logs found.")
-        return
-
-    total = len(logs)
+def summarize_logs(logs: list[dict[str, Any]]) -> dict[str, Any]:
+    """統計サマリー用の集計（codex_log_index.query_stats と同じ形）"""
     scores = []
     human_scores = []
     llm_scores = []
-    modes = {}
-    models = {}
-    task_types = {}
+    modes: dict[str, int] = {}
+    models: dict[str, int] = {}
+    task_types: dict[str, int] = {}
+    performance = codex_log_export.PerformanceStats()
 
     for log in logs:
+        performance.add(log)
         exec_data = log.get("execution", {})
         eval_data = log.get("evaluation", {})
         heuristic = eval_data.get("heuristic") or {}
@@ -317,41 +524,168 @@ def print_stats(logs: list[dict[str, Any]]) -> None:
         task_type = exec_data.get("task_type", "unknown")
         task_types[task_type] = task_types.get(task_type, 0) + 1
 
+    def aggregate(values: list[float]) -> dict[str, float] | None:
+        if not values:
+            return None
+        return {
+            "count": len(values),
+            "avg": sum(values) / len(values),
+            "min": min(values),
+            "max": max(values),
+        }
+
+    return {
+        "total": len(logs),
+        "scores": aggregate(scores),
+        "human": aggregate(human_scores),
+        "llm": aggregate(llm_scores),
+        "by_mode": modes,
+        "by_model": models,
+        "by_task_type": task_types,
+        "performance": performance.summary(),
+    }
+
+
+def render_stats(summary: dict[str, Any]) -> None:
+    """集計済みの統計サマリーを出力"""
+    if not summary["total"]:
+        print("No logs found.")
+        return
+
     print("=" * 50)
     print("CODEX EXEC LOG STATISTICS")
     print("=" * 50)
-    print(f"\nTotal Runs: {total}")
+    print(f"\nTotal Runs: {summary['total']}")
 
+    scores = summary["scores"]
     if scores:
         print("\nHeuristic Scores:")
-        print(f"  Average: {sum(scores) / len(scores):.2f}")
-        print(f"  Min: {min(scores):.2f}")
-        print(f"  Max: {max(scores):.2f}")
-
-    if human_scores:
-        print(f"\nHuman Feedback ({len(human_scores)} entries):")
-        print(f"  Average: {sum(human_scores) / len(human_scores):.2f}")
+        print(f"  Average: {scores['avg']:.2f}")
+        print(f"  Min: {scores['min']:.2f}")
+        print(f"  Max: {scores['max']:.2f}")
+
+    human = summary["human"]
+    if human:
+        print(f"\nHuman Feedback ({human['count']} entries):")
+        print(f"  Average: {human['avg']:.2f}")
     else:
         print("\nHuman Feedback: None")
 
-    if llm_scores:
-        print(f"\nLLM Evaluations ({len(llm_scores)} entries):")
-        print(f"  Average: {sum(llm_scores) / len(llm_scores):.2f}")
+    llm = summary["llm"]
+    if llm:
+        print(f"\nLLM Evaluations ({llm['count']} entries):")
+        print(f"  Average: {llm['avg']:.2f}")
     else:
         print("\nLLM Evaluations: None")
 
     print("\nBy Mode:")
-    for mode, count in sorted(modes.items(), key=lambda x: -x[1]):
+    for mode, count in sorted(summary["by_mode"].items(), key=lambda x: -x[1]):
         print(f"  {mode}: {count}")
 
     print("\nBy Model:")
-    for model, count in sorted(models.items(), key=lambda x: -x[1]):
+    for model, count in sorted(
+        summary["by_model"].items(), key=lambda x: -x[1]
+    ):
         print(f"  {model}: {count}")
 
     print("\nBy Task Type:")
-    for task_type, count in sorted(task_types.items(), key=lambda x: -x[1]):
+    for task_type, count in sorted(
+        summary["by_task_type"].items(), key=lambda x: -x[1]
+    ):
         print(f"  {task_type}: {count}")
 
+    render_performance(summary.get("performance") or {})
+
+
+def _format_percentiles(row: dict[str, Any], metric: str, fmt: str) -> str:
+    values = [row.get(f"{metric}_p{q}") for q in (50, 90, 99)]
+    return "/".join("-" if v is None else format(v, fmt) for v in values)
+
+
+def render_performance(performance: dict[str, dict[str, Any]]) -> None:
+    """実行単位の p50/p90/p99 を次元別に出力"""
+    titles = {
+        "model": "Model",
+        "profile": "Profile",
+        "mode": "Mode",
+        "stage_role": "Stage Role",
+    }
+    for dimension, title in titles.items():
+        groups = performance.get(dimension)
+        if not groups:
+            continue
+        print(f"\nPerformance by {title} (p50/p90/p99):")
+        for name, row in groups.items():
+            print(
+                f"  {name}: n={row['count']} "
+                f"timeout={row['timeout_rate']:.1%} "
+                f"time_s={_format_percentiles(row, 'execution_time', '.1f')} "
+                f"output_chars={_format_percentiles(row, 'output_chars', '.0f')} "
+                f"tokens={_format_percentiles(row, 'tokens_used', '.0f')}"
+            )
+
+
+def print_stats(logs: list[dict[str, Any]]) -> None:
+    """統計サマリーを出力"""
+    render_stats(summarize_logs(logs))
+
+
+def open_synced_index() -> sqlite3.Connection:
+    """LOG_DIR のインデックスを開き、未反映の JSONL を取り込む"""
+    root = codex_log_index.resolve_index_root(LOG_DIR)
+    conn = codex_log_index.open_index(root)
+    try:
+        codex_log_index.sync_index(conn, root)
+    except BaseException:
+        conn.close()
+        raise
+    return conn
+
+
+def export_files(
+    logs: Iterator[dict[str, Any]],
+    args: argparse.Namespace,
+    rollup_logs: Iterator[dict[str, Any]] | None = None,
+) -> None:
+    """列指向エクスポート / 日次ロールアップを書き出す
+
+    rollup_logs を渡すとロールアップはそちら（フィルタ前のログ）から作る。
+    省略時は logs と同じ 1 回の走査で集計する。
+    """
+    rollup = codex_log_export.DailyRollup()
+
+    def tee(source: Iterator[dict[str, Any]]) -> Iterator[dict[str, Any]]:
+        for log in source:
+            if args.rollup and rollup_logs is None:
+                rollup.add(log)
+            yield log
+
+    if args.export in codex_log_export.COLUMNAR_FORMATS:
+        try:
+            counts = codex_log_export.export_columnar(
+                tee(logs), args.output, args.export
+            )
+        except RuntimeError as e:
+            print(f"Error: {e}", file=sys.stderr)
+            sys.exit(1)
+        print(
+            ", ".join(f"{table}: {n} rows" for table, n in counts.items())
+            + f" -> {args.output}",
+            file=sys.stderr,
+        )
+    else:
+        for _ in tee(logs):
+            pass
+
+    if args.rollup:
+        for log in rollup_logs or ():
+            rollup.add(log)
+        written = codex_log_export.write_daily_rollups(rollup, args.rollup)
+        print(
+            f"Wrote {len(written)} daily rollups -> {args.rollup}",
+            file=sys.stderr,
+        )
+
 
 def main():
     parser = argparse.ArgumentParser(description="codex exec ログの検索・分析")
@@ -369,8 +703,30 @@ def main():
     )
     parser.add_argument(
         "--export",
-        choices=["csv", "json"],
-        help="エクスポート形式",
+        choices=["csv", "json", *codex_log_export.COLUMNAR_FORMATS],
+        help="エクスポート形式（parquet/arrow は --output が必要）",
+    )
+    parser.add_argument(
+        "--output",
+        type=str,
+        default=None,
+        help="parquet/arrow の出力ディレクトリ（runs/results/stages）",
+    )
+    parser.add_argument(
+        "--rollup",
+        type=str,
+        default=None,
+        help="日次ロールアップ（rollup-YYYY-MM-DD.json）の出力ディレクトリ",
+    )
+    parser.add_argument(
+        "--reindex",
+        action="store_true",
+        help="SQLite インデックスを JSONL から作り直す",
+    )
+    parser.add_argument(
+        "--no-index",
+        action="store_true",
+        help="インデックスを使わず JSONL を直接走査する",
     )
 
     # フィルタ
@@ -449,6 +805,9 @@ def main():
     )
 
     args = parser.parse_args()
+    columnar = args.export in codex_log_export.COLUMNAR_FORMATS
+    if columnar and not args.output:
+        parser.error(f"--export {args.export} requires --output")
 
     env_scope = os.environ.get("CODEX_SUBAGENT_LOG_SCOPE")
     if args.scope is None:
@@ -472,24 +831,84 @@ def main():
     if args.to_date:
         to_date = datetime.strptime(args.to_date, "%Y-%m-%d")
 
-    # ログ取得
-    logs = iter_logs(from_date, to_date)
-
-    # フィルタ適用
-    logs = filter_logs(
-        logs,
-        task_type=args.task_type,
-        mode=args.mode,
-        model=args.model,
-        min_score=args.min_score,
-        max_score=args.max_score,
-        has_human_feedback=args.has_human if args.has_human else None,
-        has_llm_eval=args.has_llm if args.has_llm else None,
-        timed_out=True if args.timed_out else None,
-    )
+    if args.reindex:
+        stats = codex_log_index.rebuild_index(
+            codex_log_index.resolve_index_root(LOG_DIR)
+        )
+        print(
+            f"Reindexed {stats['indexed_rows']} runs "
+            f"from {stats['indexed_files']} files."
+        )
+        return
 
-    # リストに変換
-    logs_list = list(logs)
+    filters: dict[str, Any] = {
+        "task_type": args.task_type,
+        "mode": args.mode,
+        "model": args.model,
+        "min_score": args.min_score,
+        "max_score": args.max_score,
+        "has_human_feedback": args.has_human if args.has_human else None,
+        "has_llm_eval": args.has_llm if args.has_llm else None,
+        "timed_out": True if args.timed_out else None,
+    }
+
+    conn = None
+    if not args.no_index:
+        try:
+            conn = open_synced_index()
+        except (OSError, sqlite3.Error) as e:
+            print(
+                f"Warning: log index unavailable, scanning JSONL: {e}",
+                file=sys.stderr,
+            )
+
+    try:
+        index_filters = {
+            "prefix": codex_log_index.scope_prefix(LOG_DIR),
+            "from_date": from_date,
+            "to_date": to_date,
+            **filters,
+        }
+        if args.stats and conn is not None:
+            render_stats(codex_log_index.query_stats(conn, **index_filters))
+            return
+
+        # ログ取得 + フィルタ適用
+        table_only = not (args.stats or args.export or args.rollup)
+        total = None
+        if conn is not None and table_only:
+            # テーブル表示は先頭 --limit 件だけ decode し、件数は SQL で数える
+            logs = codex_log_index.query_logs(
+                conn, limit=args.limit, **index_filters
+            )
+            total = codex_log_index.count_logs(conn, **index_filters)
+        elif conn is not None:
+            logs = codex_log_index.query_logs(conn, **index_filters)
+        else:
+            logs = filter_logs(iter_logs(from_date, to_date), **filters)
+
+        if columnar or args.rollup:
+            rollup_logs = None
+            if args.rollup and any(v is not None for v in filters.values()):
+                # rollup-YYYY-MM-DD.json は共有ファイルなので、フィルタに
+                # 関係なく日付範囲内の全ログから作る
+                if conn is not None:
+                    rollup_logs = codex_log_index.query_logs(
+                        conn,
+                        prefix=index_filters["prefix"],
+                        from_date=from_date,
+                        to_date=to_date,
+                    )
+                else:
+                    rollup_logs = iter_logs(from_date, to_date)
+            export_files(logs, args, rollup_logs)
+            return
+
+        # リストに変換
+        logs_list = list(logs)
+    finally:
+        if conn is not None:
+            conn.close()
 
     # 出力
     if args.stats:
@@ -499,7 +918,7 @@ def main():
     elif args.export == "json":
         export_json(logs_list)
     else:
-        print_table(logs_list, limit=args.limit)
+        print_table(logs_list, limit=args.limit, total=total)
 
 
 if __name__ == "__main__":
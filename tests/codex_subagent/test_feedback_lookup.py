@@ -0,0 +1,96 @@
+import json
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[2]
+SCRIPTS = ROOT / ".agents" / "skills" / "codex-subagent" / "scripts"
+sys.path.append(str(SCRIPTS))
+
+import codex_exec  # noqa: E402
+import codex_feedback  # noqa: E402
+import codex_log_index  # noqa: E402
+import codex_query  # noqa: E402
+
+
+def _write_runs(monkeypatch, log_dir: Path) -> list[tuple[str, Path]]:
+    monkeypatch.setattr(codex_exec, "LOG_DIR", log_dir)
+    written = []
+    for mode in ("single", "parallel"):
+        log = codex_exec.ExecutionLog(execution={"mode": mode})
+        written.append((log.run_id, codex_exec.write_log(log)))
+    return written
+
+
+def test_feedback_lookup_uses_run_index_and_latest_pointer(
+    monkeypatch, tmp_path
+):
+    written = _write_runs(monkeypatch, tmp_path / "human")
+    monkeypatch.setattr(codex_feedback, "LOG_DIR", tmp_path / "human")
+
+    def fail_rglob(self, pattern):
+        raise AssertionError(f"unexpected scan: {pattern}")
+
+    monkeypatch.setattr(Path, "rglob", fail_rglob)
+    assert codex_feedback.find_latest_log() == written[-1][1]
+    first_run_id, first_path = written[0]
+    assert codex_feedback.find_log_by_run_id(first_run_id[:12]) == first_path
+
+
+def test_find_log_by_run_id_syncs_files_written_outside_write_log(
+    monkeypatch, tmp_path
+):
+    _write_runs(monkeypatch, tmp_path / "auto")
+    day_dir = tmp_path / "auto" / "2026" / "01" / "01"
+    day_dir.mkdir(parents=True)
+    manual = day_dir / "run-20260101T000000-manual00.jsonl"
+    manual.write_text(
+        json.dumps({"run_id": "manual-0001", "execution": {}}) + "\n",
+        encoding="utf-8",
+    )
+    monkeypatch.setattr(codex_feedback, "LOG_DIR", tmp_path / "auto")
+
+    assert codex_feedback.find_log_by_run_id("manual-0001") == manual
+    assert codex_feedback.find_log_by_run_id("missing") is None
+
+
+def test_add_feedback_appends_sidecar_joined_by_codex_query(
+    monkeypatch, tmp_path
+):
+    written = _write_runs(monkeypatch, tmp_path / "human")
+    monkeypatch.setattr(codex_feedback, "LOG_DIR", tmp_path / "human")
+    monkeypatch.setattr(codex_query, "LOG_DIR", tmp_path / "human")
+    run_id, log_path = written[0]
+    before = log_path.read_bytes()
+
+    assert codex_feedback.add_feedback(log_path, 2.0, "first")
+    assert codex_feedback.add_feedback(log_path, 4.5, "second", ["ok"])
+
+    assert log_path.read_bytes() == before
+    sidecars = list(codex_log_index.feedback_dir(tmp_path, run_id).iterdir())
+    assert len(sidecars) == 2
+    assert all(p.suffix == ".json" for p in sidecars)
+
+    conn = codex_query.open_synced_index()
+    try:
+        indexed = list(
+            codex_log_index.query_logs(
+                conn, prefix="human/", has_human_feedback=True
+            )
+        )
+        stats = codex_log_index.query_stats(conn, prefix="human/")
+    finally:
+        conn.close()
+    scanned = list(
+        codex_query.filter_logs(
+            codex_query.iter_logs(), has_human_feedback=True
+        )
+    )
+    for logs in (indexed, scanned):
+        assert [log["run_id"] for log in logs] == [run_id]
+        human = logs[0]["evaluation"]["human"]
+        assert (human["score"], human["notes"], human["tags"]) == (
+            4.5,
+            "second",
+            ["ok"],
+        )
+    assert stats["human"] == {"count": 1, "avg": 4.5, "min": 4.5, "max": 4.5}
@@ -1,5 +1,10 @@
 import asyncio
+import io
+import json
+import os
+import subprocess
 import sys
+import time
 from pathlib import Path
 
 ROOT = Path(__file__).resolve().parents[2]
@@ -15,10 +20,13 @@ def test_run_codex_exec_passes_model_and_records_metadata(monkeypatch):
     class DummyProc:
         def __init__(self, cmd):
             self.cmd = cmd
+            self.pid = 4242
             self.returncode = 0
+            self.stdout = io.BytesIO(b"ok")
+            self.stderr = io.BytesIO(b"")
 
-        def communicate(self, timeout=None):
-            return ("ok", "")
+        def wait(self, timeout=None):
+            return self.returncode
 
     def fake_popen(cmd, **kwargs):
         del kwargs
@@ -50,8 +58,9 @@ def test_execute_parallel_propagates_model(monkeypatch):
         workdir,
         profile,
         model,
+        event_log_path=None,
     ):
-        del prompt, sandbox, timeout, workdir, profile
+        del prompt, sandbox, timeout, workdir, profile, event_log_path
         seen_models.append(model)
         return codex_exec.CodexResult(
             agent_id=agent_id,
@@ -77,3 +86,306 @@ def test_execute_parallel_propagates_model(monkeypatch):
         "gpt-5.3-codex",
     ]
     assert [r.metadata.get("model") for r in results] == seen_models
+
+
+def test_run_codex_exec_streams_bounded_capture_to_event_log(
+    monkeypatch, tmp_path
+):
+    payload = "あ" * 10
+
+    class DummyProc:
+        def __init__(self, cmd):
+            self.pid = 4242
+            self.returncode = 0
+            self.stdout = io.BytesIO(payload.encode("utf-8"))
+            self.stderr = io.BytesIO(b"warn")
+
+        def wait(self, timeout=None):
+            return self.returncode
+
+    monkeypatch.setattr(
+        codex_exec.subprocess, "Popen", lambda cmd, **kwargs: DummyProc(cmd)
+    )
+    monkeypatch.setattr(codex_exec, "STREAM_READ_CHUNK_BYTES", 4)
+    monkeypatch.setattr(codex_exec, "MAX_CAPTURE_BYTES", 12)
+    event_log_path = tmp_path / "events" / "agent_0.jsonl"
+
+    result = codex_exec.run_codex_exec(
+        prompt="hello",
+        event_log_path=event_log_path,
+    )
+
+    assert result.success is True
+    assert result.output == "あ" * 4
+    assert result.output_is_partial is True
+    assert result.metadata["event_log"] == str(event_log_path)
+    events = [
+        json.loads(line)
+        for line in event_log_path.read_text(encoding="utf-8").splitlines()
+    ]
+    assert events[0]["event"] == "start"
+    assert events[-1]["event"] == "exit"
+    assert events[-1]["stdout_bytes"] == len(payload.encode("utf-8"))
+    streamed = "".join(
+        event["data"] for event in events if event["event"] == "stdout"
+    )
+    assert streamed == payload
+    assert [e["data"] for e in events if e["event"] == "stderr"] == ["warn"]
+
+
+def test_execute_parallel_caps_concurrency_and_stops_at_quorum(monkeypatch):
+    active = 0
+    peak = 0
+    started: list[str] = []
+    cancelled: list[str] = []
+
+    async def fake_run_codex_exec_async(prompt, agent_id, **kwargs):
+        nonlocal active, peak
+        del kwargs
+        started.append(agent_id)
+        active += 1
+        peak = max(peak, active)
+        try:
+            await asyncio.sleep(0.01 if prompt == "fast" else 10)
+        except asyncio.CancelledError:
+            cancelled.append(agent_id)
+            raise
+        finally:
+            active -= 1
+        return codex_exec.CodexResult(
+            agent_id=agent_id,
+            output="ok",
+            success=True,
+            metadata={"model": None},
+        )
+
+    monkeypatch.setattr(
+        codex_exec, "run_codex_exec_async", fake_run_codex_exec_async
+    )
+
+    results = asyncio.run(
+        codex_exec.execute_parallel(
+            prompts=["slow", "fast", "slow", "fast", "slow"],
+            max_concurrency=2,
+            priorities=[5, 0, 5, 0, 9],
+            quorum=2,
+        )
+    )
+
+    assert peak == 2
+    assert started[:2] == ["agent_1", "agent_3"]
+    assert [r.success for r in results] == [False, True, False, True, False]
+    assert started == ["agent_1", "agent_3", "agent_0"]
+    assert cancelled == ["agent_0"]
+    assert results[4].metadata["cancelled"] is True
+    assert all("queue_wait_seconds" in r.metadata for r in results)
+
+
+def test_execute_parallel_records_worker_errors(monkeypatch):
+    async def fake_run_codex_exec_async(prompt, agent_id, **kwargs):
+        del kwargs
+        return codex_exec.CodexResult(
+            agent_id=agent_id, output=prompt, success=True, returncode=0
+        )
+
+    def stop_when(result):
+        if result.output == "boom":
+            raise RuntimeError("judge crashed")
+        return False
+
+    monkeypatch.setattr(
+        codex_exec, "run_codex_exec_async", fake_run_codex_exec_async
+    )
+
+    results = asyncio.run(
+        codex_exec.execute_parallel(
+            prompts=["ok", "boom", "ok"], stop_when=stop_when
+        )
+    )
+
+    # stop_when の失敗でも完了した codex の結果は残す
+    assert [r.success for r in results] == [True, True, True]
+    assert results[1].output == "boom"
+    assert results[1].metadata["worker_error"] == "RuntimeError: judge crashed"
+    assert not any(r.metadata.get("cancelled") for r in results)
+
+    async def failing_run_codex_exec_async(prompt, agent_id, **kwargs):
+        del kwargs
+        if prompt == "boom":
+            raise OSError("spawn failed")
+        return await fake_run_codex_exec_async(prompt, agent_id)
+
+    monkeypatch.setattr(
+        codex_exec, "run_codex_exec_async", failing_run_codex_exec_async
+    )
+
+    results = asyncio.run(
+        codex_exec.execute_parallel(prompts=["ok", "boom"], quorum=2)
+    )
+
+    assert [r.success for r in results] == [True, False]
+    assert results[1].error_message == "OSError: spawn failed"
+    assert results[1].metadata["worker_error"] == "OSError: spawn failed"
+
+
+def test_token_bucket_reserves_future_slots():
+    bucket = codex_exec.TokenBucket(rate=10.0, burst=2)
+
+    assert bucket.reserve() == 0.0
+    assert bucket.reserve() == 0.0
+    assert 0.05 < bucket.reserve() <= 0.1
+
+
+def test_execute_competition_early_stop_cancels_remaining(monkeypatch):
+    cancelled: list[str] = []
+
+    async def fake_run_codex_exec_async(prompt, agent_id, **kwargs):
+        del prompt, kwargs
+        delay = 0.01 if agent_id == "agent_1" else 10
+        try:
+            await asyncio.sleep(delay)
+        except asyncio.CancelledError:
+            cancelled.append(agent_id)
+            raise
+        return codex_exec.CodexResult(
+            agent_id=agent_id,
+            output="def solve():\n    return 42\n" * 10,
+            success=True,
+            execution_time=delay,
+        )
+
+    monkeypatch.setattr(
+        codex_exec, "run_codex_exec_async", fake_run_codex_exec_async
+    )
+
+    outcome = asyncio.run(
+        codex_exec.execute_competition(
+            prompt="solve",
+            count=3,
+            strategy=codex_exec.SelectionStrategy.CONSERVATIVE,
+            judge_mode=codex_exec.JudgeMode.HEURISTIC,
+            early_stop_score=codex_exec.COMPETITION_PASS_SCORE,
+        )
+    )
+
+    assert outcome.best.result.agent_id == "agent_1"
+    assert sorted(cancelled) == ["agent_0", "agent_2"]
+    assert outcome.selection["early_stopped"] is True
+    assert outcome.selection["cancelled"] == ["agent_0", "agent_2"]
+
+
+def test_run_codex_exec_result_cache_keys_on_tree_and_sandbox(
+    monkeypatch, tmp_path
+):
+    repo = tmp_path / "repo"
+    repo.mkdir()
+    git = ["git", "-c", "user.name=t", "-c", "user.email=t@example.com"]
+    subprocess.run(git + ["init", "-q"], cwd=repo, check=True)
+    (repo / "a.txt").write_text("v1", encoding="utf-8")
+    subprocess.run(git + ["add", "a.txt"], cwd=repo, check=True)
+    subprocess.run(git + ["commit", "-qm", "init"], cwd=repo, check=True)
+
+    spawned: list[str] = []
+
+    def fake_spawn(prompt, agent_id, **kwargs):
+        del kwargs
+        spawned.append(prompt)
+        return codex_exec.CodexResult(
+            agent_id=agent_id,
+            output=f"out-{len(spawned)}",
+            success=True,
+            metadata={"model": "m", "event_log": "/tmp/x.jsonl"},
+        )
+
+    monkeypatch.setattr(codex_exec, "_spawn_codex_exec", fake_spawn)
+    monkeypatch.setattr(codex_exec, "RESULT_CACHE_DIR", tmp_path / "cache")
+    monkeypatch.setattr(codex_exec, "RESULT_CACHE_MODE", "readwrite")
+
+    def run(sandbox=codex_exec.SandboxMode.READ_ONLY):
+        return codex_exec.run_codex_exec(
+            prompt="review", sandbox=sandbox, workdir=str(repo), model="m"
+        )
+
+    first = run()
+    second = run()
+    assert second.output == first.output == "out-1"
+    assert second.metadata["cache"] == "hit"
+    assert "event_log" not in second.metadata
+
+    (repo / "a.txt").write_text("v2", encoding="utf-8")
+    assert run().output == "out-2"
+    assert run(codex_exec.SandboxMode.WORKSPACE_WRITE).output == "out-3"
+    assert run(codex_exec.SandboxMode.WORKSPACE_WRITE).output == "out-4"
+    assert codex_exec.get_result_cache().stats() == {
+        "hits": 1,
+        "misses": 2,
+        "writes": 2,
+    }
+
+
+def test_exec_result_cache_prune_evicts_least_recently_used(tmp_path):
+    cache = codex_exec.ExecResultCache(tmp_path, max_bytes=70)
+    base = time.time() - 100
+    for index, key in enumerate(["aa01", "bb02", "cc03"]):
+        cache.put(key, {"output": "x" * 20})
+        os.utime(cache.path_for(key), (base + index, base + index))
+    assert cache.get("aa01") is not None
+
+    assert cache.prune() == 1
+    assert cache.get("bb02") is None
+    assert cache.get("aa01") is not None
+
+
+def test_token_accounting_prefers_codex_usage_then_tokenizer(monkeypatch):
+    events = "\n".join(
+        json.dumps(event)
+        for event in (
+            {"type": "thread.started"},
+            {
+                "type": "turn.completed",
+                "usage": {
+                    "input_tokens": 1200,
+                    "cached_input_tokens": 800,
+                    "output_tokens": 90,
+                },
+            },
+        )
+    )
+    usage = codex_exec.account_tokens("prompt", events, "")
+    assert (
+        usage.input_tokens,
+        usage.cached_input_tokens,
+        usage.output_tokens,
+        usage.total_tokens,
+        usage.source,
+    ) == (1200, 800, 90, 1290, "codex")
+
+    monkeypatch.setenv(codex_exec.TOKENIZER_ENV, "words")
+    codex_exec.register_tokenizer("words", lambda text: len(text.split()))
+    usage = codex_exec.account_tokens(
+        "a b c", "one two", "tokens used\n4,321\n"
+    )
+    assert (usage.total_tokens, usage.input_tokens, usage.output_tokens) == (
+        4321,
+        3,
+        2,
+    )
+    assert usage.source == "codex_total+words"
+
+    class DummyProc:
+        def __init__(self, cmd):
+            self.pid = 4242
+            self.returncode = 0
+            self.stdout = io.BytesIO(b"one two three")
+            self.stderr = io.BytesIO(b"")
+
+        def wait(self, timeout=None):
+            return self.returncode
+
+    monkeypatch.setattr(
+        codex_exec.subprocess, "Popen", lambda cmd, **kwargs: DummyProc(cmd)
+    )
+    result = codex_exec.run_codex_exec(prompt="four five six seven")
+    assert (result.input_tokens, result.output_tokens) == (4, 3)
+    assert result.tokens_used == 7
+    assert result.token_source == "words"
@@ -37,3 +37,37 @@ def test_apply_patch_invalid_index():
     ops = [{"op": "remove", "path": "/facts/0"}]
     with pytest.raises(ValueError, match="index"):
         codex_exec.apply_capsule_patch(capsule, ops)
+
+
+def test_apply_patch_copies_only_the_patched_path():
+    facts = [{"source": f"s{i}"} for i in range(3)]
+    capsule = {
+        "facts": facts,
+        "draft": {"content": "old", "notes": ["n"]},
+        "open_questions": ["q"],
+    }
+    value = {"source": "new"}
+    ops = [
+        {"op": "add", "path": "/facts/-", "value": value},
+        {"op": "add", "path": "/facts/3/checked", "value": True},
+        {"op": "replace", "path": "/draft/content", "value": "new"},
+    ]
+    updated = codex_exec.apply_capsule_patch(capsule, ops)
+
+    assert capsule["facts"] is facts and len(facts) == 3
+    assert capsule["draft"]["content"] == "old"
+    assert value == {"source": "new"}
+    assert updated["facts"][3] == {"source": "new", "checked": True}
+    assert updated["facts"][0] is facts[0]
+    assert updated["open_questions"] is capsule["open_questions"]
+    assert updated["draft"]["notes"] is capsule["draft"]["notes"]
+
+    with pytest.raises(ValueError):
+        codex_exec.apply_capsule_patch(
+            capsule,
+            [
+                {"op": "add", "path": "/facts/-", "value": value},
+                {"op": "remove", "path": "/facts/9"},
+            ],
+        )
+    assert len(capsule["facts"]) == 3
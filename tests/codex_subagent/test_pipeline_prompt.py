@@ -154,3 +154,56 @@ def test_prepare_stage_prompt_enforces_max_total_prompt_chars():
             max_total_prompt_chars=10,
             allow_dynamic=False,
         )
+
+
+def test_budget_stage_prompt_compacts_capsule_until_it_fits():
+    capsule = {
+        "schema_version": SCHEMA_VERSION,
+        "pipeline_run_id": "run-1",
+        "facts": [f"fact {i}" for i in range(40)],
+        "draft": "d" * 5000,
+    }
+    kwargs = {
+        "stage_id": "draft",
+        "base_prompt": "Do the thing",
+        "capsule": capsule,
+        "capsule_store": "embed",
+        "capsule_path": None,
+        "stage_spec": None,
+        "allow_dynamic": False,
+    }
+    unlimited = codex_exec.budget_stage_prompt(
+        max_total_prompt_chars=None, **kwargs
+    )
+    assert unlimited.steps == []
+
+    minified = codex_exec.budget_stage_prompt(
+        max_total_prompt_chars=unlimited.before_chars - 10, **kwargs
+    )
+    assert minified.steps == ["minify"]
+    assert minified.capsule == capsule
+
+    summarized = codex_exec.budget_stage_prompt(
+        max_total_prompt_chars=4000, **kwargs
+    )
+    assert summarized.steps == ["minify", "summarize"]
+    assert summarized.capsule["facts"] == [f"fact {i}" for i in range(32, 40)]
+    assert summarized.capsule["capsule_compaction"]["facts"] == {
+        "omitted_items": 32,
+        "first_index": 32,
+    }
+    log = summarized.to_log()
+    assert log["before_chars"] > 4000 >= log["after_chars"]
+
+    delivered = codex_exec.budget_stage_prompt(
+        max_total_prompt_chars=1200,
+        file_fallback_path="/tmp/capsule.json",
+        **kwargs,
+    )
+    assert delivered.steps[-1] == "file"
+    assert delivered.capsule_store == "file"
+    assert "CAPSULE_PATH: /tmp/capsule.json" in delivered.prompt
+    assert delivered.capsule == capsule
+
+    with pytest.raises(ValueError, match="max_total_prompt_chars"):
+        codex_exec.budget_stage_prompt(max_total_prompt_chars=1200, **kwargs)
@@ -1,10 +1,16 @@
+import json
 import sys
+from datetime import datetime
 from pathlib import Path
 
+import pytest
+
 ROOT = Path(__file__).resolve().parents[2]
 SCRIPTS = ROOT / ".agents" / "skills" / "codex-subagent" / "scripts"
 sys.path.append(str(SCRIPTS))
 
+import codex_log_export  # noqa: E402
+import codex_log_index  # noqa: E402
 import codex_query  # noqa: E402
 
 
@@ -60,3 +66,302 @@ def test_print_stats_includes_model_section(capsys):
     assert "By Model:" in out
     assert "gpt-5.3-codex: 1" in out
     assert "gpt-5.3-codex-spark: 1" in out
+
+
+def _write_sample_logs(root: Path) -> list[Path]:
+    paths = []
+    for scope, log in zip(["human", "auto"], _sample_logs(), strict=True):
+        day_dir = root / scope / "2026" / "02" / "14"
+        day_dir.mkdir(parents=True)
+        path = day_dir / f"run-20260214T000000-{log['run_id']}.jsonl"
+        path.write_text(json.dumps(log) + "\n", encoding="utf-8")
+        paths.append(path)
+    return paths
+
+
+def test_log_index_matches_jsonl_scan(monkeypatch, tmp_path):
+    _write_sample_logs(tmp_path)
+    monkeypatch.setattr(codex_query, "LOG_DIR", tmp_path)
+    conn = codex_query.open_synced_index()
+    try:
+        filters = {"mode": "single", "min_score": 4.1}
+        indexed = list(codex_log_index.query_logs(conn, **filters))
+        scanned = list(
+            codex_query.filter_logs(codex_query.iter_logs(), **filters)
+        )
+        assert indexed == scanned
+        assert [log["run_id"] for log in indexed] == ["run-codex"]
+
+        from_date = datetime(2026, 2, 14, 0, 0, 30)
+        indexed = list(codex_log_index.query_logs(conn, from_date=from_date))
+        assert [log["run_id"] for log in indexed] == ["run-spark"]
+
+        scoped = list(codex_log_index.query_logs(conn, prefix="auto/"))
+        assert [log["run_id"] for log in scoped] == ["run-spark"]
+
+        limited = list(codex_log_index.query_logs(conn, limit=1))
+        assert [log["run_id"] for log in limited] == ["run-spark"]
+        assert codex_log_index.count_logs(conn) == 2
+        assert codex_log_index.count_logs(conn, model="gpt-5.3-codex") == 1
+
+        assert codex_log_index.query_stats(conn) == codex_query.summarize_logs(
+            list(codex_query.iter_logs())
+        )
+    finally:
+        conn.close()
+
+
+def test_table_reads_only_limit_rows_from_index(monkeypatch, tmp_path, capsys):
+    log_dir = tmp_path / "logs"
+    _write_sample_logs(log_dir)
+    monkeypatch.setattr(
+        sys,
+        "argv",
+        ["codex_query.py", "--log-dir", str(log_dir), "--limit", "1"],
+    )
+    decoded: list[str] = []
+    original_query_logs = codex_log_index.query_logs
+
+    def counting_query_logs(conn, **kwargs):
+        for log in original_query_logs(conn, **kwargs):
+            decoded.append(log["run_id"])
+            yield log
+
+    monkeypatch.setattr(codex_log_index, "query_logs", counting_query_logs)
+
+    codex_query.main()
+
+    out = capsys.readouterr().out
+    assert decoded == ["run-spark"]
+    assert "... and 1 more" in out
+
+
+def test_log_index_sync_picks_up_rewritten_files(tmp_path):
+    human_path, _ = _write_sample_logs(tmp_path)
+    conn = codex_log_index.open_index(tmp_path)
+    try:
+        first = codex_log_index.sync_index(conn, tmp_path)
+        assert first["indexed_files"] == 2
+        assert codex_log_index.sync_index(conn, tmp_path)["indexed_files"] == 0
+
+        log = json.loads(human_path.read_text(encoding="utf-8"))
+        log["evaluation"]["human"] = {"score": 5}
+        human_path.write_text(json.dumps(log) + "\n", encoding="utf-8")
+        codex_log_index.sync_index(conn, tmp_path)
+        assert [
+            entry["run_id"]
+            for entry in codex_log_index.query_logs(
+                conn, has_human_feedback=True
+            )
+        ] == ["run-codex"]
+    finally:
+        conn.close()
+
+
+def _write_daily_logs(root: Path) -> None:
+    for day in (13, 14, 15):
+        for hour in (3, 23):
+            day_dir = root / "auto" / "2026" / "02" / f"{day:02d}"
+            day_dir.mkdir(parents=True, exist_ok=True)
+            stamp = f"202602{day:02d}T{hour:02d}0000"
+            log = {
+                "run_id": f"{day}-{hour}",
+                "timestamp": f"2026-02-{day:02d}T{hour:02d}:00:00+00:00",
+                "execution": {"mode": "single"},
+            }
+            path = day_dir / f"run-{stamp}-{day}{hour}.jsonl"
+            path.write_text(json.dumps(log) + "\n", encoding="utf-8")
+
+
+def test_iter_log_files_prunes_by_date_partition(monkeypatch, tmp_path):
+    _write_daily_logs(tmp_path)
+    monkeypatch.setattr(codex_query, "LOG_DIR", tmp_path)
+
+    files = codex_query.iter_log_files(
+        datetime(2026, 2, 14), datetime(2026, 2, 15)
+    )
+
+    assert {path.parent.name for path in files} == {"14"}
+    assert [
+        log["run_id"]
+        for log in codex_query.iter_logs(
+            datetime(2026, 2, 14), datetime(2026, 2, 15)
+        )
+    ] == ["14-23", "14-3"]
+
+
+def test_iter_logs_merges_parallel_parse_in_timestamp_order(
+    monkeypatch, tmp_path
+):
+    _write_daily_logs(tmp_path)
+    monkeypatch.setattr(codex_query, "LOG_DIR", tmp_path)
+    monkeypatch.setattr(codex_query, "PARALLEL_PARSE_MIN_FILES", 1)
+
+    run_ids = [log["run_id"] for log in codex_query.iter_logs()]
+
+    assert run_ids == ["15-23", "15-3", "14-23", "14-3", "13-23", "13-3"]
+
+
+def test_iter_logs_streams_parallel_parse_in_bounded_batches(
+    monkeypatch, tmp_path
+):
+    _write_daily_logs(tmp_path)
+    # 長時間の実行はファイル名の書き込み時刻より timestamp がかなり前になる
+    late = (
+        tmp_path
+        / "auto"
+        / "2026"
+        / "02"
+        / "15"
+        / "run-20260215T040000-x.jsonl"
+    )
+    late.write_text(
+        json.dumps(
+            {"run_id": "long", "timestamp": "2026-02-14T23:30:00+00:00"}
+        )
+        + "\n",
+        encoding="utf-8",
+    )
+    monkeypatch.setattr(codex_query, "LOG_DIR", tmp_path)
+    monkeypatch.setattr(codex_query, "PARALLEL_PARSE_MIN_FILES", 1)
+    monkeypatch.setattr(codex_query, "PARALLEL_PARSE_BATCH_FILES", 1)
+
+    run_ids = [log["run_id"] for log in codex_query.iter_logs()]
+
+    assert run_ids == [
+        "15-23",
+        "15-3",
+        "long",
+        "14-23",
+        "14-3",
+        "13-23",
+        "13-3",
+    ]
+
+
+def _pipeline_log():
+    return {
+        "run_id": "run-pipe",
+        "timestamp": "2026-02-15T00:00:00+00:00",
+        "execution": {"mode": "pipeline", "task_type": "code_gen"},
+        "results": [
+            {
+                "stage_id": stage_id,
+                "role": role,
+                "pipeline_run_id": "pipe-1",
+                "capsule_size_bytes": 128,
+                "exec": {
+                    "agent_id": stage_id,
+                    "model": "gpt-5.3-codex",
+                    "output": "x" * 10,
+                    "tokens_used": 5,
+                    "execution_time": seconds,
+                    "success": True,
+                    "timed_out": timed_out,
+                },
+                "stage_result": {"status": "ok"},
+            }
+            for stage_id, role, seconds, timed_out in (
+                ("draft", "executor", 3.0, False),
+                ("review", "reviewer", 7.0, True),
+            )
+        ],
+        "evaluation": {"heuristic": {"combined_score": 3.0}},
+    }
+
+
+def test_flatten_and_daily_rollups():
+    logs = [*_sample_logs(), _pipeline_log()]
+
+    runs = [codex_log_export.flatten_run(log) for log in logs]
+    assert [r["date"] for r in runs] == ["2026-02-14"] * 2 + ["2026-02-15"]
+    assert runs[2]["execution_time"] == 7.0
+    assert runs[2]["tokens_used"] == 10
+    assert runs[2]["timed_out"] is True
+    assert codex_log_export.flatten_results(logs[2]) == []
+    stages = codex_log_export.flatten_stages(logs[2])
+    assert [s["stage_id"] for s in stages] == ["draft", "review"]
+    assert stages[1]["output_chars"] == 10
+
+    rollups = codex_log_export.build_daily_rollups(logs)
+    assert sorted(rollups) == ["2026-02-14", "2026-02-15"]
+    assert [g["model"] for g in rollups["2026-02-14"]] == [
+        "gpt-5.3-codex",
+        "gpt-5.3-codex-spark",
+    ]
+    (pipeline,) = rollups["2026-02-15"]
+    assert (pipeline["runs"], pipeline["timeouts"]) == (1, 1)
+    assert pipeline["execution_time_p99"] == 7.0
+    sketch = codex_log_export.QuantileSketch()
+    for value in range(1, 101):
+        sketch.add(float(value))
+    assert abs(sketch.quantile(90) - 90) <= 0.9
+    other = codex_log_export.QuantileSketch.from_dict(sketch.to_dict())
+    other.merge(sketch)
+    assert other.count == 200
+    assert abs(other.quantile(50) - 50) <= 0.5
+
+
+@pytest.mark.parametrize("no_index", [False, True])
+def test_rollup_ignores_query_filters(monkeypatch, tmp_path, no_index):
+    log_dir = tmp_path / "logs"
+    _write_sample_logs(log_dir)
+    out = tmp_path / "rollups"
+    argv = ["codex_query.py", "--log-dir", str(log_dir), "--log-scope", "all"]
+    argv += ["--model", "gpt-5.3-codex-spark", "--rollup", str(out)]
+    if no_index:
+        argv.append("--no-index")
+    monkeypatch.setattr(sys, "argv", argv)
+    codex_query.main()
+
+    rollup = json.loads((out / "rollup-2026-02-14.json").read_text())
+    assert [g["model"] for g in rollup["groups"]] == [
+        "gpt-5.3-codex",
+        "gpt-5.3-codex-spark",
+    ]
+
+
+def test_output_chars_uses_size_recorded_before_truncation():
+    log = _pipeline_log()
+    log["results"][0]["exec"]["output_chars"] = 50_000
+
+    stages = codex_log_export.flatten_stages(log)
+
+    # 記録済みの実サイズを使い、古いログは切り詰め後の長さで代用する
+    assert [stage["output_chars"] for stage in stages] == [50_000, 10]
+
+
+def test_export_columnar_writes_runs_results_stages(tmp_path):
+    pytest.importorskip("pyarrow")
+    import pyarrow.parquet as pq
+
+    logs = [*_sample_logs(), _pipeline_log()]
+    counts = codex_log_export.export_columnar(
+        iter(logs), tmp_path, "parquet", batch_rows=1
+    )
+    assert counts == {"runs": 3, "results": 2, "stages": 2}
+    table = pq.read_table(tmp_path / "runs.parquet")
+    assert table.column("run_id").to_pylist() == [
+        "run-codex",
+        "run-spark",
+        "run-pipe",
+    ]
+
+
+def test_stats_report_percentiles_by_dimension(capsys):
+    logs = [*_sample_logs(), _pipeline_log()]
+    performance = codex_log_export.summarize_performance(logs)
+
+    assert set(performance) == {"model", "profile", "mode", "stage_role"}
+    codex = performance["model"]["gpt-5.3-codex"]
+    assert codex["count"] == 3
+    assert abs(codex["timeout_rate"] - 1 / 3) < 1e-9
+    assert codex["execution_time_p99"] == 10.0
+    reviewer = performance["stage_role"]["reviewer"]
+    assert (reviewer["count"], reviewer["timeout_rate"]) == (1, 1.0)
+    assert performance["mode"]["pipeline"]["tokens_used_p50"] == 5
+
+    codex_query.print_stats(logs)
+    out = capsys.readouterr().out
+    assert "Performance by Stage Role (p50/p90/p99):" in out
+    assert "reviewer: n=1 timeout=100.0%" in out
@@ -1,9 +1,12 @@
 import argparse
+import asyncio
 import json
 import os
 import re
 import stat
+import subprocess
 import sys
+import time
 from pathlib import Path
 
 import pytest
@@ -27,7 +30,10 @@ def _make_args(tmp_path: Path, pipeline_spec: Path | None = None, **overrides):
         capsule_path=None,
         max_stages=10,
         max_parallel_stages=2,
+        speculative_stages=False,
         judge_mode="hybrid",
+        snapshot_mode="walk",
+        read_only_workspace="isolated",
         pipeline_spec=str(pipeline_spec) if pipeline_spec else None,
         pipeline_stages=None,
         allow_dynamic_stages=False,
@@ -54,6 +60,15 @@ def _stage_result_output(stage_id: str, patch: list[dict]):
     )
 
 
+def _patch_stage_exec(monkeypatch, fake_run_codex_exec):
+    async def fake_run_codex_exec_async(**kwargs):
+        return fake_run_codex_exec(**kwargs)
+
+    monkeypatch.setattr(
+        codex_exec, "run_codex_exec_async", fake_run_codex_exec_async
+    )
+
+
 def _extract_stage_id(prompt: str) -> str:
     match = re.search(
         r"You are executing pipeline stage: ([A-Za-z0-9_-]+)", prompt
@@ -396,6 +411,174 @@ def test_execute_stage_with_retry_retries_retryable_error(
     codex_exec.cleanup_stage_workspace(outcome)
 
 
+def test_execute_stage_with_retry_async_releases_slot_during_backoff(
+    monkeypatch, tmp_path
+):
+    attempts: dict[str, int] = {}
+    active = {"now": 0, "peak": 0}
+
+    async def fake_run_codex_exec_async(**kwargs):
+        stage_id = _extract_stage_id(kwargs["prompt"])
+        attempts[stage_id] = attempts.get(stage_id, 0) + 1
+        active["now"] += 1
+        active["peak"] = max(active["peak"], active["now"])
+        await asyncio.sleep(0)
+        active["now"] -= 1
+        if attempts[stage_id] == 1:
+            return codex_exec.CodexResult(
+                agent_id="agent_0",
+                output="",
+                stderr="timeout",
+                success=False,
+                returncode=124,
+                timed_out=True,
+                timeout_seconds=30,
+                output_is_partial=True,
+            )
+        return codex_exec.CodexResult(
+            agent_id="agent_0",
+            output=_stage_result_output(stage_id, []),
+            success=True,
+            returncode=0,
+        )
+
+    monkeypatch.setattr(
+        codex_exec, "run_codex_exec_async", fake_run_codex_exec_async
+    )
+    monkeypatch.setattr(
+        codex_exec,
+        "create_isolated_workspace",
+        lambda source_root, stage_label: codex_exec.IsolatedWorkspace(
+            path=tmp_path,
+            cleanup_root=tmp_path,
+            mode="copy",
+        ),
+    )
+    monkeypatch.setattr(
+        codex_exec, "cleanup_isolated_workspace", lambda workspace: None
+    )
+    monkeypatch.setattr(
+        codex_exec, "capture_repo_snapshot", lambda root, **_kwargs: {}
+    )
+    monkeypatch.setattr(
+        codex_exec, "compute_retry_backoff_seconds", lambda attempt: 0.01
+    )
+    capsule = codex_exec.build_initial_capsule(
+        "goal", "run-1", codex_exec.SandboxMode.READ_ONLY
+    )
+
+    async def run_all():
+        slots = codex_exec.PrioritySlots(2)
+        return await asyncio.gather(
+            *(
+                codex_exec.execute_stage_with_retry_async(
+                    stage_spec=codex_exec.normalize_stage_spec(
+                        {"id": f"execute_{index}", "role": "executor"},
+                        None,
+                    ),
+                    capsule_state=capsule,
+                    base_prompt="goal",
+                    pipeline_run_id="run-1",
+                    log_dir=tmp_path,
+                    timeout=30,
+                    profile=None,
+                    model=None,
+                    default_workdir=None,
+                    capsule_store_arg="embed",
+                    capsule_path_arg=None,
+                    max_total_prompt_chars=None,
+                    allow_dynamic=False,
+                    previous_attempts=0,
+                    exec_slots=slots,
+                )
+                for index in range(100)
+            )
+        )
+
+    outcomes = asyncio.run(run_all())
+
+    assert [outcome["attempt_count"] for outcome in outcomes] == [2] * 100
+    assert all(
+        outcome["stage_result"]["status"] == "ok" for outcome in outcomes
+    )
+    assert active["peak"] <= 2
+
+
+def test_execute_stage_with_retry_reuses_content_addressed_capsule(
+    monkeypatch, tmp_path
+):
+    prompts: list[str] = []
+
+    def fake_run_codex_exec(**kwargs):
+        prompts.append(kwargs["prompt"])
+        if len(prompts) == 1:
+            return codex_exec.CodexResult(
+                agent_id="agent_0",
+                output="",
+                success=False,
+                timed_out=True,
+                output_is_partial=True,
+            )
+        return codex_exec.CodexResult(
+            agent_id="agent_0",
+            output=_stage_result_output("execute", []),
+            success=True,
+            returncode=0,
+        )
+
+    monkeypatch.setattr(codex_exec, "run_codex_exec", fake_run_codex_exec)
+    monkeypatch.setattr(
+        codex_exec,
+        "create_isolated_workspace",
+        lambda source_root, stage_label: codex_exec.IsolatedWorkspace(
+            path=tmp_path / "ws", cleanup_root=tmp_path / "ws", mode="copy"
+        ),
+    )
+    monkeypatch.setattr(
+        codex_exec, "cleanup_isolated_workspace", lambda workspace: None
+    )
+    monkeypatch.setattr(
+        codex_exec,
+        "enforce_stage_write_policy",
+        lambda policy, before_snapshot, **kwargs: {
+            "changed_files": [],
+            "unauthorized_files": [],
+            "authorized": True,
+        },
+    )
+    monkeypatch.setattr(codex_exec.time, "sleep", lambda _: None)
+    (tmp_path / "ws").mkdir()
+    capsule = codex_exec.build_initial_capsule(
+        "goal", "run-1", codex_exec.SandboxMode.READ_ONLY
+    )
+
+    outcome = codex_exec.execute_stage_with_retry(
+        stage_spec=codex_exec.normalize_stage_spec({"id": "execute"}, "draft"),
+        capsule_state=capsule,
+        base_prompt="goal",
+        pipeline_run_id="run-1",
+        log_dir=tmp_path,
+        timeout=30,
+        profile=None,
+        model=None,
+        default_workdir=None,
+        capsule_store_arg="file",
+        capsule_path_arg=None,
+        max_total_prompt_chars=None,
+        allow_dynamic=False,
+        previous_attempts=0,
+    )
+
+    blobs = list((tmp_path / "artifacts" / "run-1" / "capsules").iterdir())
+    assert len(blobs) == 1
+    logs = outcome["attempt_logs"]
+    assert blobs[0].stem == logs[0]["input_capsule_hash"]
+    assert logs[1]["input_capsule_hash"] == logs[0]["input_capsule_hash"]
+    assert [log["input_capsule_reused"] for log in logs] == [False, True]
+    assert all(f"CAPSULE_PATH: {blobs[0]}" in prompt for prompt in prompts)
+    codex_exec.cleanup_stage_workspace(outcome)
+
+
 def test_resolve_workspace_workdir_remaps_repo_absolute_path(
     monkeypatch, tmp_path
 ):
@@ -458,6 +641,259 @@ def test_apply_repo_changes_preserves_symlink(tmp_path):
     assert os.readlink(dst / "link.txt") == "target.txt"
 
 
+def test_capture_repo_snapshot_reuses_unchanged_entries(monkeypatch, tmp_path):
+    root = tmp_path / "repo"
+    root.mkdir()
+    (root / "same.txt").write_text("same", encoding="utf-8")
+    (root / "edit.txt").write_text("before", encoding="utf-8")
+    store = codex_exec.RepoBlobStore(tmp_path / "blobs")
+
+    before = codex_exec.capture_repo_snapshot(root, blob_store=store)
+    assert before["edit.txt"].content is None
+    assert Path(before["edit.txt"].blob_path).read_bytes() == b"before"
+
+    (root / "edit.txt").write_text("after!", encoding="utf-8")
+    hashed: list[str] = []
+    original_hash = codex_exec.hash_file_sha256
+    monkeypatch.setattr(
+        codex_exec,
+        "hash_file_sha256",
+        lambda path: hashed.append(Path(path).name) or original_hash(path),
+    )
+    after = codex_exec.capture_repo_snapshot(
+        root, previous=before, blob_store=store
+    )
+
+    assert hashed == ["edit.txt"]
+    assert after["same.txt"] is before["same.txt"]
+    assert codex_exec.diff_repo_snapshot(before, after) == ["edit.txt"]
+
+    codex_exec.restore_repo_paths(before, after, ["edit.txt"], root=root)
+    assert (root / "edit.txt").read_text(encoding="utf-8") == "before"
+
+
+def test_stat_only_snapshot_hashes_only_changed_or_racy_files(
+    monkeypatch, tmp_path
+):
+    root = tmp_path / "repo"
+    root.mkdir()
+    old = root / "old.txt"
+    old.write_text("old", encoding="utf-8")
+    os.utime(old, ns=(1_000_000_000, 1_000_000_000))
+    fresh = root / "fresh.txt"
+    fresh.write_text("fresh", encoding="utf-8")
+    store = codex_exec.RepoBlobStore(tmp_path / "blobs")
+    hashed: list[str] = []
+    original_hash = codex_exec.hash_file_sha256
+    monkeypatch.setattr(
+        codex_exec,
+        "hash_file_sha256",
+        lambda path: hashed.append(Path(path).name) or original_hash(path),
+    )
+
+    before = codex_exec.capture_repo_snapshot(
+        root, blob_store=store, stat_only=True
+    )
+    # mtime が古いファイルは stat だけ、racy window 内のものは内容も確認する
+    assert hashed == ["fresh.txt"]
+    assert before["old.txt"].digest is None
+    assert before["fresh.txt"].racy
+
+    hashed.clear()
+    fresh_stat = fresh.stat()
+    fresh.write_text("FRESH", encoding="utf-8")
+    os.utime(fresh, ns=(fresh_stat.st_atime_ns, fresh_stat.st_mtime_ns))
+    after = codex_exec.capture_repo_snapshot(
+        root, previous=before, blob_store=store
+    )
+
+    assert hashed == ["fresh.txt"]
+    assert codex_exec.diff_repo_snapshot(before, after) == ["fresh.txt"]
+    hydrated, base = codex_exec.hydrate_snapshot_entry(
+        before["old.txt"], old, blob_store=store
+    )
+    assert hydrated
+    assert Path(base.blob_path).read_bytes() == b"old"
+
+
+def test_enforce_write_policy_restores_from_stat_only_snapshot(tmp_path):
+    source = tmp_path / "source"
+    (source / "allowed").mkdir(parents=True)
+    (source / "allowed" / "file.txt").write_text("a", encoding="utf-8")
+    (source / "other.txt").write_text("keep", encoding="utf-8")
+    workspace = tmp_path / "workspace"
+    subprocess.run(["cp", "-a", str(source), str(workspace)], check=True)
+    before = codex_exec.capture_repo_snapshot(workspace, stat_only=True)
+    (workspace / "allowed" / "file.txt").write_text("b", encoding="utf-8")
+    (workspace / "other.txt").write_text("clobbered", encoding="utf-8")
+    policy = codex_exec.StageExecutionPolicy(
+        stage_id="review",
+        role="reviewer",
+        node_kind=None,
+        sandbox=codex_exec.SandboxMode.WORKSPACE_WRITE,
+        workdir=None,
+        write_roots=["allowed"],
+        input_keys=[],
+        max_attempts=1,
+        depends_on=[],
+        merge_strategy=None,
+    )
+
+    # 内容を持たない entry は途中まで戻さずに明示的に拒否する
+    with pytest.raises(ValueError, match="stat-only.*other.txt"):
+        codex_exec.enforce_stage_write_policy(
+            policy, before, workspace_root=workspace
+        )
+    assert (workspace / "other.txt").read_text() == "clobbered"
+
+    result = codex_exec.enforce_stage_write_policy(
+        policy, before, workspace_root=workspace, source_root=source
+    )
+    assert result["unauthorized_files"] == ["other.txt"]
+    assert (workspace / "other.txt").read_text() == "keep"
+    assert (workspace / "allowed" / "file.txt").read_text() == "b"
+
+    (source / "other.txt").write_text("moved on", encoding="utf-8")
+    (workspace / "other.txt").write_text("clobbered", encoding="utf-8")
+    with pytest.raises(ValueError, match="source tree changed"):
+        codex_exec.enforce_stage_write_policy(
+            policy, before, workspace_root=workspace, source_root=source
+        )
+
+
+def test_repo_change_watcher_delta_matches_full_walk(tmp_path):
+    root = tmp_path / "repo"
+    (root / "pkg").mkdir(parents=True)
+    (root / "pkg" / "keep.txt").write_text("keep", encoding="utf-8")
+    (root / "pkg" / "edit.txt").write_text("before", encoding="utf-8")
+    (root / "gone.txt").write_text("gone", encoding="utf-8")
+    store = codex_exec.RepoBlobStore(tmp_path / "blobs")
+    before = codex_exec.capture_repo_snapshot(root, blob_store=store)
+
+    watcher = codex_exec.start_repo_change_watcher(root)
+    if watcher is None:
+        pytest.skip("inotify is not available")
+    (root / "pkg" / "edit.txt").write_text("after", encoding="utf-8")
+    (root / "gone.txt").unlink()
+    (root / "new" / "deep").mkdir(parents=True)
+    (root / "new" / "deep" / "file.txt").write_text("new", encoding="utf-8")
+    changed = watcher.stop()
+
+    assert changed is not None
+    delta = codex_exec.capture_repo_snapshot_delta(
+        root, before, changed, blob_store=store
+    )
+    full = codex_exec.capture_repo_snapshot(root, blob_store=store)
+    assert delta == full
+    assert codex_exec.diff_repo_snapshot(before, delta) == [
+        "gone.txt",
+        "new/deep/file.txt",
+        "pkg/edit.txt",
+    ]
+
+
+def test_workspace_pool_resets_and_reuses_worktree(tmp_path):
+    source = tmp_path / "repo"
+    source.mkdir()
+    git = ["git", "-c", "user.name=t", "-c", "user.email=t@example.com"]
+    subprocess.run(git + ["init", "-q"], cwd=source, check=True)
+    (source / "tracked.txt").write_text("head", encoding="utf-8")
+    subprocess.run(git + ["add", "tracked.txt"], cwd=source, check=True)
+    subprocess.run(git + ["commit", "-qm", "init"], cwd=source, check=True)
+    (source / "tracked.txt").write_text("dirty-1", encoding="utf-8")
+
+    pool = codex_exec.WorkspacePool(source, max_idle=1)
+    try:
+        first = pool.acquire("stage-a")
+        assert first.mode == "worktree"
+        assert (first.path / "tracked.txt").read_text() == "dirty-1"
+        (first.path / "scratch.txt").write_text("junk", encoding="utf-8")
+        codex_exec.cleanup_isolated_workspace(first)
+
+        (source / "tracked.txt").write_text("dirty-2", encoding="utf-8")
+        (source / "untracked.txt").write_text("new", encoding="utf-8")
+        second = pool.acquire("stage-b")
+
+        assert second.path == first.path
+        assert (second.path / "tracked.txt").read_text() == "dirty-2"
+        assert (second.path / "untracked.txt").read_text() == "new"
+        assert not (second.path / "scratch.txt").exists()
+        codex_exec.cleanup_isolated_workspace(second)
+    finally:
+        pool.close()
+    assert not first.path.exists()
+
+
+def test_workspace_pool_shares_read_only_workspace_per_generation(
+    monkeypatch, tmp_path
+):
+    source = tmp_path / "repo"
+    source.mkdir()
+    (source / "a.txt").write_text("v1", encoding="utf-8")
+
+    created: list[str] = []
+
+    def fake_create(source_root, stage_label):
+        created.append(stage_label)
+        path = tmp_path / "isolated" / stage_label
+        codex_exec.sync_repo_state(source_root, path)
+        return codex_exec.IsolatedWorkspace(
+            path=path, cleanup_root=path, mode="copy"
+        )
+
+    monkeypatch.setattr(codex_exec, "create_isolated_workspace", fake_create)
+    pool = codex_exec.WorkspacePool(source, max_idle=1)
+    try:
+        first = pool.acquire_shared("review-1")
+        second = pool.acquire_shared("review-2")
+        assert first.mode == second.mode == "shared"
+        assert first.path == second.path
+        assert created == ["review-1"]
+
+        (source / "a.txt").write_text("v2", encoding="utf-8")
+        pool.invalidate_shared()
+        third = pool.acquire_shared("review-3")
+        assert third.path != first.path
+        assert (third.path / "a.txt").read_text(encoding="utf-8") == "v2"
+        assert (first.path / "a.txt").read_text(encoding="utf-8") == "v1"
+
+        codex_exec.cleanup_isolated_workspace(first)
+        codex_exec.cleanup_isolated_workspace(second)
+        fourth = pool.acquire("writer")
+        assert fourth.path == first.path
+        assert (fourth.path / "a.txt").read_text(encoding="utf-8") == "v2"
+        codex_exec.cleanup_isolated_workspace(fourth)
+        codex_exec.cleanup_isolated_workspace(third)
+    finally:
+        pool.close()
+    assert not third.path.exists()
+
+
+def test_sync_repo_state_skips_paths_with_matching_stat(tmp_path):
+    src = tmp_path / "src"
+    dst = tmp_path / "dst"
+    (src / "pkg").mkdir(parents=True)
+    dst.mkdir()
+    (src / "pkg" / "a.txt").write_text("aaaa", encoding="utf-8")
+    (src / "b.txt").write_text("bb", encoding="utf-8")
+    (dst / "stale.txt").write_text("stale", encoding="utf-8")
+
+    first = codex_exec.sync_repo_state(src, dst)
+    assert first.files_copied == 2
+    assert first.bytes_copied == 6
+    assert first.files_removed == 1
+    assert not (dst / "stale.txt").exists()
+
+    (src / "b.txt").write_text("bbb", encoding="utf-8")
+    second = codex_exec.sync_repo_state(src, dst)
+
+    assert second.files_copied == 1
+    assert second.bytes_copied == 3
+    assert second.files_skipped == 1
+    assert second.bytes_skipped == 4
+    assert (dst / "b.txt").read_text(encoding="utf-8") == "bbb"
+
+
 def test_run_pipeline_mode_resume_from_failed_stage(
     monkeypatch, tmp_path, capsys
 ):
@@ -514,7 +950,7 @@ def test_run_pipeline_mode_resume_from_failed_stage(
     primary_root.mkdir()
     monkeypatch.setattr(codex_exec, "ROOT_DIR", primary_root)
     monkeypatch.setattr(codex_exec, "LOG_DIR", tmp_path)
-    monkeypatch.setattr(codex_exec, "run_codex_exec", fake_run_codex_exec)
+    _patch_stage_exec(monkeypatch, fake_run_codex_exec)
     monkeypatch.setattr(
         codex_exec,
         "enforce_stage_write_policy",
@@ -555,6 +991,147 @@ def test_run_pipeline_mode_resume_from_failed_stage(
     assert stage_calls == {"draft": 1, "verify": 2}
 
 
+def test_run_pipeline_mode_replays_cached_stages_without_codex(
+    monkeypatch, tmp_path, capsys
+):
+    primary_root = tmp_path / "repo"
+    primary_root.mkdir()
+    git = ["git", "-c", "user.name=t", "-c", "user.email=t@example.com"]
+    subprocess.run(git + ["init", "-q"], cwd=primary_root, check=True)
+    (primary_root / "README.md").write_text("head", encoding="utf-8")
+    subprocess.run(git + ["add", "README.md"], cwd=primary_root, check=True)
+    subprocess.run(
+        git + ["commit", "-qm", "init"], cwd=primary_root, check=True
+    )
+    spec = {
+        "schema_version": codex_exec.PIPELINE_SPEC_VERSION,
+        "stages": [
+            {"id": "draft"},
+            {"id": "execute", "write_roots": ["pkg"]},
+        ],
+    }
+    spec_path = tmp_path / "spec.json"
+    spec_path.write_text(json.dumps(spec), encoding="utf-8")
+    calls: list[str] = []
+
+    def fake_run_codex_exec(**kwargs):
+        stage_id = _extract_stage_id(kwargs["prompt"])
+        calls.append(stage_id)
+        if stage_id == "execute":
+            pkg = Path(kwargs["workdir"] or ".") / "pkg"
+            pkg.mkdir(exist_ok=True)
+            (pkg / "out.txt").write_text("generated", encoding="utf-8")
+        return codex_exec.CodexResult(
+            agent_id=stage_id,
+            output=_stage_result_output(
+                stage_id,
+                [
+                    {
+                        "op": "add",
+                        "path": "/facts/-",
+                        "value": {"stage": stage_id},
+                    }
+                ],
+            ),
+            success=True,
+            returncode=0,
+        )
+
+    monkeypatch.setattr(codex_exec, "ROOT_DIR", primary_root)
+    monkeypatch.setattr(codex_exec, "LOG_DIR", tmp_path / "logs")
+    monkeypatch.setattr(codex_exec, "RESULT_CACHE_MODE", "readwrite")
+    monkeypatch.setattr(codex_exec, "RESULT_CACHE_DIR", tmp_path / "results")
+    monkeypatch.setattr(codex_exec, "REPO_BLOB_CACHE_DIR", tmp_path / "blobs")
+    _patch_stage_exec(monkeypatch, fake_run_codex_exec)
+
+    def run_once() -> tuple[dict, list[dict]]:
+        exit_code = codex_exec.run_pipeline_mode(
+            args=_make_args(tmp_path, spec_path),
+            task_type=codex_exec.TaskType.ANALYSIS,
+            enable_logging=False,
+        )
+        assert exit_code == codex_exec.EXIT_SUCCESS
+        payload = json.loads(capsys.readouterr().out)
+        state = codex_exec.load_pipeline_state(
+            codex_exec.get_pipeline_state_path(
+                tmp_path / "logs", payload["pipeline_run_id"]
+            )
+        )
+        return payload, state["stage_logs"]
+
+    first, first_logs = run_once()
+    generated = primary_root / "pkg" / "out.txt"
+    assert generated.read_text(encoding="utf-8") == "generated"
+    assert calls == ["draft", "execute"]
+    assert [log["cache_hit"] for log in first_logs] == [False, False]
+
+    # 作業ツリーを元に戻して同じ spec を再実行すると codex を起動しない
+    generated.unlink()
+    generated.parent.rmdir()
+    second, second_logs = run_once()
+    assert calls == ["draft", "execute"]
+    assert [log["cache_hit"] for log in second_logs] == [True, True]
+    assert generated.read_text(encoding="utf-8") == "generated"
+    assert [result["capsule_patch"] for result in second["stage_results"]] == [
+        result["capsule_patch"] for result in first["stage_results"]
+    ]
+
+
+def test_run_pipeline_mode_does_not_cache_stages_that_fail_to_commit(
+    monkeypatch, tmp_path, capsys
+):
+    primary_root = tmp_path / "repo"
+    (primary_root / "shared").mkdir(parents=True)
+    (primary_root / "shared" / "result.txt").write_text(
+        "before", encoding="utf-8"
+    )
+    git = ["git", "-c", "user.name=t", "-c", "user.email=t@example.com"]
+    subprocess.run(git + ["init", "-q"], cwd=primary_root, check=True)
+    subprocess.run(git + ["add", "."], cwd=primary_root, check=True)
+    subprocess.run(
+        git + ["commit", "-qm", "init"], cwd=primary_root, check=True
+    )
+    spec = {
+        "schema_version": codex_exec.PIPELINE_SPEC_VERSION,
+        "stages": [
+            {"id": "exec_a", "depends_on": [], "write_roots": ["shared"]},
+            {"id": "exec_b", "depends_on": [], "write_roots": ["shared"]},
+        ],
+    }
+    spec_path = tmp_path / "spec.json"
+    spec_path.write_text(json.dumps(spec), encoding="utf-8")
+
+    def fake_run_codex_exec(**kwargs):
+        stage_id = _extract_stage_id(kwargs["prompt"])
+        target = Path(kwargs["workdir"]) / "shared" / "result.txt"
+        target.write_text(stage_id, encoding="utf-8")
+        return codex_exec.CodexResult(
+            agent_id=stage_id,
+            output=_stage_result_output(stage_id, []),
+            success=True,
+            returncode=0,
+        )
+
+    monkeypatch.setattr(codex_exec, "ROOT_DIR", primary_root)
+    monkeypatch.setattr(codex_exec, "LOG_DIR", tmp_path / "logs")
+    monkeypatch.setattr(codex_exec, "RESULT_CACHE_MODE", "readwrite")
+    monkeypatch.setattr(codex_exec, "RESULT_CACHE_DIR", tmp_path / "results")
+    monkeypatch.setattr(codex_exec, "REPO_BLOB_CACHE_DIR", tmp_path / "blobs")
+    _patch_stage_exec(monkeypatch, fake_run_codex_exec)
+
+    exit_code = codex_exec.run_pipeline_mode(
+        args=_make_args(tmp_path, spec_path),
+        task_type=codex_exec.TaskType.ANALYSIS,
+        enable_logging=False,
+    )
+    capsys.readouterr()
+
+    # 両 stage とも ok だがグループの衝突で捨てたので再生対象にしない
+    assert exit_code == codex_exec.EXIT_SUBAGENT_FAILED
+    stage_cache = tmp_path / "results" / codex_exec.STAGE_CACHE_DIRNAME
+    assert not [path for path in stage_cache.rglob("*") if path.is_file()]
+
+
 def test_build_stage_layers_handles_branch_join():
     spec = {
         "schema_version": codex_exec.PIPELINE_SPEC_VERSION,
@@ -585,30 +1162,595 @@ def test_build_stage_layers_handles_branch_join():
     ]
 
 
-def test_canonicalize_graph_writer_requires_explicit_write_roots():
+def test_critical_path_scheduler_prefers_longest_remaining_chain():
     spec = {
         "schema_version": codex_exec.PIPELINE_SPEC_VERSION,
         "stages": [
             {"id": "draft"},
-            {"id": "exec_a", "depends_on": ["draft"]},
+            {"id": "short", "depends_on": ["draft"], "write_roots": []},
+            {"id": "long_a", "depends_on": ["draft"], "write_roots": []},
+            {"id": "long_b", "depends_on": ["long_a"], "write_roots": []},
         ],
     }
-    with pytest.raises(ValueError, match="write_roots"):
-        codex_exec.canonicalize_pipeline_spec(spec)
-
-
-def test_resolve_resume_state_path_uses_custom_log_root(tmp_path):
-    custom_log_dir = tmp_path / "logs" / "human"
-    state_path = custom_log_dir / "artifacts" / "run-123" / "state.json"
-    state_path.parent.mkdir(parents=True)
-    state_path.write_text("{}", encoding="utf-8")
+    canonical = codex_exec.canonicalize_pipeline_spec(spec)
+    assert codex_exec.compute_stage_critical_path(canonical["stages"]) == {
+        "draft": 3,
+        "short": 1,
+        "long_a": 2,
+        "long_b": 1,
+    }
 
-    resolved = codex_exec.resolve_resume_state_path(
-        "run-123",
-        effective_log_dir=custom_log_dir,
+    scheduler = codex_exec.CriticalPathScheduler(canonical["stages"])
+    assert scheduler.pop_ready() == "draft"
+    assert scheduler.pop_ready() is None
+    scheduler.mark_done("draft")
+    assert scheduler.pop_ready() == "long_a"
+    assert scheduler.pop_ready() == "short"
+    scheduler.mark_done("long_a")
+    assert scheduler.pop_ready() == "long_b"
+
+    resumed = codex_exec.CriticalPathScheduler(
+        canonical["stages"], {"draft", "long_a"}
     )
-
-    assert resolved == state_path
+    assert [resumed.pop_ready(), resumed.pop_ready()] == ["short", "long_b"]
+
+
+def test_run_pipeline_mode_graph_starts_stage_once_dependencies_promote(
+    monkeypatch, tmp_path, capsys
+):
+    primary_root = tmp_path / "repo"
+    primary_root.mkdir()
+    spec = {
+        "schema_version": codex_exec.PIPELINE_SPEC_VERSION,
+        "stages": [
+            {"id": "draft"},
+            {"id": "slow", "depends_on": ["draft"], "write_roots": []},
+            {"id": "fast", "depends_on": ["draft"], "write_roots": []},
+            {"id": "after_fast", "depends_on": ["fast"], "write_roots": []},
+        ],
+    }
+    spec_path = tmp_path / "graph-eager.json"
+    spec_path.write_text(json.dumps(spec), encoding="utf-8")
+    after_fast_started = asyncio.Event()
+    observed: dict[str, bool] = {}
+
+    async def fake_run_codex_exec_async(**kwargs):
+        stage_id = _extract_stage_id(kwargs["prompt"])
+        if stage_id == "slow":
+            # layer 同期なら after_fast は slow の完了を待つので起動しない
+            try:
+                await asyncio.wait_for(after_fast_started.wait(), timeout=5)
+                observed["slow"] = True
+            except TimeoutError:
+                observed["slow"] = False
+        if stage_id == "after_fast":
+            after_fast_started.set()
+        return codex_exec.CodexResult(
+            agent_id=stage_id,
+            output=_stage_result_output(
+                stage_id,
+                [
+                    {
+                        "op": "add",
+                        "path": "/facts/-",
+                        "value": {"stage": stage_id},
+                    }
+                ],
+            ),
+            success=True,
+            returncode=0,
+        )
+
+    monkeypatch.setattr(codex_exec, "ROOT_DIR", primary_root)
+    monkeypatch.setattr(codex_exec, "LOG_DIR", tmp_path / "logs")
+    monkeypatch.setattr(
+        codex_exec, "run_codex_exec_async", fake_run_codex_exec_async
+    )
+
+    exit_code = codex_exec.run_pipeline_mode(
+        args=_make_args(tmp_path, spec_path),
+        task_type=codex_exec.TaskType.ANALYSIS,
+        enable_logging=False,
+    )
+    payload = json.loads(capsys.readouterr().out)
+
+    assert exit_code == codex_exec.EXIT_SUCCESS
+    assert observed == {"slow": True}
+    stages = [fact["stage"] for fact in payload["capsule"]["facts"]]
+    assert sorted(stages) == ["after_fast", "draft", "fast", "slow"]
+    assert stages.index("fast") < stages.index("slow")
+
+
+def test_run_pipeline_mode_graph_starts_late_critical_stage_before_queue(
+    monkeypatch, tmp_path, capsys
+):
+    primary_root = tmp_path / "repo"
+    primary_root.mkdir()
+    spec = {
+        "schema_version": codex_exec.PIPELINE_SPEC_VERSION,
+        "stages": [
+            {"id": "a1", "depends_on": [], "write_roots": []},
+            {"id": "a2", "depends_on": ["a1"], "write_roots": []},
+            {"id": "a3", "depends_on": ["a2"], "write_roots": []},
+            {"id": "b1", "depends_on": [], "write_roots": []},
+            {"id": "b2", "depends_on": [], "write_roots": []},
+            {"id": "b3", "depends_on": [], "write_roots": []},
+        ],
+    }
+    spec_path = tmp_path / "graph-gate.json"
+    spec_path.write_text(json.dumps(spec), encoding="utf-8")
+    started: list[str] = []
+
+    async def fake_run_codex_exec_async(**kwargs):
+        stage_id = _extract_stage_id(kwargs["prompt"])
+        started.append(stage_id)
+        if stage_id.startswith("b"):
+            await asyncio.sleep(0.2)
+        return codex_exec.CodexResult(
+            agent_id=stage_id,
+            output=_stage_result_output(stage_id, []),
+            success=True,
+            returncode=0,
+        )
+
+    monkeypatch.setattr(codex_exec, "ROOT_DIR", primary_root)
+    monkeypatch.setattr(codex_exec, "LOG_DIR", tmp_path / "logs")
+    monkeypatch.setattr(
+        codex_exec, "run_codex_exec_async", fake_run_codex_exec_async
+    )
+
+    exit_code = codex_exec.run_pipeline_mode(
+        args=_make_args(tmp_path, spec_path),
+        task_type=codex_exec.TaskType.ANALYSIS,
+        enable_logging=False,
+    )
+    capsys.readouterr()
+
+    assert exit_code == codex_exec.EXIT_SUCCESS
+    # b2 / b3 は worker 枠が空くまで起動せず、後から ready になった a2 / a3 が先
+    assert sorted(started[:2]) == ["a1", "b1"]
+    assert started[2:4] == ["a2", "a3"]
+    assert sorted(started[4:]) == ["b2", "b3"]
+
+
+def test_run_pipeline_mode_graph_frees_worker_slot_during_backoff(
+    monkeypatch, tmp_path, capsys
+):
+    primary_root = tmp_path / "repo"
+    primary_root.mkdir()
+    spec = {
+        "schema_version": codex_exec.PIPELINE_SPEC_VERSION,
+        "stages": [
+            {"id": "x", "depends_on": [], "write_roots": []},
+            {"id": "y", "depends_on": [], "write_roots": []},
+            {"id": "z", "depends_on": [], "write_roots": []},
+        ],
+    }
+    spec_path = tmp_path / "graph-backoff.json"
+    spec_path.write_text(json.dumps(spec), encoding="utf-8")
+    started: list[str] = []
+
+    async def fake_run_codex_exec_async(**kwargs):
+        stage_id = _extract_stage_id(kwargs["prompt"])
+        started.append(stage_id)
+        if stage_id == "x" and started.count("x") == 1:
+            return codex_exec.CodexResult(
+                agent_id=stage_id,
+                output="",
+                stderr="timeout",
+                success=False,
+                returncode=124,
+                timed_out=True,
+                timeout_seconds=30,
+                output_is_partial=True,
+            )
+        if stage_id == "y":
+            await asyncio.sleep(0.6)
+        return codex_exec.CodexResult(
+            agent_id=stage_id,
+            output=_stage_result_output(stage_id, []),
+            success=True,
+            returncode=0,
+        )
+
+    monkeypatch.setattr(codex_exec, "ROOT_DIR", primary_root)
+    monkeypatch.setattr(codex_exec, "LOG_DIR", tmp_path / "logs")
+    monkeypatch.setattr(
+        codex_exec, "run_codex_exec_async", fake_run_codex_exec_async
+    )
+    monkeypatch.setattr(
+        codex_exec, "compute_retry_backoff_seconds", lambda attempt: 0.3
+    )
+
+    exit_code = codex_exec.run_pipeline_mode(
+        args=_make_args(tmp_path, spec_path),
+        task_type=codex_exec.TaskType.ANALYSIS,
+        enable_logging=False,
+    )
+    capsys.readouterr()
+
+    assert exit_code == codex_exec.EXIT_SUCCESS
+    # x の backoff 中は枠が空くので、y の完了を待たずに z が走る
+    assert sorted(started[:2]) == ["x", "y"]
+    assert started[2:] == ["z", "x"]
+
+
+def test_run_pipeline_mode_graph_commits_off_the_event_loop(
+    monkeypatch, tmp_path, capsys
+):
+    primary_root = tmp_path / "repo"
+    primary_root.mkdir()
+    spec = {
+        "schema_version": codex_exec.PIPELINE_SPEC_VERSION,
+        "stages": [
+            {"id": "fast", "depends_on": [], "write_roots": ["a"]},
+            {"id": "slow", "depends_on": [], "write_roots": ["b"]},
+        ],
+    }
+    spec_path = tmp_path / "graph-commit.json"
+    spec_path.write_text(json.dumps(spec), encoding="utf-8")
+    gaps: list[float] = []
+
+    async def fake_run_codex_exec_async(**kwargs):
+        stage_id = _extract_stage_id(kwargs["prompt"])
+        if stage_id == "slow":
+            last = time.monotonic()
+            for _ in range(40):
+                await asyncio.sleep(0.02)
+                now = time.monotonic()
+                gaps.append(now - last)
+                last = now
+        return codex_exec.CodexResult(
+            agent_id=stage_id,
+            output=_stage_result_output(stage_id, []),
+            success=True,
+            returncode=0,
+        )
+
+    original_promote = codex_exec.promote_stage_workspace
+
+    def slow_promote(outcome, root=codex_exec.ROOT_DIR):
+        time.sleep(0.4)
+        original_promote(outcome, root=root)
+
+    monkeypatch.setattr(codex_exec, "ROOT_DIR", primary_root)
+    monkeypatch.setattr(codex_exec, "LOG_DIR", tmp_path / "logs")
+    monkeypatch.setattr(
+        codex_exec, "run_codex_exec_async", fake_run_codex_exec_async
+    )
+    monkeypatch.setattr(codex_exec, "promote_stage_workspace", slow_promote)
+
+    exit_code = codex_exec.run_pipeline_mode(
+        args=_make_args(tmp_path, spec_path),
+        task_type=codex_exec.TaskType.ANALYSIS,
+        enable_logging=False,
+    )
+    capsys.readouterr()
+
+    assert exit_code == codex_exec.EXIT_SUCCESS
+    # fast の promote 中も slow の stage は event loop 上で進み続ける
+    assert max(gaps) < 0.3
+
+
+def _install_fake_codex(monkeypatch, tmp_path: Path, script: str) -> None:
+    bin_dir = tmp_path / "bin"
+    bin_dir.mkdir()
+    fake = bin_dir / "codex"
+    fake.write_text("#!/bin/sh\n" + script, encoding="utf-8")
+    fake.chmod(0o755)
+    monkeypatch.setenv("PATH", f"{bin_dir}{os.pathsep}{os.environ['PATH']}")
+
+
+def test_spawn_codex_exec_async_bounds_drain_when_pipe_stays_open(
+    monkeypatch, tmp_path
+):
+    # codex 本体は終了するが、孫プロセスが stdout を開いたまま残る
+    _install_fake_codex(monkeypatch, tmp_path, "echo done\nsleep 30 &\n")
+    monkeypatch.setattr(codex_exec, "STREAM_DRAIN_GRACE_SECONDS", 0.2)
+
+    result = asyncio.run(
+        codex_exec._spawn_codex_exec_async("prompt", timeout=30)
+    )
+
+    assert result.success is True
+    assert result.output_is_partial is True
+    assert result.output.strip() == "done"
+    # 残りの timeout ではなく猶予だけ待って打ち切る
+    assert result.execution_time < 5
+
+
+def test_spawn_codex_exec_kills_group_when_pipe_stays_open(
+    monkeypatch, tmp_path
+):
+    _install_fake_codex(monkeypatch, tmp_path, "echo done\nsleep 30 &\n")
+    monkeypatch.setattr(codex_exec, "STREAM_DRAIN_GRACE_SECONDS", 0.2)
+
+    result = codex_exec._spawn_codex_exec("prompt", timeout=30)
+
+    assert result.success is True
+    assert result.output_is_partial is True
+    assert result.output.strip() == "done"
+    assert result.execution_time < 10
+
+
+def test_run_pipeline_mode_graph_cancels_running_stages_on_failure(
+    monkeypatch, tmp_path, capsys
+):
+    primary_root = tmp_path / "repo"
+    primary_root.mkdir()
+    spec = {
+        "schema_version": codex_exec.PIPELINE_SPEC_VERSION,
+        "stages": [
+            {"id": "broken", "depends_on": [], "write_roots": []},
+            {"id": "stuck", "depends_on": [], "write_roots": []},
+        ],
+    }
+    spec_path = tmp_path / "graph-cancel.json"
+    spec_path.write_text(json.dumps(spec), encoding="utf-8")
+    cancelled: list[str] = []
+    stuck_started = asyncio.Event()
+
+    async def fake_run_codex_exec_async(**kwargs):
+        stage_id = _extract_stage_id(kwargs["prompt"])
+        if stage_id == "broken":
+            await stuck_started.wait()
+        if stage_id == "stuck":
+            stuck_started.set()
+            try:
+                await asyncio.sleep(30)
+            except asyncio.CancelledError:
+                cancelled.append(stage_id)
+                raise
+        return codex_exec.CodexResult(
+            agent_id=stage_id,
+            output="not json",
+            success=True,
+            returncode=0,
+        )
+
+    monkeypatch.setattr(codex_exec, "ROOT_DIR", primary_root)
+    monkeypatch.setattr(codex_exec, "LOG_DIR", tmp_path / "logs")
+    monkeypatch.setattr(
+        codex_exec, "run_codex_exec_async", fake_run_codex_exec_async
+    )
+
+    exit_code = codex_exec.run_pipeline_mode(
+        args=_make_args(tmp_path, spec_path),
+        task_type=codex_exec.TaskType.ANALYSIS,
+        enable_logging=False,
+    )
+    payload = json.loads(capsys.readouterr().out)
+
+    assert exit_code == codex_exec.EXIT_SUBAGENT_FAILED
+    assert payload["success"] is False
+    assert cancelled == ["stuck"]
+    assert [result["stage_id"] for result in payload["stage_results"]] == [
+        "broken"
+    ]
+
+
+def test_run_pipeline_mode_speculates_stage_outside_upstream_patch(
+    monkeypatch, tmp_path, capsys
+):
+    primary_root = tmp_path / "repo"
+    primary_root.mkdir()
+    spec = {
+        "schema_version": codex_exec.PIPELINE_SPEC_VERSION,
+        "stages": [
+            {
+                "id": "collect",
+                "write_roots": [],
+                "input_keys": ["task"],
+                "patch_prefixes": ["/facts"],
+            },
+            {
+                "id": "critic",
+                "write_roots": [],
+                "input_keys": ["task", "draft"],
+                "patch_prefixes": ["/critique"],
+            },
+            {
+                "id": "report",
+                "write_roots": [],
+                "input_keys": ["facts", "critique"],
+            },
+        ],
+    }
+    spec_path = tmp_path / "speculative.json"
+    spec_path.write_text(json.dumps(spec), encoding="utf-8")
+    critic_started = asyncio.Event()
+    collect_done = asyncio.Event()
+    observed: dict[str, bool] = {}
+    patches = {
+        "collect": {
+            "op": "add",
+            "path": "/facts/-",
+            "value": {"stage": "collect"},
+        },
+        "critic": {"op": "add", "path": "/critique/notes", "value": "ok"},
+        "report": {
+            "op": "add",
+            "path": "/facts/-",
+            "value": {"stage": "report"},
+        },
+    }
+
+    async def fake_run_codex_exec_async(**kwargs):
+        stage_id = _extract_stage_id(kwargs["prompt"])
+        if stage_id == "collect":
+            try:
+                await asyncio.wait_for(critic_started.wait(), timeout=5)
+                observed["critic_overlapped"] = True
+            except TimeoutError:
+                observed["critic_overlapped"] = False
+            collect_done.set()
+        if stage_id == "critic":
+            critic_started.set()
+        if stage_id == "report":
+            # report は critic の patch を読むので先行起動しない
+            observed["report_after_collect"] = collect_done.is_set()
+        return codex_exec.CodexResult(
+            agent_id=stage_id,
+            output=_stage_result_output(stage_id, [patches[stage_id]]),
+            success=True,
+            returncode=0,
+        )
+
+    monkeypatch.setattr(codex_exec, "ROOT_DIR", primary_root)
+    monkeypatch.setattr(codex_exec, "LOG_DIR", tmp_path / "logs")
+    monkeypatch.setattr(
+        codex_exec, "run_codex_exec_async", fake_run_codex_exec_async
+    )
+
+    exit_code = codex_exec.run_pipeline_mode(
+        args=_make_args(tmp_path, spec_path, speculative_stages=True),
+        task_type=codex_exec.TaskType.ANALYSIS,
+        enable_logging=False,
+    )
+    payload = json.loads(capsys.readouterr().out)
+    state = codex_exec.load_pipeline_state(
+        codex_exec.get_pipeline_state_path(
+            tmp_path / "logs", payload["pipeline_run_id"]
+        )
+    )
+
+    assert exit_code == codex_exec.EXIT_SUCCESS
+    assert observed == {
+        "critic_overlapped": True,
+        "report_after_collect": True,
+    }
+    assert payload["capsule"]["facts"] == [
+        {"stage": "collect"},
+        {"stage": "report"},
+    ]
+    assert payload["capsule"]["critique"] == {"notes": "ok"}
+    assert [
+        (log["stage_id"], log.get("speculation"))
+        for log in state["stage_logs"]
+    ] == [("collect", None), ("critic", "accepted"), ("report", None)]
+
+
+def test_stage_patch_outside_declared_prefixes_is_fatal(
+    monkeypatch, tmp_path, capsys
+):
+    primary_root = tmp_path / "repo"
+    primary_root.mkdir()
+    spec = {
+        "schema_version": codex_exec.PIPELINE_SPEC_VERSION,
+        "stages": [
+            {"id": "collect", "write_roots": [], "patch_prefixes": ["/facts"]}
+        ],
+    }
+    spec_path = tmp_path / "prefixes.json"
+    spec_path.write_text(json.dumps(spec), encoding="utf-8")
+
+    def fake_run_codex_exec(**kwargs):
+        return codex_exec.CodexResult(
+            agent_id="collect",
+            output=_stage_result_output(
+                "collect",
+                [{"op": "add", "path": "/open_questions/-", "value": "q"}],
+            ),
+            success=True,
+            returncode=0,
+        )
+
+    monkeypatch.setattr(codex_exec, "ROOT_DIR", primary_root)
+    monkeypatch.setattr(codex_exec, "LOG_DIR", tmp_path / "logs")
+    _patch_stage_exec(monkeypatch, fake_run_codex_exec)
+
+    exit_code = codex_exec.run_pipeline_mode(
+        args=_make_args(tmp_path, spec_path),
+        task_type=codex_exec.TaskType.ANALYSIS,
+        enable_logging=False,
+    )
+    payload = json.loads(capsys.readouterr().out)
+
+    assert exit_code == codex_exec.EXIT_SUBAGENT_FAILED
+    assert payload["stage_results"][0]["summary"] == (
+        "capsule_patch outside patch_prefixes"
+    )
+    with pytest.raises(ValueError, match="patch_prefixes"):
+        codex_exec.canonicalize_pipeline_spec(
+            {"stages": [{"id": "collect", "patch_prefixes": ["/task"]}]}
+        )
+
+
+def test_canonicalize_graph_writer_requires_explicit_write_roots():
+    spec = {
+        "schema_version": codex_exec.PIPELINE_SPEC_VERSION,
+        "stages": [
+            {"id": "draft"},
+            {"id": "exec_a", "depends_on": ["draft"]},
+        ],
+    }
+    with pytest.raises(ValueError, match="write_roots"):
+        codex_exec.canonicalize_pipeline_spec(spec)
+
+
+def test_resolve_resume_state_path_uses_custom_log_root(tmp_path):
+    custom_log_dir = tmp_path / "logs" / "human"
+    state_path = custom_log_dir / "artifacts" / "run-123" / "state.json"
+    state_path.parent.mkdir(parents=True)
+    state_path.write_text("{}", encoding="utf-8")
+
+    resolved = codex_exec.resolve_resume_state_path(
+        "run-123",
+        effective_log_dir=custom_log_dir,
+    )
+
+    assert resolved == state_path
+
+
+def test_pipeline_checkpoint_replays_journal_over_snapshot(tmp_path):
+    state_path = tmp_path / "artifacts" / "run-1" / "state.json"
+    checkpoint = codex_exec.PipelineCheckpoint(state_path, compact_every=2)
+    base = {
+        "pipeline_run_id": "run-1",
+        "capsule": {"facts": []},
+        "stage_results": [],
+        "stage_logs": [],
+        "attempts_by_stage": {},
+        "completed_stage_ids": [],
+    }
+    checkpoint.compact(base)
+    patch = [{"op": "add", "path": "/facts/-", "value": "a"}]
+    checkpoint.append(
+        {
+            "type": "stage_outcome",
+            "stage_id": "draft",
+            "attempt_count": 1,
+            "attempt_logs": [{"stage_id": "draft", "attempt": 1}],
+            "stage_result": {"stage_id": "draft", "capsule_patch": patch},
+            "unauthorized_write": False,
+        }
+    )
+    checkpoint.append(
+        {"type": "commit", "stage_ids": ["draft"], "capsule_patch": patch}
+    )
+    assert checkpoint.should_compact()
+    journal = codex_exec.get_pipeline_journal_path(state_path)
+    # 追記途中で落ちた末尾行は無視される
+    with journal.open("a", encoding="utf-8") as f:
+        f.write('{"seq": 3, "type": "com')
+
+    state = codex_exec.load_pipeline_state(state_path.parent)
+    assert state["capsule"] == {"facts": ["a"]}
+    assert state["completed_stage_ids"] == ["draft"]
+    assert state["attempts_by_stage"] == {"draft": 1}
+    assert state["checkpoint_seq"] == 2
+    assert json.loads(state_path.read_text(encoding="utf-8"))["capsule"] == {
+        "facts": []
+    }
+
+    # スナップショット後に切り詰め前のジャーナルが残っても二重適用しない
+    stale_journal = journal.read_text(encoding="utf-8")
+    checkpoint.compact(state)
+    assert not journal.exists()
+    journal.write_text(stale_journal, encoding="utf-8")
+    replayed = codex_exec.load_pipeline_state(state_path)
+    assert replayed["capsule"] == {"facts": ["a"]}
+    assert len(replayed["stage_logs"]) == 1
 
 
 def test_run_pipeline_mode_does_not_promote_failed_stage_workspace_changes(
@@ -649,7 +1791,7 @@ def test_run_pipeline_mode_does_not_promote_failed_stage_workspace_changes(
 
     monkeypatch.setattr(codex_exec, "ROOT_DIR", primary_root)
     monkeypatch.setattr(codex_exec, "LOG_DIR", tmp_path / "logs")
-    monkeypatch.setattr(codex_exec, "run_codex_exec", fake_run_codex_exec)
+    _patch_stage_exec(monkeypatch, fake_run_codex_exec)
 
     args = _make_args(tmp_path, spec_path)
     exit_code = codex_exec.run_pipeline_mode(
@@ -727,7 +1869,7 @@ def test_run_pipeline_mode_graph_promotes_non_conflicting_parallel_writers(
 
     monkeypatch.setattr(codex_exec, "ROOT_DIR", primary_root)
     monkeypatch.setattr(codex_exec, "LOG_DIR", tmp_path / "logs")
-    monkeypatch.setattr(codex_exec, "run_codex_exec", fake_run_codex_exec)
+    _patch_stage_exec(monkeypatch, fake_run_codex_exec)
 
     args = _make_args(tmp_path, spec_path)
     exit_code = codex_exec.run_pipeline_mode(
@@ -810,7 +1952,7 @@ def test_run_pipeline_mode_graph_rejects_conflicting_parallel_writers(
 
     monkeypatch.setattr(codex_exec, "ROOT_DIR", primary_root)
     monkeypatch.setattr(codex_exec, "LOG_DIR", tmp_path / "logs")
-    monkeypatch.setattr(codex_exec, "run_codex_exec", fake_run_codex_exec)
+    _patch_stage_exec(monkeypatch, fake_run_codex_exec)
 
     args = _make_args(tmp_path, spec_path)
     exit_code = codex_exec.run_pipeline_mode(
@@ -825,6 +1967,85 @@ def test_run_pipeline_mode_graph_rejects_conflicting_parallel_writers(
     assert target_file.read_text(encoding="utf-8") == "before"
 
 
+def test_merge_text_three_way_combines_non_overlapping_hunks():
+    base = ["# log\n", "a\n", "b\n", "c\n"]
+    ours = ["# log\n", "- ours\n", "a\n", "B\n", "c\n"]
+    theirs = ["# log\n", "- theirs\n", "a\n", "b\n", "C\n"]
+
+    assert codex_exec.merge_text_three_way(base, ours, theirs) == [
+        "# log\n",
+        "- ours\n",
+        "- theirs\n",
+        "a\n",
+        "B\n",
+        "C\n",
+    ]
+    assert codex_exec.merge_text_three_way(base, ours, ours) == ours
+    conflicting = ["# log\n", "a\n", "X\n", "c\n"]
+    assert codex_exec.merge_text_three_way(base, ours, conflicting) is None
+
+
+def test_run_pipeline_mode_graph_merges_parallel_edits_to_shared_file(
+    monkeypatch, tmp_path, capsys
+):
+    primary_root = tmp_path / "repo"
+    primary_root.mkdir()
+    shared_dir = primary_root / "shared"
+    shared_dir.mkdir()
+    changelog = shared_dir / "CHANGELOG.md"
+    changelog.write_text("# Changelog\n\nfooter\n", encoding="utf-8")
+    spec = {
+        "schema_version": codex_exec.PIPELINE_SPEC_VERSION,
+        "stages": [
+            {
+                "id": "exec_a",
+                "depends_on": [],
+                "write_roots": ["shared"],
+            },
+            {
+                "id": "exec_b",
+                "depends_on": [],
+                "write_roots": ["shared"],
+            },
+        ],
+    }
+    spec_path = tmp_path / "graph-merge.json"
+    spec_path.write_text(json.dumps(spec), encoding="utf-8")
+
+    def fake_run_codex_exec(**kwargs):
+        stage_id = _extract_stage_id(kwargs["prompt"])
+        target = Path(kwargs["workdir"]) / "shared" / "CHANGELOG.md"
+        text = target.read_text(encoding="utf-8")
+        if stage_id == "exec_a":
+            text = text.replace("\n\n", "\n\n- exec_a\n")
+        else:
+            text = text.replace("footer", "footer (exec_b)")
+        target.write_text(text, encoding="utf-8")
+        return codex_exec.CodexResult(
+            agent_id=stage_id,
+            output=_stage_result_output(stage_id, []),
+            success=True,
+            returncode=0,
+        )
+
+    monkeypatch.setattr(codex_exec, "ROOT_DIR", primary_root)
+    monkeypatch.setattr(codex_exec, "LOG_DIR", tmp_path / "logs")
+    _patch_stage_exec(monkeypatch, fake_run_codex_exec)
+
+    exit_code = codex_exec.run_pipeline_mode(
+        args=_make_args(tmp_path, spec_path),
+        task_type=codex_exec.TaskType.ANALYSIS,
+        enable_logging=False,
+    )
+    payload = json.loads(capsys.readouterr().out)
+
+    assert exit_code == codex_exec.EXIT_SUCCESS
+    assert payload["success"] is True
+    assert changelog.read_text(encoding="utf-8") == (
+        "# Changelog\n\n- exec_a\nfooter (exec_b)\n"
+    )
+
+
 def test_build_pipeline_evaluation_marks_retry_policy_followed():
     stage_specs = [
         codex_exec.normalize_stage_spec(